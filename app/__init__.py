@@ -2,7 +2,7 @@ from datetime import datetime
 from flask import current_app, jsonify, redirect, request
 from flask.json import JSONEncoder
 from functools import wraps
-import os
+import click, os
 
 from flask_cors import CORS
 from flask_login import current_user, LoginManager
@@ -15,6 +15,9 @@ import email, stripe
 db = None
 sentry = None
 
+# Measurements taken while the app starts, shown on the admin dashboard
+startup_metrics = {}
+
 def admin_required(func):
     @wraps(func)
     def decorated_view(*args, **kwargs):
@@ -55,7 +58,7 @@ def configure_app(app):
         sslify = SSLify(app, permanent=True)
 
     # Set up login manager here
-    from app.mod_users import User
+    from app.mod_users import load_cached_user
 
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -73,7 +76,180 @@ def configure_app(app):
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.filter_by(id=user_id).first()
+        return load_cached_user(user_id)
+
+    def rebuild_word_indexes():
+        from app.mod_games import Game
+
+        question_types = set([game.question for game in Game if game.question is not None])
+
+        # Speaker and Scribe share a table, so only index each table once
+        for question_type in {x.__tablename__: x for x in question_types}.values():
+            question_type.rebuild_word_index()
+            print("Indexed %s" % question_type.__tablename__)
+
+    @app.cli.command("rebuild-word-index")
+    def rebuild_word_index():
+        """Indexes the words in every game's questions."""
+
+        rebuild_word_indexes()
+
+    @app.cli.command("reannotate-passages")
+    def reannotate_passages():
+        """Annotates every passage whose annotations were made with a different
+        jieba dictionary or different exceptions, then updates the new word
+        lists and the questions' word index to match."""
+
+        from app.mod_passages import Passage
+        from app.mod_passages.controllers import update_word_lists
+
+        annotated = 0
+
+        for passage in Passage.query.all():
+            if passage.annotations_are_stale():
+                passage.annotate()
+                annotated += 1
+
+        db.session.commit()
+        update_word_lists()
+
+        print("Annotated %d passages" % annotated)
+
+        # Questions are indexed by segmenting their text too, so their words
+        # change along with the passages'
+        rebuild_word_indexes()
+
+    @app.cli.command("process-mastery-updates")
+    def process_mastery_updates():
+        """Applies every queued mastery update."""
+
+        from app.mod_mastery import process_mastery_updates
+
+        total = 0
+        processed = None
+
+        while processed != 0:
+            processed = process_mastery_updates()
+            total += processed
+
+        print("Applied %d mastery updates" % total)
+
+    @app.cli.command("requeue-failed-mastery-updates")
+    def requeue_failed_mastery_updates():
+        """Queues every failed mastery update again."""
+
+        from app.mod_mastery import requeue_failed_updates
+
+        print("Queued %d failed mastery updates again" % requeue_failed_updates())
+
+    @app.cli.command("migrate-saved-entries")
+    def migrate_saved_entries():
+        """Copies saved entry ids from users.saved_entry_ids into saved_entries,
+        merging them with any rows users already have. Lists are also copied
+        the first time a user's saved entries are used, and copied lists are
+        cleared so that running this again doesn't bring back entries that
+        were unsaved in between."""
+
+        import json
+        from app.mod_users import SavedEntry
+
+        connection = db.engine.connect()
+        transaction = connection.begin()
+
+        users = connection.execute(
+            "SELECT id, saved_entry_ids FROM users WHERE saved_entry_ids IS NOT NULL FOR UPDATE"
+        ).fetchall()
+
+        rows = []
+
+        for (user_id, saved_entry_ids) in users:
+            # Lists sometimes have the same id more than once
+            for entry_id in set(json.loads(saved_entry_ids)):
+                rows.append({"user_id": user_id, "entry_id": entry_id})
+
+        if len(rows) > 0:
+            connection.execute(SavedEntry.__table__.insert().prefix_with("IGNORE"), rows)
+
+        if len(users) > 0:
+            connection.execute("UPDATE users SET saved_entry_ids = NULL WHERE id = %s", [(user[0],) for user in users])
+
+        transaction.commit()
+        connection.close()
+
+        print("Copied %d saved entries for %d users" % (len(rows), len(users)))
+
+    @app.cli.command("backfill-speech-hashes")
+    @click.option("--dry-run", is_flag=True, help="Print what would change without changing anything.")
+    def backfill_speech_hashes(dry_run):
+        """Hashes the source of every recording saved before hashes were kept,
+        deleting recordings of text that was already recorded with that voice,
+        along with their audio in S3. Text that only differs in Unicode form or
+        surrounding whitespace counts as the same, and each of those recordings
+        is printed before it's deleted, so run with --dry-run first to check."""
+
+        from app.mod_speech import ChineseSpeechSynthesis, EnglishSpeechSynthesis, hash_source
+        from app.mod_speech.controllers import create_s3_client
+
+        s3 = create_s3_client() if not dry_run else None
+
+        for model in [ChineseSpeechSynthesis, EnglishSpeechSynthesis]:
+            # Maps source hashes to the (id, source) of the recording that's kept
+            kept = {row[0]: (row[1], row[2]) for row in
+                    db.session.query(model.source_hash, model.id, model.source).filter(model.source_hash.isnot(None)).all()}
+
+            hashed = 0
+            duplicates = 0
+            last_id = 0
+
+            while True:
+                recordings = model.query.filter(model.source_hash.is_(None), model.id > last_id) \
+                                .order_by(model.id.asc()).limit(1000).all()
+
+                if len(recordings) == 0:
+                    break
+
+                last_id = recordings[-1].id
+
+                # The filenames of the recordings being deleted
+                deleted_filenames = []
+
+                for recording in recordings:
+                    source_hash = hash_source(recording.source, recording.voice)
+
+                    if source_hash in kept:
+                        (kept_id, kept_source) = kept[source_hash]
+
+                        if recording.source != kept_source:
+                            print("%s %d is the same as %d once normalized: %r, %r" % (
+                                model.__tablename__, recording.id, kept_id, recording.source, kept_source
+                            ))
+
+                        deleted_filenames.append(recording.filename)
+                        duplicates += 1
+
+                        if not dry_run:
+                            db.session.delete(recording)
+                    else:
+                        kept[source_hash] = (recording.id, recording.source)
+                        hashed += 1
+
+                        if not dry_run:
+                            recording.source_hash = source_hash
+
+                if dry_run:
+                    db.session.rollback()
+                    continue
+
+                db.session.commit()
+
+                # Only remove audio once nothing refers to it anymore
+                for filename in deleted_filenames:
+                    s3.delete_object(Bucket="storytimeai", Key="speech/%s" % filename)
+
+            print("%s %d %s, %s %d duplicates" % (
+                "Would hash" if dry_run else "Hashed", hashed, model.__tablename__,
+                "would delete" if dry_run else "deleted", duplicates
+            ))
 
     from app.mod_billing.controllers import mod_billing as billing_module
     from app.mod_characters.controllers import mod_characters as characters_module
@@ -111,7 +287,14 @@ def configure_app(app):
 
     app.json_encoder = StorytimeJSONEncoder
 
-    from app.log import Log
+    from app.log import create_log_writer
+
+    log_writer = create_log_writer(app)
+
+    # Each worker process starts its own log writer thread
+    @app.before_first_request
+    def start_log_writer():
+        log_writer.start()
 
     @app.after_request
     def after_request(response):
@@ -130,14 +313,28 @@ def configure_app(app):
         if current_user.is_authenticated:
             user_id = current_user.id
 
-        log = Log(ip, method, path, status_code, user_id)
-        db.session.add(log)
-        db.session.commit()
+        # Logs are written to MySQL in batches by the log writer's thread
+        log_writer.write(ip, method, path, status_code, user_id)
 
         return response
 
     db.create_all()
 
+    # Apply mastery updates queued by finished games in the background, starting
+    # once the app serves its first request so that CLI commands don't
+    if app.config["MASTERY_WORKER"]:
+        from app.mod_mastery import start_mastery_worker
+
+        @app.before_first_request
+        def start_background_workers():
+            start_mastery_worker(app)
+
+    # Load jieba's dictionary now instead of during the first request
+    from app.chinese import load_dictionary
+
+    startup_metrics["jieba_load_seconds"] = load_dictionary(app.config["JIEBA_CACHE_FILE"])
+    app.logger.info("Loaded jieba dictionary in %.3f seconds", startup_metrics["jieba_load_seconds"])
+
 def configure_test_client(application):
     os.environ["ENVIRONMENT"] = "development"
     os.environ["RDS_DB_NAME"] = "storytime_test"
@@ -146,6 +343,9 @@ def configure_test_client(application):
     os.environ["RDS_USERNAME"] = "root"
     os.environ["SECRET_KEY"] = "secret"
 
+    # Tests apply queued mastery updates themselves
+    os.environ["MASTERY_WORKER"] = "false"
+
     configure_app(application)
     application.debug = True
     return application.test_client()
@@ -0,0 +1,127 @@
+from app import db
+from app.mod_passages import Passage
+from app.mod_stories import Story
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+import json, threading, time
+
+# The number of seconds before the catalog is loaded from MySQL again, which
+# picks up changes made by other processes
+CATALOG_TTL = 60
+
+catalog = None
+catalog_lock = threading.Lock()
+
+class Catalog(object):
+    """A snapshot of every story and passage, without passage data, which is
+    too large to keep in memory. Catalogs are never changed after they're
+    created, so callers need to copy anything they want to change.
+    """
+
+    def __init__(self, stories, passages):
+        # Stories in order of position, as serialized JSON data
+        self.stories = tuple(stories)
+        self.stories_by_id = {story["id"]: story for story in self.stories}
+
+        # Maps passage ids to serialized JSON data, without "data"
+        self.passages = passages
+
+        # The ids of the passages in every story, in curriculum order, and a map
+        # from passage ids to their positions in that order
+        self.passage_ids = tuple(passage_id for story in self.stories for passage_id in story["passage_ids"])
+        self.positions = {passage_id: idx for (idx, passage_id) in reversed(list(enumerate(self.passage_ids)))}
+
+        self.loaded_at = time.time()
+
+def load_catalog():
+    stories = [story.serialize() for story in Story.query.order_by(Story.position.asc()).all()]
+
+    # Only select passage metadata, leaving out data and annotations
+    rows = db.session.query(
+        Passage.id, Passage.name, Passage.description, Passage.story_id, Passage.new_words,
+        Passage.notes, Passage.parts, Passage.created_at, Passage.updated_at
+    ).all()
+
+    passages = {}
+
+    for row in rows:
+        passages[row.id] = {
+            "id": row.id,
+            "name": row.name,
+            "description": row.description,
+            "story_id": row.story_id,
+            "new_words": json.loads(row.new_words),
+            "notes": row.notes,
+            "parts": json.loads(row.parts),
+            "created_at": row.created_at,
+            "updated_at": row.updated_at
+        }
+
+    return Catalog(stories, passages)
+
+def load_passage_ids():
+    """Loads the ids of the passages in every story in curriculum order straight
+    from MySQL, for callers that can't use a catalog that might be out of date.
+
+    Returns:
+        A list of passage ids, each appearing once.
+    """
+
+    passage_ids = []
+    seen = set()
+
+    for row in db.session.query(Story.passage_ids).order_by(Story.position.asc()).all():
+        for passage_id in json.loads(row.passage_ids):
+            if passage_id not in seen:
+                seen.add(passage_id)
+                passage_ids.append(passage_id)
+
+    return passage_ids
+
+def get_catalog():
+    """Retrieves the catalog, loading it from MySQL if stories or passages have
+    changed since it was loaded or if it was loaded too long ago.
+
+    Returns:
+        The current Catalog.
+    """
+
+    global catalog
+
+    current = catalog
+
+    if current is not None and time.time() - current.loaded_at < CATALOG_TTL:
+        return current
+
+    with catalog_lock:
+        # Another thread may have loaded the catalog while this one waited
+        if catalog is not None and catalog is not current:
+            return catalog
+
+        catalog = load_catalog()
+        return catalog
+
+def invalidate_catalog():
+    global catalog
+    catalog = None
+
+def catalog_changed(mapper, connection, target):
+    # Wait until the change is committed, so the catalog isn't loaded again
+    # before the change can be seen
+    object_session(target).info["catalog_changed"] = True
+
+def session_committed(session):
+    if session.info.pop("catalog_changed", False):
+        invalidate_catalog()
+
+def session_rolled_back(session):
+    session.info.pop("catalog_changed", None)
+
+for model in [Passage, Story]:
+    event.listen(model, "after_insert", catalog_changed)
+    event.listen(model, "after_update", catalog_changed)
+    event.listen(model, "after_delete", catalog_changed)
+
+event.listen(Session, "after_commit", session_committed)
+event.listen(Session, "after_rollback", session_rolled_back)
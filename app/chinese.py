@@ -1,23 +1,44 @@
-import jieba
+from functools import lru_cache
+import hashlib, jieba, threading, time
 from pypinyin import pinyin as pypinyin
+from sqlalchemy import event
 
 from app import db
 
-def pinyin(text):
-    # Separate Chinese sentences into separate words
-    word_generator = jieba.cut(text)
-    words = [{"chinese": word, "punctuation": False} for word in word_generator]
+# The greatest number of segmented texts that are kept in memory
+SEGMENT_CACHE_SIZE = 4096
+
+# The greatest number of words whose pinyin is kept in memory
+PINYIN_CACHE_SIZE = 16384
+
+# The number of seconds between checks for changes to jieba_exceptions. Rows
+# are usually edited directly in MySQL, and other processes edit them too, so
+# SQLAlchemy events alone can't tell when cached segmentations are out of date
+EXCEPTIONS_CHECK_INTERVAL = 30
+
+@lru_cache(maxsize=PINYIN_CACHE_SIZE)
+def word_pinyin(word):
+    # pypinyin returns a list of syllables for each character, join them all
+    return "".join([syllable for syllables in pypinyin(word) for syllable in syllables])
+
+def annotate(words):
+    """Adds pinyin to a list of Chinese words, capitalizing the first word of
+    each sentence and replacing Chinese punctuation.
 
-    # Add pinyin to the word objects
-    pinyin_words = [pypinyin(word["chinese"]) for word in words]
-    flattened_pinyin_words = [[j for i in words for j in i] for words in pinyin_words]
-    joined_pinyin_words = ["".join(words) for words in flattened_pinyin_words]
+    Args:
+        words: The Chinese words to annotate, in order.
+
+    Returns:
+        A list of word objects with chinese, pinyin, and punctuation keys.
+    """
+
+    words = [{"chinese": word, "punctuation": False} for word in words]
 
     # True if the next word in the loop needs to be capitalized
     capitalize_next_word = True
 
     for i, _ in enumerate(words):
-        word = joined_pinyin_words[i]
+        word = word_pinyin(words[i]["chinese"])
 
         if capitalize_next_word:
             # Capitalize this word, don't capitalize the next one
@@ -43,15 +64,41 @@ def pinyin(text):
 
         words[i]["pinyin"] = word
 
-    sentence = ""
+    return words
+
+def pinyin_many(texts):
+    """Converts several pieces of Chinese text to pinyin sentences. Words that
+    appear in more than one text are only converted once.
+
+    Args:
+        texts: The Chinese texts to convert.
 
-    for word in words:
-        if word["punctuation"]:
-            sentence += word["pinyin"]
-        else:
-            sentence += " " + word["pinyin"]
+    Returns:
+        A list with the pinyin sentence for each text, in the same order.
+    """
 
-    return sentence[1:len(sentence)]
+    sentences = {}
+
+    for text in texts:
+        if text in sentences:
+            continue
+
+        # Separate Chinese sentences into separate words and add pinyin to them
+        words = annotate(jieba.cut(text))
+        parts = []
+
+        for word in words:
+            if not word["punctuation"]:
+                parts.append(" ")
+
+            parts.append(word["pinyin"])
+
+        sentences[text] = "".join(parts)[1:]
+
+    return [sentences[text] for text in texts]
+
+def pinyin(text):
+    return pinyin_many([text])[0]
 
 class JiebaException(db.Model):
 
@@ -63,26 +110,204 @@ class JiebaException(db.Model):
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
 
-def segment(chinese):
-    punctuation = ["。", "？", "！", "，", ".", "!", "?", ","]
-    words = [x for x in jieba.cut(chinese) if x not in punctuation]
+class ExceptionRules(object):
+    """Every JiebaException, compiled so that they can all be applied to a list
+    of words in one pass.
+    """
+
+    def __init__(self, exceptions):
+        # Maps single words to the list of words that should replace them
+        self.replacements = {}
+
+        # Trie of word sequences that should be replaced. Each node maps a word
+        # to the next node, and the None key holds the replacement words
+        self.trie = {}
+
+        for exception in exceptions:
+            replacement = exception.replacement.split(",")
+
+            if "," in exception.word:
+                node = self.trie
+
+                for word in exception.word.split(","):
+                    node = node.setdefault(word, {})
+
+                node[None] = replacement
+            else:
+                self.replacements[exception.word] = replacement
+
+    def apply(self, words):
+        # Split up single words first, since sequences are matched against
+        # the words that come out of these replacements
+        split_words = []
+
+        for word in words:
+            if word in self.replacements:
+                split_words.extend(self.replacements[word])
+            else:
+                split_words.append(word)
+
+        new_words = []
+        i = 0
+
+        while i < len(split_words):
+            node = self.trie
+            match = None
+            j = i
+
+            # Walk the trie as far as possible from this word, remembering the
+            # longest sequence that has a replacement
+            while j < len(split_words) and split_words[j] in node:
+                node = node[split_words[j]]
+                j += 1
+
+                if None in node:
+                    match = (j, node[None])
+
+            if match is None:
+                new_words.append(split_words[i])
+                i += 1
+            else:
+                new_words.extend(match[1])
+                i = match[0]
+
+        return new_words
 
-    exceptions = JiebaException.query.filter(JiebaException.word.in_(words) & ~JiebaException.word.like("%,%")).all()
-    exceptions_map = {exception.word: exception.replacement for exception in exceptions}
+# Compiled exceptions, loaded from MySQL the first time they're needed
+exception_rules = None
 
-    new_words = []
+def get_exception_rules():
+    global exception_rules
 
-    for word in words:
-        if word in exceptions_map:
-            new_words.extend(exceptions_map[word].split(","))
-        else:
-            new_words.append(word)
+    if exception_rules is None:
+        exceptions = JiebaException.query.all()
 
-    new_words_string = ",".join(new_words)
+        # Words that multi-word exceptions join together need to be in jieba's
+        # dictionary, including ones added since the dictionary was loaded
+        for exception in exceptions:
+            if "," in exception.word:
+                for word in exception.replacement.split(","):
+                    jieba.add_word(word)
 
-    reverse_exceptions = JiebaException.query.filter(JiebaException.word.like("%,%")).all()
+        exception_rules = ExceptionRules(exceptions)
+
+    return exception_rules
+
+# The version of jieba_exceptions that cached segmentations were made with, and
+# when it was last compared against MySQL
+exceptions_version = None
+exceptions_checked_at = 0
+exceptions_lock = threading.Lock()
+
+def load_exceptions_version():
+    # Adding or changing a row changes the latest updated_at, and removing one
+    # changes the count
+    count, updated_at = db.session.query(db.func.count(JiebaException.id), db.func.max(JiebaException.updated_at)).one()
+    return (count, updated_at)
+
+def check_exceptions():
+    """Forgets cached segmentations if jieba_exceptions has changed since they
+    were made, checking MySQL at most once every EXCEPTIONS_CHECK_INTERVAL
+    seconds.
+    """
+
+    global exceptions_version, exceptions_checked_at
+
+    if time.time() - exceptions_checked_at < EXCEPTIONS_CHECK_INTERVAL:
+        return
+
+    with exceptions_lock:
+        # Another thread may have checked while this one waited
+        if time.time() - exceptions_checked_at < EXCEPTIONS_CHECK_INTERVAL:
+            return
+
+        version = load_exceptions_version()
+
+        if version != exceptions_version:
+            reload_exceptions()
+            exceptions_version = version
+
+        # Only skip checks once the new version is in place, so that other
+        # threads never segment with old exceptions or find no version at all
+        exceptions_checked_at = time.time()
+
+def segmentation_version():
+    """Identifies the dictionary and exceptions that segment currently uses, so
+    that text segmented earlier can be segmented again once they change.
+
+    Returns:
+        A 40 character hex digest.
+    """
+
+    check_exceptions()
+
+    count, updated_at = exceptions_version
+    version = "%s:%d:%s" % (jieba.__version__, count, updated_at)
+
+    return hashlib.sha1(version.encode("utf-8")).hexdigest()
+
+def reload_exceptions(*args):
+    """Forgets the compiled exceptions and any cached segmentations, so the next
+    call to segment uses the latest rows in jieba_exceptions.
+    """
+
+    global exception_rules
+
+    exception_rules = None
+    _segment.cache_clear()
+
+def load_dictionary(cache_file):
+    """Builds jieba's prefix dictionary before any text is segmented, so the
+    first request a worker handles doesn't have to. The dictionary is loaded
+    from the snapshot in cache_file if there is one, and the snapshot is saved
+    there otherwise. Words that multi-word exceptions join together are added
+    to the dictionary as well.
+
+    Args:
+        cache_file: The path of the dictionary snapshot.
+
+    Returns:
+        The number of seconds it took to load the dictionary.
+    """
+
+    global exceptions_version, exceptions_checked_at
+
+    start = time.time()
+
+    jieba.dt.cache_file = cache_file
+    jieba.initialize()
+
+    # Anything segmented before now used the old dictionary, and compiling the
+    # exceptions again adds their words to the new one
+    with exceptions_lock:
+        version = load_exceptions_version()
+        reload_exceptions()
+        get_exception_rules()
+
+        exceptions_version = version
+        exceptions_checked_at = time.time()
+
+    return time.time() - start
+
+def segment(chinese):
+    # Compile the exceptions before segmenting, since compiling them can add
+    # words to jieba's dictionary
+    check_exceptions()
+    get_exception_rules()
+
+    # Return a copy so that callers can't modify the cached list of words
+    return list(_segment(chinese))
+
+@lru_cache(maxsize=SEGMENT_CACHE_SIZE)
+def _segment(chinese):
+    punctuation = ["。", "？", "！", "，", ".", "!", "?", ","]
+    words = [x for x in jieba.cut(chinese) if x not in punctuation]
 
-    for exception in reverse_exceptions:
-        new_words_string = new_words_string.replace(exception.word, exception.replacement)
+    return tuple(get_exception_rules().apply(words))
 
-    return new_words_string.split(",")
+# Compiled exceptions and cached segmentations depend on the exceptions table,
+# so reload them right away whenever this process changes an exception. Changes
+# made anywhere else are picked up by check_exceptions
+event.listen(JiebaException, "after_insert", reload_exceptions)
+event.listen(JiebaException, "after_update", reload_exceptions)
+event.listen(JiebaException, "after_delete", reload_exceptions)
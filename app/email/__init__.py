@@ -50,7 +50,7 @@ def send(email, user=None, data=None, email_address=None):
     if user is not None:
         # Load user settings to see if the user's first and last names have been
         # saved. Otherwise, use their username for the email.
-        settings = json.loads(user.settings)
+        settings = user.get_settings()
         username = user.username
         first_name = settings["profile"]["first_name"]
         last_name = settings["profile"]["last_name"]
@@ -1,5 +1,11 @@
 from app import db
 
+from datetime import datetime
+from fnmatch import fnmatchcase
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+import atexit, json, logging, os, queue, random, threading, time
+
 class Log(db.Model):
 
     __tablename__ = "logs"
@@ -18,3 +24,227 @@ class Log(db.Model):
         self.path = path
         self.status_code = status_code
         self.user_id = user_id
+
+class MySQLLogSink(object):
+    """Inserts logs into the logs table."""
+
+    name = "mysql"
+
+    def __init__(self, app):
+        self.app = app
+
+    def write(self, records):
+        with self.app.app_context():
+            # Insert every log with one multi-row INSERT
+            db.engine.execute(Log.__table__.insert(), records)
+
+class FileLogSink(object):
+    """Appends logs to a local file as JSON lines, starting a new file once the
+    current one is too large and keeping a fixed number of old files. Rotating
+    a file that several processes write to loses lines, so each process writes
+    to its own file, with its pid added to the name.
+    """
+
+    name = "file"
+
+    def __init__(self, path, max_bytes, backup_count):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.handler = None
+
+    def process_path(self):
+        root, extension = os.path.splitext(self.path)
+        return "%s.%d%s" % (root, os.getpid(), extension)
+
+    def open(self):
+        path = self.process_path()
+        directory = os.path.dirname(path)
+
+        if directory != "" and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.handler = RotatingFileHandler(path, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding="utf-8")
+        self.handler.setFormatter(logging.Formatter("%(message)s"))
+
+    def write(self, records):
+        # The file is opened on the first write, which happens in the process
+        # that serves requests even if the app was created before forking
+        if self.handler is None:
+            self.open()
+
+        for record in records:
+            line = dict(record, timestamp=record["timestamp"].isoformat())
+            self.handler.emit(logging.makeLogRecord({"msg": json.dumps(line)}))
+
+        self.handler.flush()
+
+def create_log_sinks(app):
+    """Creates the sinks named in the LOG_SINKS config value.
+
+    Returns:
+        A list of sinks.
+    """
+
+    sinks = []
+
+    for name in app.config["LOG_SINKS"]:
+        if name == MySQLLogSink.name:
+            sinks.append(MySQLLogSink(app))
+        elif name == FileLogSink.name:
+            sinks.append(FileLogSink(app.config["LOG_FILE"], app.config["LOG_FILE_MAX_BYTES"], app.config["LOG_FILE_BACKUP_COUNT"]))
+        else:
+            raise ValueError("Unknown log sink: %s" % name)
+
+    return sinks
+
+class LogWriter(object):
+    """Collects request logs in memory and writes them to every sink in batches
+    from a background thread, so that requests don't wait on logs being
+    written. Logs are dropped instead of queued once the buffer is full.
+    """
+
+    def __init__(self, sinks, sample_rates=None, max_size=10000, batch_size=500, interval=2):
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.interval = interval
+        self.buffer = queue.Queue(maxsize=max_size)
+        self.stopping = threading.Event()
+        self.thread = None
+
+        # The process the thread was started in, since threads don't survive a
+        # fork into the server's worker processes
+        self.pid = None
+        self.start_lock = threading.Lock()
+
+        # (pattern, rate) pairs, where the first pattern that matches a path
+        # decides the fraction of its requests that are logged
+        self.sample_rates = list((sample_rates or {}).items())
+
+        self.stats = {
+            "written": {sink.name: 0 for sink in sinks},
+            "dropped": 0,
+            "sampled_out": 0,
+            "failed": {sink.name: 0 for sink in sinks},
+            "flushes": 0
+        }
+
+    @lru_cache(maxsize=4096)
+    def sample_rate(self, path):
+        for (pattern, rate) in self.sample_rates:
+            if fnmatchcase(path, pattern):
+                return rate
+
+        return 1
+
+    def write(self, ip, method, path, status_code, user_id=None):
+        # A worker forked after the thread started needs its own thread
+        if self.pid is not None and self.pid != os.getpid():
+            self.start()
+
+        # Only log some requests to busy paths
+        rate = self.sample_rate(path)
+
+        if rate < 1 and random.random() >= rate:
+            self.stats["sampled_out"] += 1
+            return
+
+        # Take the timestamp now, since the log may be inserted a while later
+        record = {
+            "ip": ip,
+            "method": method,
+            "path": path,
+            "status_code": status_code,
+            "user_id": user_id,
+            "timestamp": datetime.utcnow()
+        }
+
+        try:
+            self.buffer.put_nowait(record)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def start(self):
+        """Starts the thread for this process, unless it's already running."""
+
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+
+            if self.pid is not None:
+                # Logs buffered by the parent are written by the parent
+                self.buffer = queue.Queue(maxsize=self.buffer.maxsize)
+                self.stopping = threading.Event()
+            else:
+                # Write whatever is left in the buffer when the process exits
+                atexit.register(self.stop)
+
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, name="log-writer", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+
+        if self.thread is not None:
+            self.thread.join(self.interval * 2)
+
+        self.flush(self.drain(self.buffer.qsize()))
+
+    def run(self):
+        while not self.stopping.is_set():
+            # Wait until there are enough logs for a batch, or until it's been
+            # long enough since the last flush
+            deadline = time.time() + self.interval
+            records = []
+
+            while len(records) < self.batch_size and not self.stopping.is_set():
+                try:
+                    records.append(self.buffer.get(timeout=max(deadline - time.time(), 0)))
+                except queue.Empty:
+                    break
+
+            self.flush(records)
+
+    def drain(self, limit):
+        records = []
+
+        while len(records) < limit:
+            try:
+                records.append(self.buffer.get_nowait())
+            except queue.Empty:
+                break
+
+        return records
+
+    def flush(self, records):
+        if len(records) == 0:
+            return
+
+        # A sink failing doesn't stop logs from being written to the others
+        for sink in self.sinks:
+            try:
+                sink.write(records)
+                self.stats["written"][sink.name] += len(records)
+            except Exception as e:
+                self.stats["failed"][sink.name] += len(records)
+                print("Request logs could not be written to %s: %s" % (sink.name, e))
+
+        self.stats["flushes"] += 1
+
+log_writer = None
+
+def create_log_writer(app):
+    """Creates the log writer, unless it already exists. Its thread isn't
+    started here, since the app is created before the server forks its workers.
+
+    Returns:
+        The log writer.
+    """
+
+    global log_writer
+
+    if log_writer is None:
+        log_writer = LogWriter(create_log_sinks(app), app.config["LOG_SAMPLE_RATES"])
+
+    return log_writer
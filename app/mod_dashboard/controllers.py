@@ -1,8 +1,10 @@
 from flask import Blueprint, jsonify, request
 import json, re
 
-from app import admin_required, db
+from app import admin_required, db, startup_metrics
 from app.chinese import segment
+import app.log as log
+import app.mod_speech.cache as speech_cache
 from app.mod_games.mod_compound import CompoundQuestion
 from app.mod_games.mod_copy_edit import CopyEditQuestion
 from app.mod_games.mod_expressions import ExpressionsQuestion
@@ -120,3 +122,21 @@ def get_stats():
     ]
 
     return jsonify(stats)
+
+@mod_dashboard.route("/metrics", methods=["GET"])
+@admin_required
+def get_metrics():
+    """Retrieves measurements about this server process.
+
+    Returns:
+        JSON data with startup metrics, request log counters and speech cache
+        counters.
+    """
+
+    data = {
+        "startup": startup_metrics,
+        "logs": log.log_writer.stats if log.log_writer is not None else None,
+        "speech_cache": speech_cache.speech_cache.stats if speech_cache.speech_cache is not None else None
+    }
+
+    return jsonify(data)
@@ -1,7 +1,8 @@
 from enum import Enum
 
-from .models import Attempt, GameResult
+from .models import Attempt, GameResult, GameState, QuestionState, QuestionWord
 from .mod_compound import CompoundQuestion, CompoundResult
+from .mod_copy_edit import CopyEditQuestion, CopyEditResult
 from .mod_expressions import ExpressionsQuestion, ExpressionsResult
 from .mod_mad_minute import MadMinuteResult
 from .mod_narrative import NarrativeQuestion, NarrativeResult
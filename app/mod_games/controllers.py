@@ -89,6 +89,10 @@ def finish_game(game_name):
     wrong_question_ids = request.json["wrong_question_ids"]
     wrong_words = request.json["wrong_words"]
 
+    # Update the user's question states first, so that rebuilding them from
+    # past results doesn't count this game twice
+    g.game.question.record_results(current_user.id, correct_question_ids, wrong_question_ids)
+
     # Save generic game result
     result = GameResult(current_user.id, g.game, 0)
     db.session.add(result)
@@ -97,10 +101,13 @@ def finish_game(game_name):
     # Save more detailed game result
     game_result = g.game.result(current_user.id, result.id, correct, wrong, correct_question_ids, wrong_question_ids)
     db.session.add(game_result)
-    db.session.commit()
 
-    # Update all masteries with words the user has practiced
+    # Queue updates to all masteries with words the user has practiced. They're
+    # inserted in the same transaction as the result, so they're only applied
+    # in the background if the result is saved, and are rolled back with it
+    # otherwise.
     update_masteries(current_user.id, correct_words, wrong_words)
+    db.session.commit()
 
     # Return the general game result as JSON data
     return jsonify(result.serialize())
@@ -137,7 +144,7 @@ def get_questions(game_name):
         questions = g.game.question.query.all()
 
     # Return questions JSON data
-    questions_data = [question.serialize() for question in questions]
+    questions_data = [question.cached_serialize() for question in questions]
     return jsonify(questions_data)
 
 @mod_games.route("/<game_name>/questions/<question_id>", methods=["GET"])
@@ -154,7 +161,7 @@ def get_question(game_name, question_id):
     if question is None:
         return errors.question_not_found()
     else:
-        return jsonify(question.serialize())
+        return jsonify(question.cached_serialize())
 
 @mod_games.route("/<game_name>/questions", methods=["POST"])
 @admin_required
@@ -181,6 +188,10 @@ def create_question(game_name):
     # Create the question and store it in MySQL
     question = g.game.question(**data)
     db.session.add(question)
+    db.session.flush()
+
+    # Add the question's words to the word index
+    question.index_words()
     db.session.commit()
 
     # Return JSON data of the question
@@ -213,8 +224,15 @@ def update_question(game_name, question_id):
     for key, value in request.json.items():
         question.update(key, value)
 
+    # Keep the word index in sync with the question's text
+    question.index_words()
+
     # Save changes in MySQL
     db.session.commit()
 
+    # updated_at only has a precision of one second, so don't rely on it to
+    # tell this version of the question apart from the last one
+    question.invalidate_serialization()
+
     # Return update question JSON data
-    return jsonify(question.serialize())
+    return jsonify(question.cached_serialize())
@@ -19,9 +19,9 @@ class CompoundQuestion(Question):
     answer = db.Column(db.String(255), nullable=False)
 
     def __init__(self, prompt, choices, answer):
-        update("prompt", prompt)
-        update("choices", choices)
-        update("answer", answer)
+        self.update("prompt", prompt)
+        self.update("choices", choices)
+        self.update("answer", answer)
 
     def serialize(self):
         all_choices = []
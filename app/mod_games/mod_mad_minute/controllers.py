@@ -5,9 +5,10 @@ import random
 from shushu import convert
 
 from app import db
-from app.chinese import pinyin
+from app.chinese import pinyin_many
 from app.mod_games import Game
 from app.mod_games import GameResult
+import app.mod_games.errors as errors
 from app.mod_games.mod_mad_minute import MadMinuteResult
 from app.mod_mastery import update_masteries
 from app.utils import check_body
@@ -46,7 +47,8 @@ def play_game():
 
             # Make the answer and prompt to return later
             answer = convert(first_number + second_number)
-            prompt = pinyin(convert(first_number)) + " + " + pinyin(convert(second_number)) + " ="
+            first_pinyin, second_pinyin, answer_pinyin = pinyin_many([convert(first_number), convert(second_number), answer])
+            prompt = first_pinyin + " + " + second_pinyin + " ="
         else:
             # Make sure that the all values ≤ 10
             while first_number - second_number < 1:
@@ -55,7 +57,8 @@ def play_game():
 
             # Make the answer and prompt to return later
             answer = convert(first_number - second_number)
-            prompt = pinyin(convert(first_number)) + " - " + pinyin(convert(second_number)) + " ="
+            first_pinyin, second_pinyin, answer_pinyin = pinyin_many([convert(first_number), convert(second_number), answer])
+            prompt = first_pinyin + " - " + second_pinyin + " ="
 
         prompt = prompt.lower()
 
@@ -67,7 +70,7 @@ def play_game():
             question = {
                 "addition": addition,
                 "answer": answer,
-                "answer_pinyin": pinyin(answer).lower(),
+                "answer_pinyin": answer_pinyin.lower(),
                 "first_number": first_number,
                 "prompt": prompt.lower(),
                 "second_number": second_number,
@@ -110,10 +113,11 @@ def finish_game():
     # Save more detailed mad minute game result
     mad_minute_result = MadMinuteResult(current_user.id, result.id, correct, wrong)
     db.session.add(mad_minute_result)
-    db.session.commit()
 
-    # Update all masteries with words the user has practiced
+    # Queue updates to all masteries with words the user has practiced, which
+    # are saved along with the result and applied in the background
     update_masteries(current_user.id, correct_words, wrong_words)
+    db.session.commit()
 
     # Return the general game result as JSON data
     return jsonify(result.serialize())
@@ -1,7 +1,7 @@
 import json
 
 from app import db
-from app.chinese import pinyin, segment
+from app.chinese import pinyin, pinyin_many, segment
 from app.mod_games.question import Question
 from app.mod_games.result import Result
 
@@ -22,9 +22,9 @@ class ScribeQuestion(Question):
     other_english_answers = db.Column(db.Text, nullable=False)
 
     def __init__(self, chinese, english, other_english_answers):
-        update("chinese", chinese)
-        update("english", english)
-        update("other_english_answers", other_english_answers)
+        self.update("chinese", chinese)
+        self.update("english", english)
+        self.update("other_english_answers", other_english_answers)
 
     def serialize(self):
         return {
@@ -40,10 +40,12 @@ class ScribeQuestion(Question):
 
     def update(self, key, value):
         if key == "chinese":
+            words = segment(value)
+
             self.chinese = value
             self.pinyin = pinyin(value)
-            self.words = json.dumps(segment(value))
-            self.words_pinyin = json.dumps([pinyin(word) for word in segment(value)])
+            self.words = json.dumps(words)
+            self.words_pinyin = json.dumps(pinyin_many(words))
         elif key == "other_english_answers":
             self.other_english_answers = json.dumps(value)
         else:
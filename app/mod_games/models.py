@@ -51,3 +51,61 @@ class GameResult(Base):
             "score": self.score,
             "timestamp": self.timestamp
         }
+
+class GameState(Base):
+
+    __tablename__ = "game_states"
+    __table_args__ = (db.UniqueConstraint("user_id", "game"),)
+
+    user_id = db.Column(db.Integer, nullable=False)
+    game = db.Column(db.Integer, nullable=False)
+    games_played = db.Column(db.Integer, nullable=False)
+
+    def __init__(self, user_id, game, games_played=0):
+        self.user_id = user_id
+        self.game = game.value
+        self.games_played = games_played
+
+class QuestionState(Base):
+
+    __tablename__ = "question_states"
+    __table_args__ = (db.UniqueConstraint("user_id", "game", "question_id"),)
+
+    user_id = db.Column(db.Integer, nullable=False)
+    game = db.Column(db.Integer, nullable=False)
+    question_id = db.Column(db.Integer, nullable=False)
+
+    # The number of times this question has been answered correctly in a row,
+    # or -1 if it was last answered incorrectly
+    streak = db.Column(db.Integer, nullable=False)
+
+    # The number of games the user had played when they last saw this question
+    last_seen_game = db.Column(db.Integer, nullable=False)
+
+    def __init__(self, user_id, game, question_id):
+        self.user_id = user_id
+        self.game = game.value
+        self.question_id = question_id
+        self.streak = 0
+        self.last_seen_game = 0
+
+class QuestionWord(Base):
+
+    __tablename__ = "question_words"
+    __table_args__ = (
+        db.Index("question_words_word", "question_table", "word"),
+        db.Index("question_words_question", "question_table", "question_id")
+    )
+
+    question_table = db.Column(db.String(32), nullable=False)
+    question_id = db.Column(db.Integer, nullable=False)
+    word = db.Column(db.String(255), nullable=False)
+
+    # The number of times this word appears in the question
+    count = db.Column(db.Integer, nullable=False)
+
+    def __init__(self, question_table, question_id, word, count):
+        self.question_table = question_table
+        self.question_id = question_id
+        self.word = word
+        self.count = count
@@ -1,10 +1,124 @@
 from app import db
-from app.chinese import segment
-from app.mod_mastery import Mastery
+from app.chinese import segment, segmentation_version
+from app.mod_games.models import GameState, QuestionState, QuestionWord
+from app.mod_mastery import get_masteries
 from app.mod_vocab import Entry
+from app.utils import LRUCache
 
+from collections import Counter
 from flask_login import current_user
-import json, math, numpy as np
+from sqlalchemy.exc import IntegrityError
+import json, numpy as np, threading, time
+
+# The greatest number of serialized questions that are kept in memory
+SERIALIZATION_CACHE_SIZE = 4096
+
+# The number of seconds between checks for entries changed by other processes
+ENTRIES_CHECK_INTERVAL = 30
+
+# Maps (table, question type, question id, updated_at, serialization version)
+# to serialized question data
+serialization_cache = LRUCache(SERIALIZATION_CACHE_SIZE)
+
+# The version of the entries table when it was last compared against MySQL
+entries_version = None
+entries_checked_at = 0
+entries_lock = threading.Lock()
+
+# Question tables whose existing questions have all been added to the word index
+# by this process, and a lock for each table that's held while indexing it
+indexed_tables = set()
+indexed_table_locks = {}
+indexed_tables_lock = threading.Lock()
+
+def positions_of(ids, values):
+    """Finds where each value is in ids, which needn't be sorted.
+
+    Args:
+        ids: A numpy array of unique ids.
+        values: A numpy array of ids that are all in ids.
+
+    Returns:
+        A numpy array with the position in ids of each value.
+    """
+
+    order = np.argsort(ids)
+    return order[np.searchsorted(ids, values, sorter=order)]
+
+def pick_by_difficulty(difficulties, target_difficulties):
+    """Picks a different question for each target difficulty, taking the easiest
+    question at or above the target that hasn't been picked yet, or the hardest
+    one below it if there are none.
+
+    Args:
+        difficulties: A numpy array with the difficulty of each question.
+        target_difficulties: The difficulties to look for, in order.
+
+    Returns:
+        The positions in difficulties of the picked questions, in the order
+        that they were picked.
+    """
+
+    # Sort questions by difficulty scores so we can use binary search
+    order = np.argsort(difficulties, kind="mergesort")
+    sorted_difficulties = difficulties[order]
+    picked = np.zeros(len(difficulties), dtype=bool)
+
+    picked_positions = []
+
+    for difficulty in target_difficulties:
+        if picked.all():
+            break
+
+        first = np.searchsorted(sorted_difficulties, difficulty)
+        available = np.flatnonzero(~picked[first:])
+
+        if len(available) > 0:
+            position = first + available[0]
+        else:
+            position = np.flatnonzero(~picked[:first])[-1]
+
+        picked[position] = True
+        picked_positions.append(int(order[position]))
+
+    return picked_positions
+
+def clear_serialization_cache():
+    serialization_cache.clear()
+
+def load_entries_version():
+    # Adding or changing an entry changes the latest updated_at, and removing
+    # one changes the count
+    return db.session.query(db.func.count(Entry.id), db.func.max(Entry.updated_at)).one()
+
+def check_entries():
+    """Finds the version of the entries table, checking MySQL at most once every
+    ENTRIES_CHECK_INTERVAL seconds.
+
+    Returns:
+        A (count, latest updated_at) pair.
+    """
+
+    global entries_version, entries_checked_at
+
+    if time.time() - entries_checked_at < ENTRIES_CHECK_INTERVAL:
+        return entries_version
+
+    with entries_lock:
+        # Another thread may have checked while this one waited
+        if time.time() - entries_checked_at >= ENTRIES_CHECK_INTERVAL:
+            entries_version = tuple(load_entries_version())
+            entries_checked_at = time.time()
+
+        return entries_version
+
+def serialization_version():
+    """Identifies everything serialized questions depend on besides their own
+    rows, which is how text is segmented and the entries that questions show.
+    Other processes can change either, so they're part of the cache key.
+    """
+
+    return (segmentation_version(), check_entries())
 
 class Question(db.Model):
 
@@ -25,6 +139,202 @@ class Question(db.Model):
         if key in keys:
             setattr(self, key, value)
 
+    def cached_serialize(self):
+        """Serializes this question, reusing the data from the last time it was
+        serialized if neither the question nor its serialization version has
+        changed since.
+
+        Returns:
+            A copy of the question's JSON data.
+        """
+
+        key = (self.__tablename__, type(self).__name__, self.id, self.updated_at, serialization_version())
+
+        data = serialization_cache.get(key)
+
+        if data is None:
+            data = self.serialize()
+            serialization_cache.put(key, data)
+
+        return dict(data)
+
+    def invalidate_serialization(self):
+        # Speaker and Scribe questions share a table, so forget this row's data
+        # for every question type
+        serialization_cache.remove_if(lambda key: key[0] == self.__tablename__ and key[2] == self.id)
+
+    def index_words(self):
+        """Replaces this question's rows in the word index, which is used to
+        find questions by the words in them. This needs to be called after the
+        question is created or updated.
+        """
+
+        QuestionWord.query.filter_by(question_table=self.__tablename__, question_id=self.id).delete()
+
+        counts = Counter([word for word in self.serialize()["words"] if word])
+        db.session.add_all([QuestionWord(self.__tablename__, self.id, word, count) for word, count in counts.items()])
+
+    @classmethod
+    def rebuild_word_index(cls):
+        # Remove every row for this question type and index each question again
+        QuestionWord.query.filter_by(question_table=cls.__tablename__).delete()
+
+        for question in cls.query.all():
+            question.index_words()
+
+        db.session.commit()
+
+    @classmethod
+    def index_missing_words(cls):
+        """Indexes the words in questions that aren't in the word index yet,
+        such as questions created before the index existed.
+
+        Returns:
+            The number of questions that were indexed.
+        """
+
+        indexed_ids = db.session.query(QuestionWord.question_id).filter_by(question_table=cls.__tablename__)
+        missing_ids = [row[0] for row in db.session.query(cls.id).filter(cls.id.notin_(indexed_ids)).all()]
+
+        if len(missing_ids) == 0:
+            return 0
+
+        # Lock the questions so that other processes doing the same thing wait,
+        # then check again which ones still aren't indexed
+        questions = cls.query.filter(cls.id.in_(missing_ids)).with_for_update().all()
+
+        indexed_ids = set([row[0] for row in db.session.query(QuestionWord.question_id).filter(
+            (QuestionWord.question_table == cls.__tablename__) &
+            QuestionWord.question_id.in_(missing_ids)
+        ).with_for_update(read=True).all()])
+
+        questions = [question for question in questions if question.id not in indexed_ids]
+
+        for question in questions:
+            question.index_words()
+
+        db.session.commit()
+        return len(questions)
+
+    @classmethod
+    def ensure_word_index(cls):
+        # Questions saved before the word index existed can't be found by their
+        # words until they're indexed, so index them the first time this process
+        # plays the game instead of relying on rebuild-word-index having run
+        if cls.__tablename__ in indexed_tables:
+            return
+
+        with indexed_tables_lock:
+            table_lock = indexed_table_locks.setdefault(cls.__tablename__, threading.Lock())
+
+        # Requests that arrive while another one is indexing the table play with
+        # the questions that are already indexed instead of waiting
+        if not table_lock.acquire(blocking=False):
+            return
+
+        try:
+            if cls.__tablename__ not in indexed_tables:
+                cls.index_missing_words()
+                indexed_tables.add(cls.__tablename__)
+        finally:
+            table_lock.release()
+
+    @classmethod
+    def game(cls):
+        from app.mod_games import Game
+        return next(game for game in Game if game.question is cls)
+
+    @classmethod
+    def rebuild_states(cls, user_id):
+        """Creates the user's game and question states for this game by replaying
+        all of their past results. This only needs to happen once per user, for
+        results that were saved before states were kept.
+
+        Returns:
+            The user's game state.
+        """
+
+        game = cls.game()
+
+        # Order by timestamp ascending in order to calculate streaks correctly
+        results = cls.result_type.query.filter_by(user_id=user_id) \
+                    .order_by(cls.result_type.timestamp.asc()).all()
+
+        game_state = GameState(user_id, game, len(results))
+        db.session.add(game_state)
+
+        # Maps question ids to their states
+        question_states = {}
+
+        for (idx, result) in enumerate(results):
+            # Loop through questions answered correctly to calculate streaks
+            for id in json.loads(result.correct_question_ids):
+                if id not in question_states:
+                    question_states[id] = QuestionState(user_id, game, id)
+
+                question_states[id].streak += 1
+                question_states[id].last_seen_game = idx + 1
+
+            # Loop through questions answered incorrectly to reset streaks
+            for id in json.loads(result.wrong_question_ids):
+                if id not in question_states:
+                    question_states[id] = QuestionState(user_id, game, id)
+
+                question_states[id].streak = -1
+                question_states[id].last_seen_game = idx + 1
+
+        db.session.add_all(question_states.values())
+
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another request rebuilt these states at the same time
+            db.session.rollback()
+            game_state = GameState.query.filter_by(user_id=user_id, game=game.value).first()
+
+        return game_state
+
+    @classmethod
+    def record_results(cls, user_id, correct_question_ids, wrong_question_ids):
+        """Updates the user's question states with the results of a game they
+        just finished. This needs to be called before the game's result is
+        saved, and the changes are committed along with the result.
+        """
+
+        game = cls.game()
+
+        if GameState.query.filter_by(user_id=user_id, game=game.value).count() == 0:
+            cls.rebuild_states(user_id)
+
+        # Lock the game state so games finished at the same time are counted
+        # one after the other
+        game_state = GameState.query.filter_by(user_id=user_id, game=game.value) \
+                        .with_for_update().first()
+        game_state.games_played += 1
+
+        question_ids = set(correct_question_ids) | set(wrong_question_ids)
+
+        question_states = QuestionState.query.filter(
+            (QuestionState.user_id == user_id) &
+            (QuestionState.game == game.value) &
+            QuestionState.question_id.in_(question_ids)
+        ).all() if len(question_ids) > 0 else []
+
+        question_states = {state.question_id: state for state in question_states}
+
+        for id in question_ids:
+            if id not in question_states:
+                question_states[id] = QuestionState(user_id, game, id)
+                db.session.add(question_states[id])
+
+        for id in correct_question_ids:
+            question_states[id].streak += 1
+            question_states[id].last_seen_game = game_state.games_played
+
+        for id in wrong_question_ids:
+            question_states[id].streak = -1
+            question_states[id].last_seen_game = game_state.games_played
+
     @classmethod
     def play_game(cls, words=None):
         # The number of questions to return
@@ -52,9 +362,16 @@ class Question(db.Model):
         # The list of ids of the questions that should be included in the final result
         question_ids_to_show = []
 
-        # Order by timestamp ascending in order to calculate streaks correctly
-        results = cls.result_type.query.filter_by(user_id=current_user.id) \
-                    .order_by(cls.result_type.timestamp.asc()).all()
+        cls.ensure_word_index()
+
+        # Load the user's compact history for this game
+        game = cls.game()
+        game_state = GameState.query.filter_by(user_id=current_user.id, game=game.value).first()
+
+        if game_state is None:
+            game_state = cls.rebuild_states(current_user.id)
+
+        question_states = QuestionState.query.filter_by(user_id=current_user.id, game=game.value).all()
 
         # Set of the question ids that the user has already seen
         seen_question_ids = set()
@@ -67,30 +384,10 @@ class Question(db.Model):
         # before, the question id will not be in this dictionary
         question_streaks = {}
 
-        # Loop through past Scribe results
-        for (idx, result) in enumerate(results):
-            # Loop through questions answered correctly to calculate streaks
-            for id in json.loads(result.correct_question_ids):
-                if id in question_streaks:
-                    question_streaks[id] += 1
-                else:
-                    question_streaks[id] = 1
-
-                # Games ago = number of games played - current index in loop
-                question_games_ago[id] = len(results) - idx
-
-                # Add this id to the seen_question_ids set
-                seen_question_ids.add(id)
-
-            # Loop through questions answered incorrectly to reset streaks
-            for id in json.loads(result.wrong_question_ids):
-                question_streaks[id] = -1
-
-                # Games ago = number of games played - current index in loop
-                question_games_ago[id] = len(results) - idx
-
-                # Add this id to the seen_question_ids set
-                seen_question_ids.add(id)
+        for state in question_states:
+            question_streaks[state.question_id] = state.streak
+            question_games_ago[state.question_id] = game_state.games_played - state.last_seen_game + 1
+            seen_question_ids.add(state.question_id)
 
         # Get all of the questions that were last answered incorrectly
         wrong_questions = [x for x in question_streaks if question_streaks[x] == -1]
@@ -119,145 +416,136 @@ class Question(db.Model):
             # Add these question ids to the result list
             question_ids_to_show.extend(correct_questions_to_show)
 
+        # np.random.choice returns numpy integers, which MySQL can't be sent
+        question_ids_to_show = [int(id) for id in question_ids_to_show]
+
         # Make sure questions that have been seen before but were not selected are
         # not in the pool of questions that may be picked at random. Include
         # questions that will be shown to the user so we can get their data
         excluded_question_ids = list(seen_question_ids)
         excluded_question_ids = [id for id in excluded_question_ids if id not in question_ids_to_show]
 
-        questions = []
-
-        if words == None or len(words) == 0:
-            # Retrieve all Scribe questions that have not been seen before by the user
-            questions = cls.query.filter(cls.id.notin_(excluded_question_ids)).all()
-        else:
-            # Create a filter that checks for the words provided
-            word_filter = cls.chinese.contains(words[0])
+        # Only select ids here, questions are serialized once they've been picked
+        candidates = db.session.query(cls.id).filter(cls.id.notin_(excluded_question_ids))
+
+        if words is not None and len(words) > 0:
+            # Use the word index to find questions with any of the words provided
+            candidates = candidates.filter(cls.id.in_(
+                db.session.query(QuestionWord.question_id).filter(
+                    (QuestionWord.question_table == cls.__tablename__) &
+                    QuestionWord.word.in_(words)
+                )
+            ))
+
+        candidate_ids = np.array([row[0] for row in candidates.all()], dtype=np.int64)
+
+        # Questions from the user's history are only shown if they're candidates,
+        # and everything else can be picked at random
+        question_ids_to_show = [id for id in question_ids_to_show if id in candidate_ids]
+        pool_ids = candidate_ids[~np.isin(candidate_ids, question_ids_to_show)]
+
+        # Load the words in every candidate question from the word index, as
+        # (question, word, count) triples
+        question_words = db.session.query(QuestionWord.question_id, QuestionWord.word, QuestionWord.count).filter(
+            (QuestionWord.question_table == cls.__tablename__) &
+            QuestionWord.question_id.in_(candidates)
+        ).all()
 
-            for word in words[1:]:
-                word_filter = word_filter | cls.chinese.contains(word)
+        # Questions that aren't in the word index, such as ones whose rows are
+        # being rebuilt, are scored from their own words instead of as if they
+        # had none
+        indexed_ids = set([x[0] for x in question_words])
+        unindexed_ids = [int(id) for id in pool_ids if int(id) not in indexed_ids]
 
-            # Retrieve all Scribe questions that match both filters
-            questions = cls.query.filter(
-                cls.id.notin_(excluded_question_ids) & word_filter
-            ).all()
+        if len(unindexed_ids) > 0:
+            question_words = list(question_words)
 
-        questions_data = [question.serialize() for question in questions]
+            for question in cls.query.filter(cls.id.in_(unindexed_ids)).all():
+                counts = Counter([word for word in question.cached_serialize()["words"] if word])
+                question_words.extend([(question.id, word, count) for word, count in counts.items()])
 
-        # After getting data of questions to show, remove them from questions_data
-        # so they will not be randomly picked again later
-        questions_to_show = [datum for datum in questions_data if datum["id"] in question_ids_to_show]
-        questions_data = [datum for datum in questions_data if datum["id"] not in question_ids_to_show]
+        # Drop the words of questions that were picked from the user's history
+        word_question_ids = np.array([x[0] for x in question_words], dtype=np.int64)
+        in_pool = np.isin(word_question_ids, pool_ids)
 
-        # A list of all of the words seen in every Scribe question
-        words = set()
+        word_question_ids = word_question_ids[in_pool]
+        word_counts = np.array([x[2] for x in question_words], dtype=np.float64)[in_pool]
+        question_words = np.array([x[1] for x in question_words], dtype=object)[in_pool]
 
-        for question in questions_data:
-            # Add this question's words to the words set
-            words.update(question["words"])
+        # Position of each triple's question in pool_ids, and of its word in words
+        word_rows = positions_of(pool_ids, word_question_ids)
+        words, word_columns = np.unique(question_words, return_inverse=True)
+        words = words.tolist()
 
         # Only retrieve the entries that we need
-        entries = Entry.query.filter(Entry.chinese.in_(words)).all()
-        entry_ids = [entry.id for entry in entries]
+        entries = db.session.query(Entry.id, Entry.chinese).filter(Entry.chinese.in_(words)).all() if len(words) > 0 else []
 
-        # Only retrieve the masteries that we need
-        masteries = Mastery.query.filter(
-            (Mastery.user_id == current_user.id) &
-            Mastery.entry_id.in_(entry_ids)
-        ).all()
+        # The entry id of each word, or -1 if it doesn't have an entry
+        word_positions = {word: idx for (idx, word) in enumerate(words)}
+        word_entry_ids = np.full(len(words), -1, dtype=np.int64)
 
-        # Maps Chinese words to their difficulty scores
-        difficulties = {}
-
-        # Calculate the difficulty score of each word, using the lists of entries
-        # and the user's masteries with them
-        for entry in entries:
-            mastery = next((x for x in masteries if x.entry_id == entry.id), None)
-
-            if mastery is None:
-                # An entry exists for this word, but the user has never encountered
-                # it before
-                difficulties[entry.chinese] = {
-                    "new": True,
-                    "score": 10
-                }
-            else:
-                difficulties[entry.chinese] = {
-                    "new": False,
-                    "score": 10 - mastery.mastery
-                }
-
-        word_data = {entry.chinese: {
-            "chinese": entry.chinese,
-            "english": entry.english,
-            "pinyin": entry.pinyin
-        } for entry in entries}
-
-        # Calculate the difficulty score of each question, using the word difficulty
-        # scores from above
-        for question in questions_data:
-            difficulty = 0
-            new_words = []
-
-            for word in question["words"]:
-                if word in difficulties:
-                    difficulty += difficulties[word]["score"]
-
-                    if difficulties[word]["new"]:
-                        new_words.append(word)
-                else:
-                    # An entry doesn't exist for this word, we don't know if the
-                    # user has encountered it before or not
-                    difficulty += 10
-
-            question["difficulty"] = difficulty
-
-            # Get new word data from word_data above and add to the dictionary
-            new_words = list(set(new_words))
-            question["new_words"] = list(map(lambda x: word_data[x], new_words))
-
-        # Sort questions_data by difficulty scores so we can use binary search
-        questions_data.sort(key=lambda x: x["difficulty"])
+        for (entry_id, chinese) in entries:
+            if chinese in word_positions:
+                word_entry_ids[word_positions[chinese]] = entry_id
+
+        # Look up the user's mastery of each word from their cached masteries
+        mastery_values, has_mastery = get_masteries(current_user.id).lookup(word_entry_ids)
+
+        # Words score 10 - mastery if the user has seen them and 10 otherwise
+        word_scores = np.where(has_mastery, 10.0 - mastery_values, 10.0)
+
+        # Words with entries that the user hasn't seen yet are new to them
+        new_words = (word_entry_ids >= 0) & ~has_mastery
+
+        # The difficulty of each question is the sum of its words' scores
+        difficulties = np.bincount(word_rows, weights=word_scores[word_columns] * word_counts, minlength=len(pool_ids))
 
         # Count how many questions we need to find at random
         num_other_questions = NUM_QUESTIONS - len(question_ids_to_show)
 
         # Use the normal distribution to calculate the targeted difficulty levels of
         # questions we want to find at random
-        difficulties = [math.floor(x) for x in np.random.normal(DIFFICULTY_RNORM_MEAN, DIFFICULTY_RNORM_STDEV, num_other_questions)]
-
-        # Use binary search to find questions that have difficulty scores that match
-        # or are closest to the target difficulty scores in the difficulties array
-        for difficulty in difficulties:
-            if len(questions_data) == 0:
-                break
-
-            first = 0
-            last = len(questions_data) - 1
-            found = False
-
-            while first <= last and not found:
-                midpoint = (first + last) // 2
-
-                if questions_data[midpoint]["difficulty"] == difficulty:
-                    questions_to_show.append(questions_data[midpoint])
-                    found = True
-
-                    # Delete from questions_data so this question is not randomly
-                    # picked again later
-                    del questions_data[midpoint]
-                else:
-                    if difficulty < questions_data[midpoint]["difficulty"]:
-                        last = midpoint - 1
-                    else:
-                        first = midpoint + 1
-
-            if not found:
-                questions_to_show.append(questions_data[first])
-
-                # Delete from questions_data so this question is not randomly picked
-                # again later
-                del questions_data[first]
+        target_difficulties = np.floor(np.random.normal(DIFFICULTY_RNORM_MEAN, DIFFICULTY_RNORM_STDEV, max(num_other_questions, 0)))
+
+        # Positions in pool_ids of the questions picked at random
+        picked_positions = pick_by_difficulty(difficulties, target_difficulties)
+
+        # Serialize only the questions that are being shown
+        picked_ids = [int(pool_ids[position]) for position in picked_positions]
+        questions = cls.query.filter(cls.id.in_(question_ids_to_show + picked_ids)).all() \
+            if len(question_ids_to_show + picked_ids) > 0 else []
+        questions = {question.id: question for question in questions}
+
+        questions_to_show = [questions[id].cached_serialize() for id in question_ids_to_show if id in questions]
+
+        # Find the new words in the picked questions to show their data
+        picked_new_words = {}
+
+        for position in picked_positions:
+            columns = word_columns[(word_rows == position)]
+            picked_new_words[position] = [words[column] for column in np.unique(columns[new_words[columns]])]
+
+        word_data = {}
+        all_new_words = set([word for x in picked_new_words.values() for word in x])
+
+        if len(all_new_words) > 0:
+            word_data = {entry.chinese: {
+                "chinese": entry.chinese,
+                "english": entry.english,
+                "pinyin": entry.pinyin
+            } for entry in Entry.query.filter(Entry.chinese.in_(all_new_words)).all()}
+
+        for position in picked_positions:
+            question_id = int(pool_ids[position])
+
+            if question_id not in questions:
+                continue
+
+            question_data = questions[question_id].cached_serialize()
+            question_data["difficulty"] = int(difficulties[position])
+            question_data["new_words"] = [word_data[word] for word in picked_new_words[position] if word in word_data]
+
+            questions_to_show.append(question_data)
 
         np.random.shuffle(questions_to_show)
 
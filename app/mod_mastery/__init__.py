@@ -1,117 +1,236 @@
-from app import db, sentry
+from app import db, log_error, sentry
 from app.mod_vocab import Entry
-from .models import Mastery
+from .cache import get_masteries, increment_mastery_version, update_cached_masteries
+from .models import FailedMasteryUpdate, Mastery, MasteryUpdate
 
-def update_masteries(user_id, correct_words, wrong_words):
-    # Populate this updates array to send to update_masteries
-    updates = []
+from collections import Counter, defaultdict
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+import threading, time
 
-    # Loop through all words that were in questions that were answered correctly
-    for word in correct_words:
-        existing_update_index = None
+# The greatest number of queued updates that are applied in one transaction
+MASTERY_UPDATES_BATCH_SIZE = 1000
 
-        # Search for an update if one already exists with this word
-        for (idx, update) in enumerate(updates):
-            if update["chinese"] == word:
-                existing_update_index = idx
+# The number of times a queued update is tried before it's moved to
+# failed_mastery_updates
+MAX_MASTERY_UPDATE_ATTEMPTS = 8
 
-        if existing_update_index is not None:
-            # Update the existing update if there is one
-            updates[existing_update_index]["change"] += 1
-        else:
-            # Create a new update for this word otherwise
-            updates.append({
-                "change": 1,
-                "chinese": word
-            })
-
-    # Loop through all words that were in questions that were answered incorrectly
-    for word in wrong_words:
-        existing_update_index = None
-
-        # Search for an update if one already exists with this word
-        for (idx, update) in enumerate(updates):
-            if update["chinese"] == word:
-                existing_update_index = idx
-
-        if existing_update_index is not None:
-            # Update the existing update if there is one
-            updates[existing_update_index]["change"] -= 1
-        else:
-            # Create a new update for this word otherwise
-            updates.append({
-                "change": -1,
-                "chinese": word
-            })
+# The number of seconds to wait before trying a failed update again, which
+# doubles after every attempt, so updates are given up on after about 20 minutes
+MASTERY_UPDATE_RETRY_DELAY = 10
 
-    # Get all words from the updates and convert them to entry ids
-    words = [update["chinese"] for update in updates]
-    entries = Entry.query.filter(Entry.chinese.in_(words)).all()
-    entry_ids = []
+# The number of seconds the worker waits when there are no updates to apply
+MASTERY_UPDATES_INTERVAL = 1
 
-    # Add entry ids to the updates with matching Chinese text
-    for entry in entries:
-        update_index = None
+mastery_worker = None
 
-        for (idx, datum) in enumerate(updates):
-            if datum["chinese"] == entry.chinese:
-                update_index = idx
-
-        entry_ids.append(entry.id)
-        updates[update_index]["entry_id"] = entry.id
+def update_masteries(user_id, correct_words, wrong_words):
+    """Queues changes to a user's masteries after they finish a game. The changes
+    are saved with the next commit, along with the game's result, and applied
+    later by the mastery worker.
+    """
+
+    # Each word's mastery goes up once for every time it was in a question that
+    # was answered correctly, and down once for every incorrect answer
+    changes = Counter(correct_words)
+    changes.subtract(wrong_words)
+
+    if len(changes) == 0:
+        return
+
+    db.session.execute(MasteryUpdate.__table__.insert(), [
+        {"user_id": user_id, "chinese": word, "delta": delta} for (word, delta) in changes.items()
+    ])
+
+def process_mastery_updates(limit=MASTERY_UPDATES_BATCH_SIZE):
+    """Applies the oldest queued mastery updates, combining the updates for the
+    same user and word, and removes them from the queue. If one user's updates
+    can't be applied, the rest are applied anyway and that user's updates are
+    tried again later, waiting longer after each attempt, up to
+    MAX_MASTERY_UPDATE_ATTEMPTS times.
+
+    Returns:
+        The number of queued updates that were processed.
+    """
+
+    # Lock the updates, skipping any that a worker in another process already
+    # locked, so that workers don't wait on each other or on finishing games.
+    # Users with an update that's waiting to be tried again are skipped
+    # entirely, so that each user's updates are still applied in order.
+    updates = MasteryUpdate.query.from_statement(text(
+        "SELECT * FROM mastery_updates WHERE user_id NOT IN ("
+        "SELECT user_id FROM mastery_updates WHERE next_attempt_at > CURRENT_TIMESTAMP"
+        ") ORDER BY id ASC LIMIT :limit FOR UPDATE SKIP LOCKED"
+    ).bindparams(limit=limit)).all()
+
+    if len(updates) == 0:
+        db.session.commit()
+        return 0
+
+    # Maps user ids to their updates
+    updates_by_user = defaultdict(list)
 
-    # Log any masteries that couldn't find entries to Sentry
     for update in updates:
-        if "entry_id" not in update:
-            if sentry is not None:
-                sentry.captureMessage("Entry could not be found for mastery update: %s" % update["chinese"], extra={
-                    "update": update
-                })
-            else:
-                print("Entry could not be found for mastery update: %s" % update["chinese"])
+        updates_by_user[update.user_id].append(update)
 
-    # Clear all updates that don't have associated entries
-    updates = list(filter(lambda x: "entry_id" in x, updates))
+    # Maps user ids to the (entry id, change) pairs that were applied, along
+    # with the version of the user's masteries after the changes
+    applied = {}
 
-    # Find this user's masteries by the entry ids list
-    masteries = Mastery.query \
-        .filter_by(user_id=user_id) \
-        .filter(Mastery.entry_id.in_(entry_ids))
+    for (user_id, user_updates) in updates_by_user.items():
+        # Combine the changes to each word's mastery
+        changes = Counter()
 
-    # Update the mastery value for all of the masteries that already exist
-    for mastery in masteries:
-        update = None
-        update_index = 0
+        for update in user_updates:
+            changes[update.chinese] += update.delta
 
-        # Find the update that matches this mastery
-        for (idx, datum) in enumerate(updates):
-            if datum["entry_id"] == mastery.entry_id:
-                update = datum
-                update_index = idx
+        savepoint = db.session.begin_nested()
 
-        new_mastery_value = mastery.mastery + update["change"]
+        try:
+            user_applied = apply_mastery_changes(user_id, changes)
+            applied[user_id] = (user_applied, increment_mastery_version(user_id) if len(user_applied) > 0 else None)
+            savepoint.commit()
+        except SQLAlchemyError as e:
+            savepoint.rollback()
+            record_failed_updates(user_updates, str(e))
+            continue
 
-        # Make sure the mastery value is 0 ≤ n ≤ 10
-        if new_mastery_value < 0:
-            new_mastery_value = 0
-        elif new_mastery_value > 10:
-            new_mastery_value = 10
+        for update in user_updates:
+            db.session.delete(update)
 
-        mastery.mastery = new_mastery_value
+    db.session.commit()
 
-        # Mark this update as done so we know which ones don't have associated masteries
-        updates[update_index]["done"] = True
+    # Only update cached masteries once the changes are committed
+    for (user_id, (user_updates, version)) in applied.items():
+        if len(user_updates) > 0:
+            update_cached_masteries(user_id, [x[0] for x in user_updates], [x[1] for x in user_updates], version)
 
-    new_masteries = []
+    return len(updates)
 
-    # Create new masteries for the updates that weren't taken care of earlier
+def record_failed_updates(updates, error):
+    # Leave updates in the queue to be tried again later, unless they've been
+    # tried too many times already
     for update in updates:
-        if "done" not in update:
-            mastery = Mastery(user_id, update["entry_id"], max(0, update["change"]))
-            new_masteries.append(mastery)
+        update.attempts += 1
+
+        if update.attempts >= MAX_MASTERY_UPDATE_ATTEMPTS:
+            db.session.add(FailedMasteryUpdate(update, error))
+            db.session.delete(update)
+        else:
+            delay = MASTERY_UPDATE_RETRY_DELAY * 2 ** (update.attempts - 1)
+            update.next_attempt_at = db.func.timestampadd(text("SECOND"), delay, db.func.current_timestamp())
+
+    message = "Mastery updates for user %d could not be applied: %s" % (updates[0].user_id, error)
+    log_error(message)
+    print(message)
+
+def requeue_failed_updates():
+    """Moves every update in failed_mastery_updates back into the queue, to be
+    tried again from the start, such as once whatever made them fail is fixed.
+
+    Returns:
+        The number of updates that were queued again.
+    """
+
+    failed = FailedMasteryUpdate.query.order_by(FailedMasteryUpdate.id.asc()).with_for_update().all()
+
+    for failed_update in failed:
+        update = MasteryUpdate(failed_update.user_id, failed_update.chinese, failed_update.delta)
+        update.created_at = failed_update.created_at
 
-    # Add new masteries to the database
-    db.session.add_all(new_masteries)
+        db.session.add(update)
+        db.session.delete(failed_update)
 
-    # Commit new masteries and updates to existing masteries
     db.session.commit()
+    return len(failed)
+
+def start_mastery_worker(app):
+    """Starts a thread that applies queued mastery updates in the background,
+    unless one is already running in this process. Only processes that serve
+    requests need a worker, and CLI commands and tests shouldn't start one.
+    """
+
+    global mastery_worker
+
+    if mastery_worker is not None:
+        return
+
+    def work():
+        while True:
+            processed = 0
+
+            with app.app_context():
+                try:
+                    processed = process_mastery_updates()
+                except Exception as e:
+                    db.session.rollback()
+                    log_error("Mastery updates could not be applied: %s" % e)
+                    print("Mastery updates could not be applied: %s" % e)
+                finally:
+                    db.session.remove()
+
+            # Keep going without waiting while the queue has a backlog
+            if processed < MASTERY_UPDATES_BATCH_SIZE:
+                time.sleep(MASTERY_UPDATES_INTERVAL)
+
+    mastery_worker = threading.Thread(target=work, name="mastery-worker", daemon=True)
+    mastery_worker.start()
+
+def apply_mastery_changes(user_id, changes):
+    """Adds changes to a user's masteries, keeping every mastery between 0 and
+    10. This takes the same number of queries no matter how many words change,
+    and the changes are saved with the next commit.
+
+    Args:
+        user_id: The id of the user whose masteries are changing.
+        changes: Maps words to how much their masteries should change by.
+
+    Returns:
+        A list of (entry id, change) pairs for the changes that were made.
+    """
+
+    if len(changes) == 0:
+        return []
+
+    # Convert words to entry ids, using the last entry if there are several
+    # entries with the same Chinese text
+    entries = db.session.query(Entry.id, Entry.chinese).filter(Entry.chinese.in_(list(changes.keys()))).all()
+    entry_ids = {chinese: entry_id for (entry_id, chinese) in entries}
+
+    # Log any masteries that couldn't find entries to Sentry
+    for word in changes:
+        if word not in entry_ids:
+            if sentry is not None:
+                sentry.captureMessage("Entry could not be found for mastery update: %s" % word, extra={
+                    "update": {"chinese": word, "change": changes[word]}
+                })
+            else:
+                print("Entry could not be found for mastery update: %s" % word)
+
+    # Clear all changes that don't have associated entries
+    updates = [(entry_ids[word], change) for (word, change) in changes.items() if word in entry_ids]
+
+    if len(updates) == 0:
+        return updates
+
+    # Build a derived table with one row for each entry's change
+    params = {"user_id": user_id}
+    rows = []
+
+    for (idx, (entry_id, change)) in enumerate(updates):
+        rows.append("SELECT :entry_id_%d AS entry_id, :delta_%d AS delta" % (idx, idx))
+        params["entry_id_%d" % idx] = entry_id
+        params["delta_%d" % idx] = change
+
+    # Create masteries that don't exist yet and update the rest in a single
+    # statement, relying on the unique (user_id, entry_id) key
+    db.session.execute(text(
+        "INSERT INTO masteries (user_id, entry_id, mastery, created_at, updated_at) "
+        "SELECT :user_id, updates.entry_id, LEAST(10, GREATEST(0, updates.delta)), CURRENT_TIMESTAMP, CURRENT_TIMESTAMP "
+        "FROM (%s) AS updates "
+        "ON DUPLICATE KEY UPDATE "
+        "mastery = LEAST(10, GREATEST(0, masteries.mastery + updates.delta)), "
+        "updated_at = CURRENT_TIMESTAMP" % " UNION ALL ".join(rows)
+    ), params)
+
+    return updates
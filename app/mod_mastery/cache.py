@@ -0,0 +1,147 @@
+from app import db
+from app.utils import LRUCache
+from .models import Mastery, MasteryVersion
+
+from sqlalchemy import text
+import numpy as np, time
+
+# The greatest number of users whose masteries are kept in memory
+MASTERY_CACHE_SIZE = 1024
+
+# The number of seconds before a user's masteries are loaded from MySQL again,
+# even if their version hasn't changed
+MASTERY_CACHE_TTL = 300
+
+# Maps user ids to their masteries
+mastery_cache = LRUCache(MASTERY_CACHE_SIZE)
+
+class MasteryVector(object):
+    """One user's masteries, as entry ids in ascending order alongside the
+    mastery of each entry, as of a version of the user's masteries. Vectors are
+    never changed after they're created, so they can be shared between threads.
+    """
+
+    def __init__(self, entry_ids, masteries, version):
+        order = np.argsort(entry_ids, kind="mergesort")
+
+        self.entry_ids = np.asarray(entry_ids, dtype=np.int64)[order]
+        self.masteries = np.asarray(masteries, dtype=np.int8)[order]
+        self.version = version
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.entry_ids)
+
+    def lookup(self, entry_ids):
+        """Finds the user's mastery of several entries at once.
+
+        Args:
+            entry_ids: An array of entry ids, which may contain -1 for words
+                without entries.
+
+        Returns:
+            An array with the mastery of each entry, and a boolean array that
+            is True where the user has a mastery for the entry.
+        """
+
+        entry_ids = np.asarray(entry_ids, dtype=np.int64)
+        masteries = np.zeros(len(entry_ids), dtype=np.int8)
+
+        if len(self.entry_ids) == 0:
+            return masteries, np.zeros(len(entry_ids), dtype=bool)
+
+        positions = np.minimum(np.searchsorted(self.entry_ids, entry_ids), len(self.entry_ids) - 1)
+        found = (entry_ids >= 0) & (self.entry_ids[positions] == entry_ids)
+        masteries[found] = self.masteries[positions[found]]
+
+        return masteries, found
+
+    def updated(self, entry_ids, deltas, version):
+        """Adds changes to these masteries the same way MySQL does, keeping every
+        mastery between 0 and 10.
+
+        Returns:
+            A new vector with the changes applied, as of the given version.
+        """
+
+        entry_ids = np.asarray(entry_ids, dtype=np.int64)
+        deltas = np.asarray(deltas, dtype=np.int64)
+
+        current, found = self.lookup(entry_ids)
+        values = np.clip(np.where(found, current, 0) + deltas, 0, 10)
+
+        # Replace existing masteries and append the new ones
+        keep = ~np.isin(self.entry_ids, entry_ids)
+
+        vector = MasteryVector(
+            np.concatenate([self.entry_ids[keep], entry_ids]),
+            np.concatenate([self.masteries[keep], values]),
+            version
+        )
+
+        vector.loaded_at = self.loaded_at
+        return vector
+
+def load_mastery_version(user_id):
+    version = db.session.query(MasteryVersion.version).filter_by(user_id=user_id).scalar()
+    return version if version is not None else 0
+
+def increment_mastery_version(user_id):
+    """Marks the user's masteries as changed, which needs to happen in the same
+    transaction as the change.
+
+    Returns:
+        The user's new version.
+    """
+
+    db.session.execute(text(
+        "INSERT INTO mastery_versions (user_id, version) VALUES (:user_id, 1) "
+        "ON DUPLICATE KEY UPDATE version = version + 1"
+    ), {"user_id": user_id})
+
+    return load_mastery_version(user_id)
+
+def get_masteries(user_id):
+    """Retrieves a user's masteries, loading them from MySQL if they aren't
+    cached, if they've changed since they were cached, or if they were cached
+    too long ago. Checking for changes only takes a primary key lookup, so
+    changes made by other processes are seen right away.
+
+    Returns:
+        The user's MasteryVector.
+    """
+
+    # Read the version before the masteries, so that changes committed in
+    # between make the cached vector look older than it is, never newer
+    version = load_mastery_version(user_id)
+
+    vector = mastery_cache.get(user_id)
+
+    if vector is not None and vector.version == version and time.time() - vector.loaded_at < MASTERY_CACHE_TTL:
+        return vector
+
+    masteries = db.session.query(Mastery.entry_id, Mastery.mastery).filter_by(user_id=user_id).all()
+    vector = MasteryVector([x[0] for x in masteries], [x[1] for x in masteries], version)
+
+    # Don't replace a vector that's newer than this one
+    mastery_cache.update(user_id, lambda cached: vector if cached is None or cached.version <= version else cached)
+
+    return vector
+
+def update_cached_masteries(user_id, entry_ids, deltas, version):
+    """Applies changes that were just committed to a user's cached masteries, if
+    the cached masteries are from the version right before the changes. Users
+    whose masteries aren't cached or are out of date are loaded the next time
+    they're needed.
+    """
+
+    def update(vector):
+        if vector is None or vector.version != version - 1:
+            return None
+
+        return vector.updated(entry_ids, deltas, version)
+
+    mastery_cache.update(user_id, update)
+
+def forget_masteries(user_id):
+    mastery_cache.pop(user_id)
@@ -1,18 +1,75 @@
-from flask import Blueprint, jsonify, request
-from flask_login import login_required
+from flask import Blueprint, Response, json, request, stream_with_context
+from flask_login import current_user, login_required
 
 from app.mod_mastery import Mastery
+import app.mod_mastery.errors as errors
+from app.utils import parse_timestamp
 
 mod_mastery = Blueprint("mastery", __name__, url_prefix="/mastery")
 
+# The number of masteries returned when no limit is given, and the most that
+# can be asked for at once
+DEFAULT_MASTERIES_LIMIT = 1000
+MAX_MASTERIES_LIMIT = 10000
+
 @mod_mastery.route("", methods=["GET"])
 @login_required
 def get_user_masteries():
-    """Retrieves all of a user's mastery data.
+    """Retrieves the current user's mastery data, one page at a time, in order
+    of entry id.
+
+    Parameters:
+        cursor: The next_cursor from the previous page, if there was one.
+        limit: The greatest number of masteries to return.
+        updated_since: An ISO 8601 timestamp, in UTC if it has no offset. Only
+            masteries changed at or after this time are returned, for clients
+            that already have the rest.
 
     Returns:
-        JSON data about the user's mastery with every word.
+        JSON data with the user's masteries and the cursor for the next page,
+        which is null on the last page.
     """
 
-    masteries = Mastery.query.all()
-    return jsonify([mastery.serialize() for mastery in masteries])
+    try:
+        cursor = int(request.args.get("cursor", 0))
+        limit = int(request.args.get("limit", DEFAULT_MASTERIES_LIMIT))
+        updated_since = request.args.get("updated_since")
+
+        if updated_since is not None:
+            updated_since = parse_timestamp(updated_since)
+    except ValueError:
+        return errors.invalid_masteries_parameters()
+
+    if limit < 1 or limit > MAX_MASTERIES_LIMIT:
+        return errors.invalid_masteries_parameters()
+
+    # Page through masteries by entry id, which the unique (user_id, entry_id)
+    # key already keeps in order
+    masteries = Mastery.query \
+        .filter_by(user_id=current_user.id) \
+        .filter(Mastery.entry_id > cursor)
+
+    if updated_since is not None:
+        masteries = masteries.filter(Mastery.updated_at >= updated_since)
+
+    # Fetch one extra mastery to find out if there's another page
+    masteries = masteries.order_by(Mastery.entry_id.asc()).limit(limit + 1)
+
+    def generate():
+        next_cursor = None
+
+        yield '{"masteries": ['
+
+        # Write masteries as they're read from MySQL instead of building the
+        # whole response in memory
+        for (idx, mastery) in enumerate(masteries.yield_per(500)):
+            if idx == limit:
+                next_cursor = last_entry_id
+                break
+
+            yield ("" if idx == 0 else ", ") + json.dumps(mastery.serialize())
+            last_entry_id = mastery.entry_id
+
+        yield '], "next_cursor": %s}' % json.dumps(next_cursor)
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
@@ -0,0 +1,9 @@
+def error(status_code, code, message, data=None):
+    from flask import jsonify
+    if data is None:
+        return (jsonify(code=code, message=message), status_code)
+    else:
+        return (jsonify(code=code, message=message, data=data), status_code)
+
+def invalid_masteries_parameters():
+    return error(400, 1801, "Invalid parameters given to retrieve masteries")
@@ -11,6 +11,10 @@ class Base(db.Model):
 class Mastery(Base):
 
     __tablename__ = "masteries"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "entry_id"),
+        db.Index("masteries_user_id_updated_at", "user_id", "updated_at")
+    )
 
     user_id = db.Column(db.Integer, nullable=False)
     entry_id = db.Column(db.Integer, nullable=False)
@@ -30,3 +34,62 @@ class Mastery(Base):
             "created_at": self.created_at,
             "updated_at": self.updated_at
         }
+
+class MasteryVersion(db.Model):
+
+    __tablename__ = "mastery_versions"
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    # Goes up by one every time any of the user's masteries change, so that
+    # processes can tell whether the masteries they cached are still current
+    version = db.Column(db.Integer, nullable=False)
+
+class MasteryUpdate(db.Model):
+
+    __tablename__ = "mastery_updates"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    chinese = db.Column(db.String(255), nullable=False)
+
+    # How much the mastery of this word should change by
+    delta = db.Column(db.Integer, nullable=False)
+
+    # The number of times applying this update has failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+    # When to try applying this update again after it failed
+    next_attempt_at = db.Column(db.DateTime)
+
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    def __init__(self, user_id, chinese, delta):
+        self.user_id = user_id
+        self.chinese = chinese
+        self.delta = delta
+
+class FailedMasteryUpdate(db.Model):
+
+    __tablename__ = "failed_mastery_updates"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    chinese = db.Column(db.String(255), nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False)
+
+    # The error from the last attempt to apply this update
+    error = db.Column(db.Text, nullable=False)
+
+    # When the update was queued, and when it was given up on
+    created_at = db.Column(db.DateTime, nullable=False)
+    failed_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    def __init__(self, update, error):
+        self.user_id = update.user_id
+        self.chinese = update.chinese
+        self.delta = update.delta
+        self.attempts = update.attempts
+        self.error = error
+        self.created_at = update.created_at
@@ -1,13 +1,14 @@
 from flask import Blueprint, jsonify, request, session
 from flask_login import current_user, login_required
-import jieba, json, numpy as np
+import jieba, json
 from pypinyin import pinyin
 
 from app import db, admin_required
+from app.catalog import get_catalog, invalidate_catalog, load_passage_ids
 from app.chinese import segment
 import app.mod_passages.errors as errors
 from app.mod_passages import Passage, ChineseNameCharacter
-from app.mod_path import PathAction
+from app.mod_path import get_path_progress, record_path_action
 from app.mod_stories import Story
 from app.mod_users import User
 from app.utils import check_body
@@ -29,30 +30,23 @@ def get_passages():
     return jsonify(passages_data)
 
 def passage_status_for_user(passage_id, user_id):
-    # Create array of all stories from JSON data
-    stories = Story.query.order_by(Story.position.asc()).all()
-    stories_data = [story.serialize() for story in stories]
+    catalog = get_catalog()
 
-    # Retrieve all path actions
-    path_actions = PathAction.query.filter_by(user_id=user_id).all()
-    completed_passage_ids = []
+    # The catalog may have been loaded before this passage was created by
+    # another process, so load it again rather than guessing its status
+    if passage_id not in catalog.passages:
+        invalidate_catalog()
+        catalog = get_catalog()
 
-    # Create a dictionary that maps passage ids to their actions
-    path_actions_by_passage = {}
+    # Stories are already in order in the catalog
+    stories_data = catalog.stories
 
-    for action in path_actions:
-        # Add this part to the passage's actions list
-        if action.passage_id in path_actions_by_passage:
-            path_actions_by_passage[action.passage_id].append(action.part)
-        else:
-            path_actions_by_passage[action.passage_id] = [action.part]
-
-        # Create array for convenience
-        actions = path_actions_by_passage[action.passage_id]
+    # Retrieve the user's progress through their path
+    progress = get_path_progress(user_id)
+    completed_passage_ids = progress.get_completed_passage_ids()
 
-        # Check if all parts of this passage have been completed
-        if 0 in actions and 1 in actions and 2 in actions and 3 in actions and action.passage_id not in completed_passage_ids:
-            completed_passage_ids.append(action.passage_id)
+    # Maps the ids of passages that have been started to their completed parts
+    path_actions_by_passage = progress.get_passage_parts()
 
     # Loop through the passages in order
     for story in stories_data:
@@ -111,50 +105,18 @@ def get_passage(passage_id):
             if passage_data["status"] == "locked":
                 return errors.passage_not_reached()
 
-        # Extract the words in each text component and add to JSON response
+        # Passages saved before annotations existed, or before the dictionary
+        # or exceptions last changed, are annotated the next time they're read
+        if passage.annotations_are_stale():
+            passage.annotate()
+            db.session.commit()
+
+        annotations = json.loads(passage.annotations)
+
+        # Add the stored words of each text component to the JSON response
         for idx, component in enumerate(passage_data["data"]["components"]):
             if component["type"] == "text":
-                # Separate Chinese sentences into separate words
-                word_generator = segment(component["text"])
-                words = [{"chinese": word, "punctuation": False} for word in word_generator]
-
-                # Add pinyin to the word objects
-                pinyin_words = [pinyin(word["chinese"]) for word in words]
-                flattened_pinyin_words = [[j for i in words for j in i] for words in pinyin_words]
-                joined_pinyin_words = ["".join(words) for words in flattened_pinyin_words]
-
-                # True if the next word in the loop needs to be capitalized
-                capitalize_next_word = True
-
-                for i, _ in enumerate(words):
-                    word = joined_pinyin_words[i]
-
-                    if capitalize_next_word:
-                        # Capitalize this word, don't capitalize the next one
-                        word = word.capitalize()
-                        capitalize_next_word = False
-
-                    # Replace Chinese punctutation with regular punctuation
-                    if word == "。":
-                        capitalize_next_word = True
-                        word = "."
-                        words[i]["punctuation"] = True
-                    elif word == "，":
-                        word = ","
-                        words[i]["punctuation"] = True
-                    elif word == "！":
-                        capitalize_next_word = True
-                        word = "!"
-                        words[i]["punctuation"] = True
-                    elif word == "？":
-                        capitalize_next_word = True
-                        word = "?"
-                        words[i]["punctuation"] = True
-
-                    words[i]["pinyin"] = word
-
-                # Add the words to the passage data
-                passage_data["data"]["components"][idx]["words"] = words
+                component["words"] = annotations[idx]
 
         return jsonify(passage_data)
     else:
@@ -197,50 +159,100 @@ def create_passage():
     # Return the passage JSON data
     return get_passage(passage.id)
 
-def update_word_lists():
+# Maps passage ids to (content_hash, words) pairs, where words is the set of
+# words in the passage when its content had that hash
+passage_words_cache = {}
+
+# A hash of what passage_words reads, computed by MySQL so that passage data
+# doesn't need to be loaded to tell whether it changed. updated_at only has a
+# resolution of one second, so it can miss edits made close together.
+passage_content_hash = db.func.sha1(db.func.coalesce(Passage.annotations, Passage.data))
+
+def passage_words(data, annotations):
+    words = set()
+
+    if annotations is not None:
+        # Use the words that were stored when the passage was annotated
+        for component_words in json.loads(annotations):
+            if component_words is not None:
+                words.update([word["chinese"] for word in component_words])
+    else:
+        # Use jieba to find the words in each text component
+        for component in json.loads(data)["components"]:
+            if component["type"] == "text":
+                words.update(segment(component["text"]))
+
+    return words
+
+def update_word_lists(edited_passage=None):
     """Updates the list of new words for all passages, in order of appearance.
+    Only the passages at or after the edited passage are updated, since the
+    passages before it aren't affected by the edit.
+
+    Args:
+        edited_passage: The passage whose data was just changed, if any.
     """
 
-    # Retrieve all stories first in order to order the passages correctly
-    stories = Story.query.order_by(Story.position.asc()).all()
-    passage_ids = []
+    # Read the order of passages from MySQL, since the catalog can be out of
+    # date when stories were changed by another process
+    passage_ids = load_passage_ids()
 
-    # Create a correctly ordered list of passage ids
-    for story in stories:
-        story_passage_ids = json.loads(story.passage_ids)
-        passage_ids.extend(story_passage_ids)
+    # Find out which passages have changed since their words were cached
+    rows = db.session.query(Passage.id, passage_content_hash.label("content_hash"), Passage.new_words) \
+            .filter(Passage.id.in_(passage_ids)).all() if len(passage_ids) > 0 else []
 
-    # Get all of the passages by the ids that are in the list
-    passages = Passage.query.filter(Passage.id.in_(passage_ids)).all()
+    content_hashes = {row.id: row.content_hash for row in rows}
+    stored_new_words = {row.id: row.new_words for row in rows}
+    passage_ids = [id for id in passage_ids if id in content_hashes]
 
-    # Sort the retrieved passages according to the order of passage_ids, since
-    # the database query doesn't preserve ordering
-    sorted_passages = sorted(passages, key=lambda x: passage_ids.index(x.id))
+    # Always take the edited passage's words from its new data, which hasn't
+    # been hashed by MySQL yet
+    if edited_passage is not None:
+        passage_words_cache[edited_passage.id] = (None, passage_words(edited_passage.data, edited_passage.annotations))
+        content_hashes[edited_passage.id] = None
 
-    # Keep track of all words in all passages
-    words = []
+    stale_ids = [id for id in passage_ids if id not in passage_words_cache or passage_words_cache[id][0] != content_hashes[id]]
 
-    for passage in passages:
-        # Get the components of each passage
-        components = json.loads(passage.data)["components"]
-        passage_words = []
+    # Only load the data of passages that need to be segmented again
+    if len(stale_ids) > 0:
+        for row in db.session.query(Passage.id, passage_content_hash.label("content_hash"), Passage.data, Passage.annotations) \
+                .filter(Passage.id.in_(stale_ids)).all():
+            passage_words_cache[row.id] = (row.content_hash, passage_words(row.data, row.annotations))
 
-        # Use jieba to find the words in each text component
-        for component in components:
-            if component["type"] == "text":
-                passage_words.extend([word for word in segment(component["text"])])
+    # Start at the edited passage, or at the beginning if nothing was edited
+    start = 0
 
-        # Use numpy to figure out which words have appeared for the first time
-        new_words = np.setdiff1d(passage_words, words).tolist()
+    if edited_passage is not None and edited_passage.id in passage_ids:
+        start = passage_ids.index(edited_passage.id)
 
-        # Remove punctuation from new words list
+    # Keep track of all words in the passages before the current one
+    words = set()
+
+    for id in passage_ids[:start]:
+        words.update(passage_words_cache[id][1])
+
+    # Maps ids of passages whose new words changed to their new words
+    changed_new_words = {}
+
+    for id in passage_ids[start:]:
+        passage_words_set = passage_words_cache[id][1]
+
+        # Figure out which words have appeared for the first time, leaving out
+        # punctuation
         punctuation_words = ["。", "，", "！", "？"]
-        new_words = [word for word in new_words if word not in punctuation_words]
+        new_words = sorted([word for word in passage_words_set - words if word not in punctuation_words])
+        new_words_json = json.dumps(new_words)
+
+        if new_words_json != stored_new_words[id]:
+            changed_new_words[id] = new_words_json
 
-        passage.new_words = json.dumps(new_words)
+        # Add this passage's words to the general words set
+        words.update(passage_words_set)
 
-        # Add the new words to the general words array
-        words.extend(new_words)
+    # Only write the passages whose new words changed
+    if len(changed_new_words) > 0:
+        for passage in Passage.query.filter(Passage.id.in_(list(changed_new_words.keys()))).all():
+            passage.new_words = changed_new_words[passage.id]
 
     # Save all changes in MySQL
     db.session.commit()
@@ -289,9 +301,10 @@ def update_passage(passage_id):
         passage.description = value
     elif key == "data":
         passage.data = json.dumps(value)
+        passage.annotate()
 
         # Update all word lists to reflect any edits made
-        update_word_lists()
+        update_word_lists(passage)
     elif key == "notes":
         passage.notes = value
     elif key == "parts":
@@ -315,8 +328,7 @@ def finish_passage(passage_id):
         204 no content.
     """
 
-    action = PathAction(passage_id, 0, current_user.id)
-    db.session.add(action)
+    record_path_action(current_user.id, passage_id, 0)
     db.session.commit()
 
     return ("", 204)
@@ -1,4 +1,5 @@
 from app import db
+from app.chinese import annotate, segment, segmentation_version
 import json
 
 class Base(db.Model):
@@ -17,6 +18,8 @@ class Passage(Base):
     description = db.Column(db.Text, nullable=False)
     story_id = db.Column(db.Integer, nullable=False)
     data = db.Column(db.Text, nullable=False)
+    annotations = db.Column(db.Text)
+    annotations_version = db.Column(db.String(40))
     new_words = db.Column(db.Text, nullable=False)
     notes = db.Column(db.Text, nullable=False)
     parts = db.Column(db.Text, nullable=False)
@@ -41,11 +44,34 @@ class Passage(Base):
         }
 
         self.data = json.dumps(default_data)
+        self.annotate()
 
         self.new_words = "[]"
         self.notes = "# Grammar Notes"
         self.parts = "[\"scribe\", \"scribe\", \"scribe\"]"
 
+    def annotate(self):
+        """Segments and adds pinyin to every text component in this passage's
+        data. This needs to be called whenever the data changes, and again
+        once annotations_are_stale returns True.
+        """
+
+        self.annotations_version = segmentation_version()
+        annotations = []
+
+        for component in json.loads(self.data)["components"]:
+            if component["type"] == "text":
+                annotations.append(annotate(segment(component["text"])))
+            else:
+                annotations.append(None)
+
+        self.annotations = json.dumps(annotations)
+
+    def annotations_are_stale(self):
+        # Annotations made before jieba's dictionary or exceptions changed may
+        # split words differently than segment does now
+        return self.annotations is None or self.annotations_version != segmentation_version()
+
     def serialize(self):
         return {
             "id": self.id,
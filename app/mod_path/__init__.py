@@ -1 +1,75 @@
-from .models import PathAction
+from app import db
+from .models import PathAction, UserPathProgress
+
+from sqlalchemy.exc import IntegrityError
+
+def count_path_actions(user_id):
+    return PathAction.query.filter_by(user_id=user_id).count()
+
+def replay_path_actions(progress):
+    """Rebuilds progress from scratch using all of the user's path actions."""
+
+    progress.reset()
+
+    for action in PathAction.query.filter_by(user_id=progress.user_id).order_by(PathAction.id.asc()).all():
+        progress.add(action.passage_id, action.part)
+        progress.action_count += 1
+
+def rebuild_path_progress(user_id):
+    """Creates or fixes a user's path progress by replaying all of their path
+    actions. This happens the first time progress is needed, and whenever path
+    actions were saved without progress being updated along with them.
+
+    Returns:
+        The user's path progress.
+    """
+
+    progress = UserPathProgress.query.filter_by(user_id=user_id).with_for_update().first()
+
+    if progress is None:
+        progress = UserPathProgress(user_id)
+        db.session.add(progress)
+
+    replay_path_actions(progress)
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request rebuilt this progress at the same time
+        db.session.rollback()
+        progress = UserPathProgress.query.filter_by(user_id=user_id).first()
+
+    return progress
+
+def get_path_progress(user_id):
+    progress = UserPathProgress.query.filter_by(user_id=user_id).first()
+
+    # Progress is only kept up to date by record_path_action, so rebuild it if
+    # path actions were saved some other way
+    if progress is None or progress.action_count != count_path_actions(user_id):
+        progress = rebuild_path_progress(user_id)
+
+    return progress
+
+def record_path_action(user_id, passage_id, part):
+    """Saves that a user completed a part of a passage and updates their path
+    progress. The changes are saved with the next commit.
+    """
+
+    passage_id = int(passage_id)
+
+    if UserPathProgress.query.filter_by(user_id=user_id).count() == 0:
+        rebuild_path_progress(user_id)
+
+    # Lock the user's progress so that actions saved at the same time are
+    # applied one after the other
+    progress = UserPathProgress.query.filter_by(user_id=user_id).with_for_update().first()
+
+    # Catch up on any actions that were saved without updating progress
+    if progress.action_count != count_path_actions(user_id):
+        replay_path_actions(progress)
+
+    progress.add(passage_id, part)
+    progress.action_count += 1
+
+    db.session.add(PathAction(passage_id, part, user_id))
@@ -1,9 +1,8 @@
 from flask import Blueprint, jsonify, request, session
 from flask_login import current_user, login_required
 
-from app.mod_passages import Passage
-from app.mod_path import PathAction
-from app.mod_stories import Story
+from app.catalog import get_catalog
+from app.mod_path import get_path_progress
 
 mod_path = Blueprint("path", __name__, url_prefix="/path")
 
@@ -20,32 +19,16 @@ def get_path():
         "stories": []
     }
 
-    # Create array of all stories from JSON data
-    stories = Story.query.order_by(Story.position.asc()).all()
-    stories_data = [story.serialize() for story in stories]
-
-    passages = Passage.query.all()
+    # Copy the stories from the catalog, since they're changed below
+    catalog = get_catalog()
+    stories_data = [dict(story) for story in catalog.stories]
 
     # Figure out which passages have been completed
-    path_actions = PathAction.query.filter_by(user_id=current_user.id).all()
-    completed_passage_ids = []
-
-    # Create a dictionary that maps passage ids to their actions
-    path_actions_by_passage = {}
-
-    for action in path_actions:
-        # Add this part to the passage's actions list
-        if action.passage_id in path_actions_by_passage:
-            path_actions_by_passage[action.passage_id].append(action.part)
-        else:
-            path_actions_by_passage[action.passage_id] = [action.part]
+    progress = get_path_progress(current_user.id)
+    completed_passage_ids = progress.get_completed_passage_ids()
 
-        # Create array for convenience
-        actions = path_actions_by_passage[action.passage_id]
-
-        # Check if all parts of this passage have been completed
-        if 0 in actions and 1 in actions and 2 in actions and 3 in actions and action.passage_id not in completed_passage_ids:
-            completed_passage_ids.append(action.passage_id)
+    # Maps the ids of passages that have been started to their completed parts
+    path_actions_by_passage = progress.get_passage_parts()
 
     # True if we've reached the user's furthest passage in the following loop
     reached_furthest_passage = False
@@ -55,14 +38,15 @@ def get_path():
         story["passages"] = []
 
         for passage_id in story["passage_ids"]:
-            # Find the passage that matches the next one in the story
-            passage = next(x for x in passages if x.id == passage_id)
-            passage_data = passage.serialize()
+            # Skip passages that were deleted without being removed from the story
+            if passage_id not in catalog.passages:
+                continue
 
-            passage_data["parts_status"] = []
+            # Copy the passage's data from the catalog, which doesn't include the
+            # actual passage data because the response would be too long
+            passage_data = dict(catalog.passages[passage_id])
 
-            # Remove actual passage data because the response would be too long
-            del passage_data["data"]
+            passage_data["parts_status"] = []
 
             if reached_furthest_passage:
                 # If we've already reached the furthest passage, this one should
@@ -1,5 +1,7 @@
 from app import db
 
+import json
+
 class Base(db.Model):
 
     __abstract__ = True
@@ -19,3 +21,61 @@ class PathAction(Base):
         self.passage_id = passage_id
         self.part = part
         self.user_id = user_id
+
+class UserPathProgress(db.Model):
+
+    __tablename__ = "user_path_progress"
+
+    # The parts that every passage has, which all need to be completed for the
+    # passage to be complete
+    PARTS = frozenset([0, 1, 2, 3])
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    # JSON list of the ids of the passages that the user has completed
+    completed_passage_ids = db.Column(db.Text, nullable=False)
+
+    # JSON object that maps the ids of passages that the user has started but
+    # not completed to the parts of them that they have completed
+    passage_parts = db.Column(db.Text, nullable=False)
+
+    # The number of path actions that this progress was built from
+    action_count = db.Column(db.Integer, nullable=False)
+
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.reset()
+
+    def reset(self):
+        self.completed_passage_ids = "[]"
+        self.passage_parts = "{}"
+        self.action_count = 0
+
+    def get_completed_passage_ids(self):
+        return set(json.loads(self.completed_passage_ids))
+
+    def get_passage_parts(self):
+        return {int(passage_id): parts for (passage_id, parts) in json.loads(self.passage_parts).items()}
+
+    def add(self, passage_id, part):
+        """Records that the user completed a part of a passage."""
+
+        completed_passage_ids = self.get_completed_passage_ids()
+
+        if passage_id in completed_passage_ids:
+            return
+
+        passage_parts = self.get_passage_parts()
+        parts = passage_parts.setdefault(passage_id, [])
+
+        if part not in parts:
+            parts.append(part)
+
+        # Move the passage to the completed list once every part is done
+        if self.PARTS.issubset(parts):
+            del passage_parts[passage_id]
+            self.completed_passage_ids = json.dumps(json.loads(self.completed_passage_ids) + [passage_id])
+
+        self.passage_parts = json.dumps(passage_parts)
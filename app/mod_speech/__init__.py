@@ -1 +1 @@
-from .models import ChineseSpeechSynthesis, EnglishSpeechSynthesis
+from .models import ChineseSpeechSynthesis, EnglishSpeechSynthesis, hash_source
@@ -0,0 +1,204 @@
+from io import BytesIO
+import os, threading, time, uuid
+
+# Temporary files older than this, in seconds, were left behind by a process
+# that stopped while saving a recording
+TEMPORARY_FILE_MAX_AGE = 600
+
+class SpeechCache(object):
+    """Keeps recordings from S3 on local disk, removing the least recently used
+    recordings once they take up more than max_bytes. Every process on a server
+    shares the directory, so its size is measured on disk every scan_interval
+    seconds, and in between each process adds the recordings that it saves.
+    Each recording's modification time is the last time that it was used.
+
+    Args:
+        directory: The directory that recordings are saved in.
+        max_bytes: The most space that recordings can take up.
+        fetch: A function that downloads a recording by filename from S3.
+        scan_interval: How often to measure the directory, in seconds.
+    """
+
+    def __init__(self, directory, max_bytes, fetch, scan_interval=60):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fetch = fetch
+        self.scan_interval = scan_interval
+        self.lock = threading.Lock()
+
+        # The size of the directory when it was last measured, plus the
+        # recordings saved by this process since then
+        self.total_bytes = 0
+        self.scanned_at = 0
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "errors": 0,
+            "scans": 0
+        }
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # Recordings saved before the process started are kept if they fit
+        with self.lock:
+            self.evict()
+
+    def path(self, filename):
+        return os.path.join(self.directory, os.path.basename(filename))
+
+    def touch(self, path):
+        # Mark a recording as just used, with more precision than the clock that
+        # the filesystem uses by default
+        now = time.time()
+
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            # The recording was evicted by another process
+            pass
+
+    def get(self, filename):
+        """Finds a recording, downloading it from S3 if it isn't on disk.
+
+        Returns:
+            An open file with the recording, which can be passed to send_file.
+            Recordings that are evicted while they're being sent can still be
+            read through files that were already open.
+        """
+
+        filename = os.path.basename(filename)
+        path = self.path(filename)
+
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            with self.lock:
+                self.stats["misses"] += 1
+        else:
+            self.touch(path)
+
+            with self.lock:
+                self.stats["hits"] += 1
+
+            return f
+
+        data = self.fetch(filename)
+
+        if self.put(filename, data):
+            try:
+                return open(path, "rb")
+            except FileNotFoundError:
+                # Another process evicted the recording since it was saved
+                pass
+
+        return BytesIO(data)
+
+    def put(self, filename, data):
+        """Saves a recording to disk, such as one that was just synthesized.
+
+        Returns:
+            True if the recording was saved and is still on disk.
+        """
+
+        filename = os.path.basename(filename)
+
+        # Write to a temporary file first so that other requests never serve a
+        # partially written recording
+        temporary_path = os.path.join(self.directory, ".%s.tmp" % uuid.uuid4())
+
+        try:
+            with open(temporary_path, "wb") as f:
+                f.write(data)
+
+            self.touch(temporary_path)
+            os.replace(temporary_path, self.path(filename))
+        except OSError as e:
+            print("Recording %s could not be cached: %s" % (filename, e))
+
+            with self.lock:
+                self.stats["errors"] += 1
+
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+            return False
+
+        with self.lock:
+            self.total_bytes += len(data)
+
+            # Only measure the directory again once this process has filled the
+            # cache by itself, or once other processes may have
+            if self.total_bytes > self.max_bytes or time.time() - self.scanned_at >= self.scan_interval:
+                self.evict()
+
+        # Recordings larger than the whole cache are removed right away
+        return os.path.exists(self.path(filename))
+
+    def evict(self):
+        # Measure every recording in the directory, including those saved by
+        # other processes, then remove the least recently used ones until there's
+        # enough space. This needs to be called while holding the lock.
+        recordings = []
+        now = time.time()
+
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+            except OSError:
+                # The recording was evicted by another process
+                continue
+
+            if entry.name.startswith("."):
+                # Remove temporary files from saves that never finished, leaving
+                # those that are still being written
+                if entry.name.endswith(".tmp") and now - stat.st_mtime > TEMPORARY_FILE_MAX_AGE:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+                continue
+
+            recordings.append((stat.st_mtime, entry.name, stat.st_size))
+
+        self.total_bytes = sum(size for (_, _, size) in recordings)
+
+        for (_, filename, size) in sorted(recordings):
+            if self.total_bytes <= self.max_bytes:
+                break
+
+            self.total_bytes -= size
+
+            try:
+                os.remove(self.path(filename))
+                self.stats["evictions"] += 1
+            except OSError:
+                # Another process evicted the recording first
+                pass
+
+        self.scanned_at = now
+        self.stats["scans"] += 1
+
+speech_cache = None
+speech_cache_lock = threading.Lock()
+
+def get_speech_cache(app, fetch):
+    """Retrieves this process's speech cache, creating it the first time it's
+    needed.
+    """
+
+    global speech_cache
+
+    with speech_cache_lock:
+        if speech_cache is None:
+            speech_cache = SpeechCache(
+                app.config["SPEECH_CACHE_DIR"],
+                app.config["SPEECH_CACHE_MAX_BYTES"],
+                fetch,
+                app.config["SPEECH_CACHE_SCAN_INTERVAL"]
+            )
+
+    return speech_cache
@@ -1,20 +1,220 @@
-from flask import Blueprint, request, send_file
+from flask import Blueprint, current_app, request, send_file
 from flask_login import current_user
 
-import boto3, json, os, random, requests, uuid
+import boto3, json, os, random, requests, threading, uuid
 from io import BytesIO
+from sqlalchemy.exc import IntegrityError
 
 from app import db
 import app.mod_speech.errors as errors
-from app.mod_speech import ChineseSpeechSynthesis, EnglishSpeechSynthesis
+from app.mod_speech import ChineseSpeechSynthesis, EnglishSpeechSynthesis, hash_source
+from app.mod_speech.cache import get_speech_cache
 from app.mod_users import User
+from app.utils import LRUCache
 
 # Variable used to store the Baidu access token. Is replaced with the actual
 # access token when the first speech request is made
 baidu_access_token = "replace me"
 
+# The greatest number of recording lookups that are kept in memory
+RECORDING_CACHE_SIZE = 65536
+
+# Maps (table, source hash) pairs to recording filenames. Missing recordings
+# aren't remembered, since another process could create them at any time.
+recording_cache = LRUCache(RECORDING_CACHE_SIZE)
+
+# The number of seconds that a request waits for a recording that another
+# request is synthesizing
+SYNTHESIS_TIMEOUT = 60
+
+# The number of seconds to wait for each response from Baidu
+BAIDU_TIMEOUT = 10
+
+# Maps recordings that are being synthesized in this process to their syntheses
+syntheses = {}
+syntheses_lock = threading.Lock()
+
 mod_speech = Blueprint("speech", __name__, url_prefix="/speech")
 
+class Synthesis(object):
+    """A recording being synthesized by one request, which other requests for
+    the same recording wait for.
+    """
+
+    def __init__(self):
+        self.finished = threading.Event()
+        self.failed = False
+
+def find_recording(model, text, voices):
+    """Finds the filename of a recording of some text, using the first voice
+    that has a recording.
+
+    Args:
+        model: ChineseSpeechSynthesis or EnglishSpeechSynthesis.
+        text: The text that was recorded.
+        voices: The voices to look for, in order of preference.
+
+    Returns:
+        The recording's filename, or None if there isn't one.
+    """
+
+    keys = [(model.__tablename__, hash_source(text, voice)) for voice in voices]
+
+    for key in keys:
+        filename = recording_cache.get(key)
+
+        if filename is not None:
+            return filename
+
+    rows = db.session.query(model.source_hash, model.filename) \
+            .filter(model.source_hash.in_([key[1] for key in keys])).all()
+
+    filenames = {source_hash: filename for (source_hash, filename) in rows}
+
+    for key in keys:
+        if key[1] in filenames:
+            recording_cache.put(key, filenames[key[1]])
+
+    for key in keys:
+        if key[1] in filenames:
+            return filenames[key[1]]
+
+    # Recordings saved before hashes were kept don't have one until
+    # backfill-speech-hashes runs. These aren't remembered, since the backfill
+    # may delete them as duplicates.
+    rows = db.session.query(model.voice, model.filename) \
+            .filter(model.source_hash.is_(None), model.source == text, model.voice.in_(voices)) \
+            .order_by(model.id.asc()).all()
+
+    filenames = {}
+
+    for (voice, filename) in rows:
+        filenames.setdefault(voice, filename)
+
+    for voice in voices:
+        if voice in filenames:
+            return filenames[voice]
+
+    return None
+
+def save_recording(synthesis, data):
+    """Adds a new recording to the speech database, unless another process
+    saved a recording of the same text and voice first, in which case that
+    recording is used and the new one is removed from S3.
+
+    Returns:
+        The filename of the saved recording.
+    """
+
+    model = type(synthesis)
+    key = (synthesis.__tablename__, synthesis.source_hash)
+    filename = synthesis.filename
+
+    db.session.add(synthesis)
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+
+        existing = db.session.query(model.filename).filter_by(source_hash=key[1]).scalar()
+
+        if existing is None:
+            raise
+
+        create_s3_client().delete_object(Bucket="storytimeai", Key="speech/%s" % filename)
+        filename = existing
+    else:
+        speech_cache().put(filename, data)
+
+    recording_cache.put(key, filename)
+
+    return filename
+
+def synthesize_once(model, text, voices, synthesize):
+    """Synthesizes a recording unless it's already being synthesized by another
+    request in this process, in which case that request's recording is used
+    once it's finished.
+
+    Args:
+        model: ChineseSpeechSynthesis or EnglishSpeechSynthesis.
+        text: The text that needs to be synthesized.
+        voices: The voices that were requested, in order of preference.
+        synthesize: A function that synthesizes and saves the recording,
+            returning a response.
+
+    Returns:
+        A response with the recording.
+    """
+
+    # Requests that allow either voice share a synthesis with each other, but
+    # not with requests for a specific voice
+    key = (model.__tablename__, hash_source(text, voices[0] if len(voices) == 1 else -1))
+
+    with syntheses_lock:
+        synthesis = syntheses.get(key)
+        leader = synthesis is None
+
+        if leader:
+            synthesis = syntheses[key] = Synthesis()
+
+    if not leader:
+        # Wait for the other request, then use its recording. If it failed, fail
+        # here too rather than trying again one request after another.
+        if not synthesis.finished.wait(SYNTHESIS_TIMEOUT) or synthesis.failed:
+            return errors.issue_generating_speech()
+
+        filename = find_recording(model, text, voices)
+
+        if filename is not None:
+            return send_recording(filename)
+
+        return errors.issue_generating_speech()
+
+    # Count the synthesis as failed unless it returns a recording, including
+    # when it raises an exception
+    synthesis.failed = True
+
+    try:
+        # The recording may have been saved since it was first looked up
+        filename = find_recording(model, text, voices)
+
+        if filename is not None:
+            response = send_recording(filename)
+        else:
+            response = current_app.make_response(synthesize())
+
+        synthesis.failed = response.status_code != 200
+        return response
+    finally:
+        with syntheses_lock:
+            del syntheses[key]
+
+        synthesis.finished.set()
+
+def create_s3_client():
+    return boto3.client(
+        "s3",
+        aws_access_key_id=os.environ["S3_AWS_ACCESS_KEY_ID"],
+        aws_secret_access_key=os.environ["S3_AWS_SECRET_ACCESS_KEY"]
+    )
+
+def fetch_recording(filename):
+    # Retrieve audio data from S3
+    return create_s3_client().get_object(Bucket="storytimeai", Key="speech/%s" % filename)["Body"].read()
+
+def speech_cache():
+    return get_speech_cache(current_app, fetch_recording)
+
+def send_recording(filename):
+    # Send the file back to the requester from local disk, downloading it from
+    # S3 first if it isn't there yet
+    return send_file(
+        speech_cache().get(filename),
+        attachment_filename="speech.mp3",
+        mimetype="audio/mpeg"
+    )
+
 @mod_speech.route("/chinese", methods=["GET"])
 def synthesize_chinese():
     """Returns synthesized Chinese speech, in some audio format.
@@ -26,43 +226,21 @@ def synthesize_chinese():
         The audio file/stream that was generated with the given text.
     """
 
-    # Save Baidu access token outside of this method
-    global baidu_access_token
-
     if "text" not in request.args:
         return errors.text_not_provided()
 
     text = request.args.get("text")
 
-    recording = None
-
+    # Look for a recording with the requested voice, or with either voice
     if "voice" in request.args:
-        voice = int(request.args.get("voice"))
-        recording = ChineseSpeechSynthesis.query.filter_by(source=text, voice=voice).first()
+        voices = [int(request.args.get("voice"))]
     else:
-        recording = ChineseSpeechSynthesis.query.filter_by(source=text).first()
+        voices = [0, 1]
 
-    # voice is defined out here so it can be sent to the database later
-    voice = 0
-    url = ""
+    filename = find_recording(ChineseSpeechSynthesis, text, voices)
 
-    # Create the S3 client since it is needed no matter what
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=os.environ["S3_AWS_ACCESS_KEY_ID"],
-        aws_secret_access_key=os.environ["S3_AWS_SECRET_ACCESS_KEY"]
-    )
-
-    if recording is not None:
-        # Retrieve audio data from S3
-        audio_data = s3.get_object(Bucket="storytimeai", Key="speech/%s" % recording.filename)["Body"].read()
-
-        # Send the file back to the requester
-        return send_file(
-            BytesIO(audio_data),
-            attachment_filename="speech.mp3",
-            mimetype="audio/mpeg"
-        )
+    if filename is not None:
+        return send_recording(filename)
     else:
         # Don't save new recordings in development environment
         if os.environ["ENVIRONMENT"] != "production":
@@ -76,100 +254,91 @@ def synthesize_chinese():
             # No session exists, requester is not authenticated
             return errors.speech_not_found()
 
-        # 0 = female, 1 = male
-        voice = 0
-
-        if "voice" in request.args:
-            voice = int(request.args.get("voice"))
-        else:
-            voice = random.randint(0, 1)
-
-        url = "http://tsn.baidu.com/text2audio" + \
-            "?lan=zh" + \
-            "&ctp=1" + \
-            "&cuid=backend" + \
-            "&tok=" + baidu_access_token + \
-            "&tex=" + text + \
-            "&vol=9" + \
-            "&per=" + str(voice) + \
-            "&spd=3" + \
-            "&pit=5"
-
-        # Download the audio file, from S3 or from Baidu
-        r = requests.get(url)
-
-        # Valid Baidu errors that we want to respond to
-        baidu_errors = ["Access token invalid or no longer valid", "Access token expired"]
-
-        if r.headers.get("Content-Type") == "application/json" and r.json()["err_detail"] in baidu_errors:
-            # Request a new access token from Baidu if the one we have has expired
-            # or if we haven't requested one yet
-            token_url = "https://openapi.baidu.com/oauth/2.0/token" + \
-                "?grant_type=client_credentials" + \
-                "&client_id=" + os.environ["BAIDU_CLIENT_ID"] + \
-                "&client_secret=" + os.environ["BAIDU_CLIENT_SECRET"]
-
-            token_request = requests.get(token_url)
-
-            # Retrieve the new access token and put it in the request URL
-            new_access_token = token_request.json()["access_token"]
-            url = url.replace(baidu_access_token, new_access_token)
-
-            # Store the new access token
-            baidu_access_token = new_access_token
-
-            # Perform the request again, with the new access token
-            r = requests.get(url)
-
-        # At this point, we should have an audio file. If not, don't expose
-        # anything we don't have to
-        if r.headers.get("Content-Type") != "audio/mp3":
-            return errors.issue_generating_speech()
-
-        # Save this recording in S3
-        filename = "%s.mp3" % str(uuid.uuid4())
-        s3.put_object(Body=BytesIO(r.content), Bucket="storytimeai", Key="speech/%s" % filename)
-
-        # Add new audio file to speech database
-        synthesis = ChineseSpeechSynthesis(text, filename, voice)
-        db.session.add(synthesis)
-        db.session.commit()
-
-        # Serve file to the user
-        return send_file(
-            BytesIO(r.content),
-            attachment_filename="speech.mp3",
-            mimetype="audio/mpeg"
-        )
+        def synthesize():
+            # Save Baidu access token outside of this method
+            global baidu_access_token
+
+            # 0 = female, 1 = male
+            if "voice" in request.args:
+                voice = int(request.args.get("voice"))
+            else:
+                voice = random.randint(0, 1)
+
+            url = "http://tsn.baidu.com/text2audio" + \
+                "?lan=zh" + \
+                "&ctp=1" + \
+                "&cuid=backend" + \
+                "&tok=" + baidu_access_token + \
+                "&tex=" + text + \
+                "&vol=9" + \
+                "&per=" + str(voice) + \
+                "&spd=3" + \
+                "&pit=5"
+
+            try:
+                # Download the audio file, from S3 or from Baidu
+                r = requests.get(url, timeout=BAIDU_TIMEOUT)
+
+                # Valid Baidu errors that we want to respond to
+                baidu_errors = ["Access token invalid or no longer valid", "Access token expired"]
+
+                if r.headers.get("Content-Type") == "application/json" and r.json()["err_detail"] in baidu_errors:
+                    # Request a new access token from Baidu if the one we have has expired
+                    # or if we haven't requested one yet
+                    token_url = "https://openapi.baidu.com/oauth/2.0/token" + \
+                        "?grant_type=client_credentials" + \
+                        "&client_id=" + os.environ["BAIDU_CLIENT_ID"] + \
+                        "&client_secret=" + os.environ["BAIDU_CLIENT_SECRET"]
+
+                    token_request = requests.get(token_url, timeout=BAIDU_TIMEOUT)
+
+                    # Retrieve the new access token and put it in the request URL
+                    new_access_token = token_request.json()["access_token"]
+                    url = url.replace(baidu_access_token, new_access_token)
+
+                    # Store the new access token
+                    baidu_access_token = new_access_token
+
+                    # Perform the request again, with the new access token
+                    r = requests.get(url, timeout=BAIDU_TIMEOUT)
+            except requests.RequestException:
+                # Baidu couldn't be reached or took too long to respond
+                return errors.issue_generating_speech()
+
+            # At this point, we should have an audio file. If not, don't expose
+            # anything we don't have to
+            if r.headers.get("Content-Type") != "audio/mp3":
+                return errors.issue_generating_speech()
+
+            # Save this recording in S3
+            filename = "%s.mp3" % str(uuid.uuid4())
+            create_s3_client().put_object(Body=BytesIO(r.content), Bucket="storytimeai", Key="speech/%s" % filename)
+
+            # Add new audio file to speech database
+            save_recording(ChineseSpeechSynthesis(text, filename, voice), r.content)
+
+            # Serve file to the user
+            return send_file(
+                BytesIO(r.content),
+                attachment_filename="speech.mp3",
+                mimetype="audio/mpeg"
+            )
+
+        # Only synthesize this recording once at a time, even if it's requested
+        # by many users at once
+        return synthesize_once(ChineseSpeechSynthesis, text, voices, synthesize)
 
 @mod_speech.route("/english", methods=["GET"])
 def synthesize_english():
-    text = request.args.get("text")
-
-    recording = EnglishSpeechSynthesis.query.filter_by(source=text).first()
-
-    audio_data = None
-
-    # voice is defined out here so it can be sent to the database later
-    voice = 0
+    if "text" not in request.args:
+        return errors.text_not_provided()
 
-    # Save this recording in S3 if it isn't already there
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=os.environ["S3_AWS_ACCESS_KEY_ID"],
-        aws_secret_access_key=os.environ["S3_AWS_SECRET_ACCESS_KEY"]
-    )
+    text = request.args.get("text")
 
-    if recording is not None:
-        # Retrieve audio data from S3
-        audio_data = s3.get_object(Bucket="storytimeai", Key="speech/%s" % recording.filename)["Body"].read()
+    filename = find_recording(EnglishSpeechSynthesis, text, [0, 1])
 
-        # Send the file back to the requester
-        return send_file(
-            BytesIO(audio_data),
-            attachment_filename="speech.mp3",
-            mimetype="audio/mpeg"
-        )
+    if filename is not None:
+        return send_recording(filename)
     else:
         # Don't save new recordings in development environment
         if os.environ["ENVIRONMENT"] != "production":
@@ -183,38 +352,41 @@ def synthesize_english():
             # No session exists, requester is not authenticated
             return errors.speech_not_found()
 
-        polly = boto3.client(
-            "polly",
-            aws_access_key_id=os.environ["POLLY_AWS_ACCESS_KEY_ID"],
-            aws_secret_access_key=os.environ["POLLY_AWS_SECRET_ACCESS_KEY"],
-            region_name="us-east-1"
-        )
-
-        # 0 = female, 1 = male
-        voice = random.randint(0, 1)
-        voice_id = "Joanna" if voice == 0 else "Matthew"
-
-        response = polly.synthesize_speech(
-            OutputFormat="mp3",
-            Text=text,
-            VoiceId=voice_id
-        )
-
-        # Save audio data from response from AWS Polly
-        audio_data = response["AudioStream"].read()
-
-        # Save this recording in S3
-        filename = "%s.mp3" % str(uuid.uuid4())
-        s3.put_object(Body=BytesIO(audio_data), Bucket="storytimeai", Key="speech/%s" % filename)
-
-        # Add new audio file to speech database
-        synthesis = EnglishSpeechSynthesis(text, filename, voice)
-        db.session.add(synthesis)
-        db.session.commit()
+        def synthesize():
+            polly = boto3.client(
+                "polly",
+                aws_access_key_id=os.environ["POLLY_AWS_ACCESS_KEY_ID"],
+                aws_secret_access_key=os.environ["POLLY_AWS_SECRET_ACCESS_KEY"],
+                region_name="us-east-1"
+            )
 
-        # Serve file to the user
-        return send_file(
-            BytesIO(audio_data),
-            attachment_filename="speech.mp3",
-            mimetype="audio/mpeg"
-        )
+            # 0 = female, 1 = male
+            voice = random.randint(0, 1)
+            voice_id = "Joanna" if voice == 0 else "Matthew"
+
+            response = polly.synthesize_speech(
+                OutputFormat="mp3",
+                Text=text,
+                VoiceId=voice_id
+            )
+
+            # Save audio data from response from AWS Polly
+            audio_data = response["AudioStream"].read()
+
+            # Save this recording in S3
+            filename = "%s.mp3" % str(uuid.uuid4())
+            create_s3_client().put_object(Body=BytesIO(audio_data), Bucket="storytimeai", Key="speech/%s" % filename)
+
+            # Add new audio file to speech database
+            save_recording(EnglishSpeechSynthesis(text, filename, voice), audio_data)
+
+            # Serve file to the user
+            return send_file(
+                BytesIO(audio_data),
+                attachment_filename="speech.mp3",
+                mimetype="audio/mpeg"
+            )
+
+        # Only synthesize this recording once at a time, even if it's requested
+        # by many users at once
+        return synthesize_once(EnglishSpeechSynthesis, text, [0, 1], synthesize)
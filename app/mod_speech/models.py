@@ -1,11 +1,27 @@
 from app import db
 
+import hashlib, unicodedata
+
+def hash_source(source, voice):
+    """Hashes the text of a recording along with its voice, so that recordings
+    can be found with an indexed lookup instead of by comparing text.
+
+    Returns:
+        The SHA-1 hex digest of the normalized text and voice.
+    """
+
+    # Text that only differs in Unicode form or surrounding whitespace sounds
+    # the same, so it shares a recording
+    normalized = unicodedata.normalize("NFC", source).strip()
+    return hashlib.sha1(("%d:%s" % (voice, normalized)).encode("utf-8")).hexdigest()
+
 class Base(db.Model):
 
     __abstract__ = True
 
     id = db.Column(db.Integer, primary_key=True)
     source = db.Column(db.Text, nullable=False)
+    source_hash = db.Column(db.String(40), nullable=False, unique=True)
     filename = db.Column(db.String(40), nullable=False)
     voice = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
@@ -13,6 +29,7 @@ class Base(db.Model):
 
     def __init__(self, source, filename, voice):
         self.source = source
+        self.source_hash = hash_source(source, voice)
         self.filename = filename
         self.voice = voice
 
@@ -3,6 +3,7 @@ from flask_login import current_user
 import json
 
 from app import db, admin_required
+from app.catalog import get_catalog
 import app.mod_stories.errors as errors
 from app.mod_passages import Passage
 from app.mod_stories import Story
@@ -37,15 +38,15 @@ def get_story(story_id):
         The JSON data for this story.
     """
 
-    # Retrieve the story with this id
-    story = Story.query.filter_by(id=story_id).first()
+    # Find the story with this id in the catalog
+    story = get_catalog().stories_by_id.get(int(story_id)) if str(story_id).isdigit() else None
 
     if story:
         # Retrieve all passages associated with this story
-        passages = Passage.query.filter(Passage.id.in_(json.loads(story.passage_ids))).all()
+        passages = Passage.query.filter(Passage.id.in_(story["passage_ids"])).all() if len(story["passage_ids"]) > 0 else []
         passages_data = [passage.serialize() for passage in passages]
 
-        story_data = story.serialize()
+        story_data = dict(story)
         story_data["passages"] = passages_data
 
         # Return JSON data for this story, with its passages
@@ -2,7 +2,8 @@ import re, validators
 from zxcvbn import zxcvbn
 
 from . import errors
-from .models import EmailVerification, Invitation, PasswordReset, User
+from .models import EmailVerification, Invitation, PasswordReset, SavedEntry, User
+from .cache import forget_user, load_cached_user, load_fresh_user
 
 def validate_username(username):
     if len(username) < 4:
@@ -0,0 +1,77 @@
+from app import db
+from app.utils import LRUCache
+from .models import User
+
+from sqlalchemy import event
+import time
+
+# The greatest number of users that are kept in memory
+USER_CACHE_SIZE = 4096
+
+# The number of seconds before a user is loaded from MySQL again, which picks
+# up changes made by other processes
+USER_CACHE_TTL = 30
+
+# Maps user ids to (detached user, time loaded) pairs
+user_cache = LRUCache(USER_CACHE_SIZE)
+
+def load_cached_user(user_id):
+    """Finds a user by id, only querying MySQL if they weren't loaded recently.
+    Cached users can be out of date by up to USER_CACHE_TTL seconds, so admins
+    are never cached, and anything that changes a user or shows their settings
+    uses load_fresh_user instead.
+
+    Returns:
+        The user, attached to the current session, or None if there isn't a
+        user with this id.
+    """
+
+    try:
+        user_id = int(user_id)
+    except ValueError:
+        return None
+
+    cached = user_cache.get(user_id)
+
+    if cached is not None and time.time() - cached[1] < USER_CACHE_TTL:
+        # Copy the cached user into this session without a query
+        return db.session.merge(cached[0], load=False)
+
+    user = User.query.filter_by(id=user_id).first()
+
+    if user is None:
+        return None
+
+    # Admins are loaded on every request, so that taking away someone's admin
+    # role takes effect everywhere right away
+    if user.is_admin:
+        return user
+
+    # Keep a detached copy, which is never changed after this, and give the
+    # request a copy of its own
+    db.session.expunge(user)
+
+    user_cache.put(user_id, (user, time.time()))
+
+    return db.session.merge(user, load=False)
+
+def load_fresh_user(user_id):
+    """Finds a user by id, always reading their row from MySQL. If a cached copy
+    of the user was already added to the session for this request, it's
+    overwritten with the current data.
+
+    Returns:
+        The user, or None if there isn't a user with this id.
+    """
+
+    return User.query.populate_existing().filter_by(id=user_id).first()
+
+def forget_user(user_id):
+    user_cache.pop(user_id)
+
+def user_changed(mapper, connection, target):
+    forget_user(target.id)
+
+# Forget users when their settings, password, roles or anything else changes
+event.listen(User, "after_update", user_changed)
+event.listen(User, "after_delete", user_changed)
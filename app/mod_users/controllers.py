@@ -7,7 +7,7 @@ from app import admin_required, db, log_error
 from app.email import Email, send
 from app.mod_users import validate_username, validate_email, validate_password
 import app.mod_users.errors as errors
-from app.mod_users import User, EmailVerification, Invitation, PasswordReset
+from app.mod_users import User, EmailVerification, Invitation, PasswordReset, load_fresh_user
 from app.utils import check_body
 
 # Create users Flask blueprint
@@ -25,8 +25,9 @@ def get_user(user_id):
         The JSON data for this user.
     """
 
-    # Find user in the SQL database
-    user = User.query.filter_by(id=user_id).first()
+    # Find the user in the SQL database, since the user loaded for this request
+    # may have been cached before another process changed their settings
+    user = load_fresh_user(user_id)
 
     # Return 404 if there is no user with this id
     if user is None:
@@ -141,7 +142,7 @@ def update_user(user_id):
     data = request.json["data"]
 
     # Retrieve the user who is being updated
-    user = User.query.filter_by(id=user_id).first()
+    user = load_fresh_user(user_id)
 
     if user is None:
         # Return 404 if this user doesn't exist
@@ -200,7 +201,7 @@ def update_user(user_id):
         settings[section] = data
 
     # Update the user's settings in MySQL
-    user.settings = json.dumps(settings)
+    user.set_settings(settings)
     db.session.commit()
 
     # Return this user's JSON data
@@ -290,7 +291,7 @@ def update_password(user_id):
     new_password = request.json["new_password"]
 
     # Retrieve the user who is being updated
-    user = User.query.filter_by(id=user_id).first()
+    user = load_fresh_user(user_id)
 
     if user is None:
         # Return 404 if this user doesn't exist
@@ -378,7 +379,7 @@ def verify_email():
         # Return 400 if the verification code is invalid
         return errors.invalid_verification_code()
 
-    user = User.query.filter_by(id=verification.user_id).first()
+    user = load_fresh_user(verification.user_id)
 
     if user is None:
         # This should never happen, in theory
@@ -410,7 +411,7 @@ def resend_confirmation_email(user_id):
     """
 
     # Find the user who is confirming their email address
-    user = User.query.filter_by(id=user_id).first()
+    user = load_fresh_user(user_id)
 
     if user is None:
         # Return 404 if this user doesn't exist
@@ -444,7 +445,7 @@ def cancel_email_change(user_id):
     """
 
     # Find the user who is confirming their email address
-    user = User.query.filter_by(id=user_id).first()
+    user = load_fresh_user(user_id)
 
     if user is None:
         # Return 404 if this user doesn't exist
@@ -1,6 +1,7 @@
 from enum import Enum
 from flask_login import UserMixin
-import json, uuid
+from sqlalchemy import inspect
+import copy, json, uuid
 
 from app import db
 
@@ -14,6 +15,46 @@ default_settings = {
     }
 }
 
+def decode_settings(raw):
+    global default_settings
+
+    settings = {}
+
+    try:
+        settings = json.loads(raw)
+    except:
+        pass
+
+    # Fill in anything that's missing with copies of the default settings
+    for section in default_settings.keys():
+        if section not in settings:
+            settings[section] = copy.deepcopy(default_settings[section])
+
+    for section in settings:
+        for key in default_settings.get(section, {}).keys():
+            if key not in settings[section]:
+                settings[section][key] = default_settings[section][key]
+
+    return settings
+
+# Whether users still have the saved_entry_ids column, which migration 008
+# drops once every list has been copied into saved_entries
+saved_entry_lists_exist = None
+
+def has_saved_entry_lists():
+    global saved_entry_lists_exist
+
+    if saved_entry_lists_exist is None:
+        columns = inspect(db.engine).get_columns("users")
+        saved_entry_lists_exist = "saved_entry_ids" in [column["name"] for column in columns]
+
+    return saved_entry_lists_exist
+
+def decode_ids(raw):
+    # Keep the ids in order along with a set for membership checks
+    ids = json.loads(raw)
+    return (ids, frozenset(ids))
+
 class Base(db.Model):
 
     __abstract__ = True
@@ -31,7 +72,6 @@ class User(Base, UserMixin):
     roles = db.Column(db.Text, nullable=False)
     settings = db.Column(db.Text, nullable=False)
     pending_email = db.Column(db.Text)
-    saved_entry_ids = db.Column(db.Text, nullable=False)
     updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
 
     def __init__(self, username, email, password):
@@ -43,11 +83,10 @@ class User(Base, UserMixin):
         self.roles = "[]"
         self.settings = json.dumps(default_settings)
         self.pending_email = email
-        self.saved_entry_ids = "[]"
 
     @property
     def is_admin(self):
-        return UserGroup.ADMIN.value in json.loads(self.roles)
+        return UserGroup.ADMIN.value in self.decoded("roles", decode_ids)[1]
 
     @property
     def is_anonymous(self):
@@ -56,26 +95,101 @@ class User(Base, UserMixin):
     def get_id(self):
         return str(self.id)
 
+    def decoded(self, column, decode):
+        """Decodes a text column, reusing the value that was decoded last time
+        unless the column has changed since. Users are loaded without __init__
+        being called, so the decoded values are stored when first needed.
+
+        Args:
+            column: The name of the column to decode.
+            decode: A function that decodes the column's text.
+
+        Returns:
+            The decoded value, which shouldn't be changed by the caller.
+        """
+
+        if "_decoded_columns" not in self.__dict__:
+            self._decoded_columns = {}
+
+        raw = getattr(self, column)
+        cached = self._decoded_columns.get(column)
+
+        if cached is None or cached[0] is not raw:
+            cached = (raw, decode(raw))
+            self._decoded_columns[column] = cached
+
+        return cached[1]
+
+    def get_roles(self):
+        return list(self.decoded("roles", decode_ids)[0])
+
     def get_settings(self):
-        global default_settings
+        # Return a copy, since callers change settings before saving them
+        return copy.deepcopy(self.decoded("settings", decode_settings))
 
-        settings = {}
+    def set_settings(self, settings):
+        self.settings = json.dumps(settings)
 
-        try:
-            settings = json.loads(self.settings)
-        except:
-            pass
+    def copy_saved_entry_list(self):
+        """Copies this user's saved entries from the JSON list they were kept in
+        before saved_entries into their own rows, and clears the list. This
+        happens before saved entries are read or changed, so that entries saved
+        or unsaved since the switch are merged with the list instead of being
+        lost when the list is copied later.
+        """
 
-        for section in default_settings.keys():
-            if section not in settings:
-                settings[section] = default_settings[section]
+        if not has_saved_entry_lists():
+            return
 
-        for section in settings:
-            for key in default_settings[section].keys():
-                if key not in settings[section]:
-                    settings[section][key] = default_settings[section][key]
+        params = {"user_id": self.id}
+        query = "SELECT saved_entry_ids FROM users WHERE id = :user_id"
 
-        return settings
+        if db.session.execute(query, params).scalar() is None:
+            return
+
+        # Lock the user so that the list is only copied once
+        saved_entry_ids = db.session.execute(query + " FOR UPDATE", params).scalar()
+
+        if saved_entry_ids is None:
+            return
+
+        # Lists sometimes have the same id more than once
+        rows = [{"user_id": self.id, "entry_id": entry_id} for entry_id in set(json.loads(saved_entry_ids))]
+
+        if len(rows) > 0:
+            db.session.execute(SavedEntry.__table__.insert().prefix_with("IGNORE"), rows)
+
+        db.session.execute("UPDATE users SET saved_entry_ids = NULL WHERE id = :user_id", params)
+
+    def get_saved_entry_ids(self):
+        self.copy_saved_entry_list()
+
+        # Return entries in the order that they were saved
+        rows = db.session.query(SavedEntry.entry_id).filter_by(user_id=self.id) \
+                .order_by(SavedEntry.created_at.asc(), SavedEntry.entry_id.asc()).all()
+
+        return [row[0] for row in rows]
+
+    def has_saved_entry(self, entry_id):
+        self.copy_saved_entry_list()
+
+        return db.session.query(
+            SavedEntry.query.filter_by(user_id=self.id, entry_id=entry_id).exists()
+        ).scalar()
+
+    def save_entry(self, entry_id):
+        self.copy_saved_entry_list()
+
+        # Saving an entry twice leaves the first row as it is
+        db.session.execute(SavedEntry.__table__.insert().prefix_with("IGNORE"), {
+            "user_id": self.id,
+            "entry_id": entry_id
+        })
+
+    def unsave_entry(self, entry_id):
+        self.copy_saved_entry_list()
+
+        SavedEntry.query.filter_by(user_id=self.id, entry_id=entry_id).delete(synchronize_session=False)
 
     def serialize(self, full=False):
         data = {
@@ -83,17 +197,29 @@ class User(Base, UserMixin):
             "username": self.username,
             "created_at": self.created_at,
             "updated_at": self.updated_at,
-            "roles": json.loads(self.roles)
+            "roles": self.get_roles()
         }
 
         if full:
             data["email"] = self.email
             data["settings"] = self.get_settings()
             data["pending_email"] = self.pending_email
-            data["saved_entry_ids"] = json.loads(self.saved_entry_ids)
+            data["saved_entry_ids"] = self.get_saved_entry_ids()
 
         return data
 
+class SavedEntry(db.Model):
+
+    __tablename__ = "saved_entries"
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    entry_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    def __init__(self, user_id, entry_id):
+        self.user_id = user_id
+        self.entry_id = entry_id
+
 class UserGroup(Enum):
     ADMIN = 1
 
@@ -4,9 +4,9 @@ import json, re
 
 from app import db, admin_required
 from app.chinese import pinyin
+from app.mod_games.question import clear_serialization_cache
 import app.mod_vocab.errors as errors
 from app.mod_vocab import Entry, Sentence
-from app.mod_users import User
 from app.utils import check_body
 
 mod_vocab = Blueprint("vocab", __name__, url_prefix="/vocabulary")
@@ -68,10 +68,7 @@ def get_entry(entry_id):
 
         # If someone is logged in, return whether they've saved this entry
         if current_user.is_active:
-            user = User.query.filter_by(id=current_user.id).first()
-            saved_entry_ids = json.loads(user.saved_entry_ids)
-
-            entry_data["saved"] = int(entry.id) in saved_entry_ids
+            entry_data["saved"] = current_user.has_saved_entry(int(entry.id))
 
         # Return the entry's JSON data
         return jsonify(entry_data)
@@ -105,6 +102,9 @@ def create_entry():
     db.session.add(entry)
     db.session.commit()
 
+    # Serialized questions include data from entries
+    clear_serialization_cache()
+
     # Return JSON data for the new entry
     return get_entry(entry.id)
 
@@ -159,6 +159,9 @@ def update_entry(entry_id):
     # Save changes in MySQL
     db.session.commit()
 
+    # Serialized questions include data from entries
+    clear_serialization_cache()
+
     # Return updated entry JSON data
     return get_entry(entry_id)
 
@@ -177,17 +180,10 @@ def save_entry(entry_id):
 
     entry_id = int(entry_id)
 
-    # Get the current user
-    user = User.query.filter_by(id=current_user.id).first()
-
-    # Update the user's entry ids by adding the new one
-    saved_entry_ids = json.loads(user.saved_entry_ids)
-
-    if entry_id not in saved_entry_ids:
-        saved_entry_ids.append(entry_id)
+    # Add a row for this entry if it isn't saved already
+    current_user.save_entry(entry_id)
 
     # Save changes in MySQL
-    user.saved_entry_ids = json.dumps(saved_entry_ids)
     db.session.commit()
 
     # Return no content
@@ -208,18 +204,8 @@ def unsave_entry(entry_id):
 
     entry_id = int(entry_id)
 
-    # Get the current user
-    user = User.query.filter_by(id=current_user.id).first()
-
-    # Update the user's entry ids by removing this one
-    saved_entry_ids = json.loads(user.saved_entry_ids)
-
-    try:
-        saved_entry_ids = [id for id in saved_entry_ids if id != entry_id]
-    except:
-        pass
-
-    user.saved_entry_ids = json.dumps(saved_entry_ids)
+    # Remove this entry's row if there is one
+    current_user.unsave_entry(entry_id)
 
     # Save changes in MySQL
     db.session.commit()
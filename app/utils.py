@@ -1,4 +1,10 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from flask import request
+import re, threading
+
+# ISO 8601 timestamps, with optional fractional seconds and UTC offset
+ISO_8601_PATTERN = re.compile(r"^(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?(Z|[+\- ]\d{2}:?\d{2})?$")
 
 def check_body(keys):
     if request.json == None:
@@ -9,3 +15,107 @@ def check_body(keys):
                 return False
 
     return True
+
+def parse_timestamp(value):
+    """Parses an ISO 8601 timestamp into a naive datetime in UTC, which is how
+    MySQL stores timestamps. Timestamps without an offset are taken to be UTC
+    already, since that's how they're sent to clients.
+
+    Raises:
+        ValueError: If the timestamp isn't valid ISO 8601.
+    """
+
+    match = ISO_8601_PATTERN.match(value)
+
+    if match is None:
+        raise ValueError("Invalid timestamp: %s" % value)
+
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    microsecond = int(fraction.ljust(6, "0")) if fraction is not None else 0
+
+    timestamp = datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), microsecond)
+
+    # A + that wasn't escaped in a query string arrives as a space
+    if offset is not None and offset != "Z":
+        hours, minutes = int(offset[1:3]), int(offset[-2:])
+
+        if hours > 23 or minutes > 59:
+            raise ValueError("Invalid UTC offset: %s" % offset)
+
+        # Subtract the offset to get back to UTC
+        delta = timedelta(hours=hours, minutes=minutes)
+        timestamp = timestamp + delta if offset[0] == "-" else timestamp - delta
+
+    return timestamp
+
+class LRUCache(object):
+    """A mapping that can be shared between threads, which forgets its least
+    recently used items once it holds more than max_size of them.
+
+    Args:
+        max_size: The greatest number of items to keep.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key, default=None):
+        """Retrieves an item, marking it as the most recently used."""
+
+        with self.lock:
+            if key not in self.items:
+                return default
+
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.store(key, value)
+
+    def update(self, key, change):
+        """Replaces an item with change(item), where item is None if there isn't
+        one, without any other thread changing it in between. The item is
+        removed if change returns None.
+
+        Returns:
+            The new item.
+        """
+
+        with self.lock:
+            value = change(self.items.get(key))
+
+            if value is None:
+                self.items.pop(key, None)
+            else:
+                self.store(key, value)
+
+            return value
+
+    def pop(self, key, default=None):
+        with self.lock:
+            return self.items.pop(key, default)
+
+    def remove_if(self, predicate):
+        # Remove every item whose key matches
+        with self.lock:
+            for key in [key for key in self.items if predicate(key)]:
+                del self.items[key]
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def store(self, key, value):
+        # Needs to be called while holding the lock
+        self.items[key] = value
+        self.items.move_to_end(key)
+
+        # Forget the least recently used items if there are too many
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
@@ -0,0 +1,70 @@
+from flask import Flask
+from sqlalchemy.engine.url import make_url
+import numpy as np, os, time
+
+def create_app(database="storytime_test"):
+    """Creates an application that is connected to a local MySQL database, the
+    same way the test client is. Benchmarks may drop every table in this
+    database, so it's always the one named here, never RDS_DB_NAME from the
+    environment.
+
+    Args:
+        database: The name of the local database to connect to.
+
+    Returns:
+        The configured Flask application.
+    """
+
+    if os.environ.get("ENVIRONMENT") == "production":
+        raise SystemExit("Benchmarks can't be run with ENVIRONMENT=production")
+
+    os.environ.setdefault("ENVIRONMENT", "development")
+    os.environ["RDS_DB_NAME"] = database
+    os.environ.setdefault("RDS_HOSTNAME", "localhost")
+    os.environ.setdefault("RDS_PASSWORD", "")
+    os.environ.setdefault("RDS_USERNAME", "root")
+    os.environ.setdefault("SECRET_KEY", "secret")
+    os.environ.setdefault("STRIPE_SECRET_KEY", "")
+
+    from app import configure_app
+
+    application = Flask(__name__)
+    configure_app(application)
+
+    check_database(application, database)
+    return application
+
+def check_database(application, database):
+    # Refuse to go any further if the app ended up connected to some other
+    # database, such as when config was imported before RDS_DB_NAME was set
+    connected_database = make_url(application.config["SQLALCHEMY_DATABASE_URI"]).database
+
+    if connected_database != database:
+        raise SystemExit("Benchmark expected database %s but the app is connected to %s" % (database, connected_database))
+
+def time_calls(func, repeat):
+    """Calls a function several times and measures how long each call takes.
+
+    Returns:
+        A list with the duration of each call, in seconds.
+    """
+
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    return timings
+
+def report(name, timings, queries=None):
+    # Print the median and 95th percentile in milliseconds
+    p50, p95 = np.percentile(timings, [50, 95]) * 1000
+    line = "%-40s p50 %9.3f ms   p95 %9.3f ms   (%d runs)" % (name, p50, p95, len(timings))
+
+    # Along with the median and greatest number of queries per run, if counted
+    if queries is not None:
+        line += "   queries p50 %d max %d" % (np.median(queries), max(queries))
+
+    print(line)
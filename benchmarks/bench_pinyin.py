@@ -0,0 +1,77 @@
+"""Compares converting every Scribe question to pinyin the way ScribeQuestion
+used to (one pypinyin call per word, for the sentence and for each word) with
+pinyin_many and its shared word cache.
+
+Usage:
+    python -m benchmarks.bench_pinyin [--repeat 5]
+"""
+
+import argparse, jieba
+from pypinyin import pinyin as pypinyin
+
+from benchmarks import create_app, report, time_calls
+
+def legacy_pinyin(text):
+    words = [{"chinese": word, "punctuation": False} for word in jieba.cut(text)]
+    pinyin_words = [pypinyin(word["chinese"]) for word in words]
+    joined_pinyin_words = ["".join([j for i in words for j in i]) for words in pinyin_words]
+
+    capitalize_next_word = True
+    sentence = ""
+
+    for i, word in enumerate(joined_pinyin_words):
+        if capitalize_next_word:
+            word = word.capitalize()
+            capitalize_next_word = False
+
+        if word in ["。", "！", "？"]:
+            capitalize_next_word = True
+            word = {"。": ".", "！": "!", "？": "?"}[word]
+            words[i]["punctuation"] = True
+        elif word == "，":
+            word = ","
+            words[i]["punctuation"] = True
+
+        sentence += word if words[i]["punctuation"] else " " + word
+
+    return sentence[1:len(sentence)]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    application = create_app()
+
+    from app.chinese import pinyin_many, segment, word_pinyin
+    from app.mod_games.mod_scribe import ScribeQuestion
+
+    with application.app_context():
+        sentences = [question.chinese for question in ScribeQuestion.query.all()]
+
+        # Segment up front so that only pinyin conversion is being measured
+        words = [segment(sentence) for sentence in sentences]
+
+    print("%d scribe questions, %d words" % (len(sentences), sum(len(x) for x in words)))
+
+    def legacy():
+        for sentence, sentence_words in zip(sentences, words):
+            legacy_pinyin(sentence)
+            [legacy_pinyin(word) for word in sentence_words]
+
+    def batched():
+        pinyin_many(sentences)
+
+        for sentence_words in words:
+            pinyin_many(sentence_words)
+
+    def cold():
+        word_pinyin.cache_clear()
+        batched()
+
+    report("legacy per-word pypinyin", time_calls(legacy, args.repeat))
+    report("pinyin_many, cold cache", time_calls(cold, args.repeat))
+    report("pinyin_many, warm cache", time_calls(batched, args.repeat))
+
+if __name__ == "__main__":
+    main()
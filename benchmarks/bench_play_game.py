@@ -0,0 +1,194 @@
+"""Times Question.play_game for every game against a synthetic question bank and
+a synthetic learner with a long history, so that changes to question picking can
+be compared before they're deployed.
+
+This drops and recreates every table in the benchmark database, so it needs a
+database of its own. It's created if it doesn't exist yet.
+
+Usage:
+    python -m benchmarks.bench_play_game [--database storytime_bench]
+        [--questions 2000] [--entries 5000] [--masteries 2000]
+        [--results 500] [--repeat 50] [--seed 0]
+"""
+
+import argparse, numpy as np, os, time
+from sqlalchemy import create_engine, event
+
+from benchmarks import check_database, create_app, report
+
+# Characters that synthetic words are made from
+CHARACTERS = "的一是不了人我在有他这中大来上个国到说们为子和你地出道也时年得就那要下以生会自着去之过家学对可她里后小么心多天而能好都然没日于起还发成事只作当想看文无开手十用主行方又如前所本见经头面公同三已老从动两长知民样现分将外但身些与高意进把法此实回二理美点月明其种声全工己话儿者向情部正名定女问力机给等几很业最间新什打便位因重被走电四第门相次东政海口使教西再平真听世气信北少关并内加化由却代军产入先山五太水万市眼体别处总才场师书比住员九笑性通目华报立马命张活难神数件安表原车白应路期叫死常提感金何更反合放做系计或司利受光王果亲界及今京务制解各任至清物台象记边共风战干接它许八特觉望直服毛林题建南度统色字请交爱让认算论百吃义科怎元社术结六功指思非流每青管夫连远资队跟带花快条院变联言权往展该领传近留红治决周保达办运武半候七必城父强步完革深区即求品士转量空甚众技轻程告江语英基派满式李息写呢识极令黄德收脸钱党倒未持音"
+
+# Synthetic words used in English answers and explanations
+ENGLISH = "The quick brown fox jumps over the lazy dog."
+
+def create_database(database):
+    # Connect to the server without a database, so that the database can be
+    # created before the app connects to it
+    engine = create_engine("mysql://%s:%s@%s/?charset=utf8mb4" % (
+        os.environ.get("RDS_USERNAME", "root"),
+        os.environ.get("RDS_PASSWORD", ""),
+        os.environ.get("RDS_HOSTNAME", "localhost")
+    ))
+
+    engine.execute("CREATE DATABASE IF NOT EXISTS `%s` CHARACTER SET utf8mb4" % database)
+    engine.dispose()
+
+def seed(args, random):
+    """Replaces everything in the benchmark database with a synthetic question
+    bank, vocabulary and learner.
+
+    Returns:
+        The id of the learner.
+    """
+
+    from app import db
+    from flask import current_app
+    from app.mod_games import Game
+    from app.mod_games.mod_compound import CompoundQuestion
+    from app.mod_games.mod_copy_edit import CopyEditQuestion
+    from app.mod_games.mod_expressions import ExpressionsQuestion
+    from app.mod_games.mod_narrative import NarrativeQuestion
+    from app.mod_games.mod_scribe import ScribeQuestion
+    from app.mod_mastery import Mastery
+    from app.mod_users import User
+    from app.mod_vocab import Entry
+
+    # Make sure this is the benchmark database before dropping anything
+    check_database(current_app, args.database)
+
+    db.drop_all()
+    db.create_all()
+
+    # Make words of one to three characters, without any repeats
+    words = set()
+
+    while len(words) < args.entries:
+        length = random.randint(1, 4)
+        words.add("".join(random.choice(list(CHARACTERS), length)))
+
+    words = sorted(words)
+
+    start = time.perf_counter()
+    db.session.bulk_save_objects([Entry(word, "word %d" % idx) for (idx, word) in enumerate(words)])
+    db.session.commit()
+    print("Seeded %d entries in %.1f s" % (len(words), time.perf_counter() - start))
+
+    def sentence(min_words=3, max_words=9):
+        return "".join(random.choice(words, random.randint(min_words, max_words))) + "。"
+
+    # Speaker questions are Scribe questions, so they're only seeded once
+    question_types = {
+        ScribeQuestion: lambda: ScribeQuestion(sentence(), ENGLISH, []),
+        CompoundQuestion: lambda: CompoundQuestion("prompt", [
+            [{"character": character} for character in random.choice(list(CHARACTERS), 4)] for _ in range(2)
+        ], "answer"),
+        CopyEditQuestion: lambda: CopyEditQuestion("{%s}%s" % (sentence(1, 1)[:-1], sentence()), ENGLISH, sentence()),
+        NarrativeQuestion: lambda: NarrativeQuestion([{"prompt": sentence()} for _ in range(3)]),
+        ExpressionsQuestion: lambda: ExpressionsQuestion(sentence(), sentence(1, 3), sentence(1, 3), sentence(1, 3), sentence(1, 3), True, False, False, False)
+    }
+
+    for question_type, create_question in question_types.items():
+        start = time.perf_counter()
+
+        questions = [create_question() for _ in range(args.questions)]
+        db.session.add_all(questions)
+        db.session.flush()
+
+        for question in questions:
+            question.index_words()
+
+        db.session.commit()
+        print("Seeded %d %s in %.1f s" % (len(questions), question_type.__tablename__, time.perf_counter() - start))
+
+    user = User("learner", "learner@storytime.works", "password")
+    db.session.add(user)
+    db.session.commit()
+
+    # Give the learner masteries for random entries
+    entry_ids = random.choice(np.arange(1, len(words) + 1), min(args.masteries, len(words)), False)
+    db.session.bulk_save_objects([Mastery(user.id, int(entry_id), int(random.randint(0, 11))) for entry_id in entry_ids])
+
+    # Give the learner a history in every game, with ten questions per game
+    for game in Game:
+        if game.question is None:
+            continue
+
+        results = []
+
+        for _ in range(args.results):
+            question_ids = random.choice(np.arange(1, args.questions + 1), 10, False).tolist()
+            num_correct = random.randint(5, 11)
+
+            results.append(game.result(user.id, game.value, num_correct, 10 - num_correct, question_ids[:num_correct], question_ids[num_correct:]))
+
+        db.session.bulk_save_objects(results)
+
+    db.session.commit()
+    print("Seeded %d masteries and %d results per game" % (len(entry_ids), args.results))
+
+    return user.id
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database", default="storytime_bench")
+    parser.add_argument("--questions", type=int, default=2000)
+    parser.add_argument("--entries", type=int, default=5000)
+    parser.add_argument("--masteries", type=int, default=2000)
+    parser.add_argument("--results", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    create_database(args.database)
+    application = create_app(args.database)
+
+    from app import db
+    from app.mod_games import Game
+    from app.mod_users import User
+    from flask_login import login_user
+
+    # The number of statements sent to MySQL during each game that's played,
+    # which are only counted while a game is being played
+    queries = []
+    playing = [False]
+
+    with application.app_context():
+        user_id = seed(args, np.random.RandomState(args.seed))
+
+        @event.listens_for(db.engine, "before_cursor_execute")
+        def count_query(*_):
+            if playing[0]:
+                queries[-1] += 1
+
+    def play(question_type):
+        # Load the learner the same way a request would, but only measure the
+        # game itself
+        with application.test_request_context():
+            login_user(User.query.get(user_id))
+
+            queries.append(0)
+            playing[0] = True
+            start = time.perf_counter()
+
+            question_type.play_game()
+
+            duration = time.perf_counter() - start
+            playing[0] = False
+
+        return duration
+
+    for game in Game:
+        if game.question is None:
+            continue
+
+        # The first game rebuilds the learner's states from their results
+        duration = play(game.question)
+        print("%-40s %9.3f ms   %d queries" % (game.name.lower() + ", first game", duration * 1000, queries.pop()))
+
+        timings = [play(game.question) for _ in range(args.repeat)]
+        report(game.name.lower(), timings, queries)
+        del queries[:]
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Compares the compiled JiebaException rules with the previous implementation,
+which ran str.replace over a comma-joined string once per multi-word exception.
+
+The previous implementation also queried jieba_exceptions twice per call. Those
+queries are left out here, so this only measures the cost of applying rules.
+
+Usage:
+    python -m benchmarks.bench_segment [--rules 500] [--repeat 200]
+"""
+
+import argparse, jieba
+
+from benchmarks import create_app, report, time_calls
+
+# A passage-sized piece of text, about as long as one of our longer passages
+PASSAGE = "你好，我叫小雪。我是美国人，现在在北京学习中文。" \
+    "我每天早上七点起床，八点去学校上课。我们的老师很好，她常常帮助我们练习说中文。" \
+    "下课以后，我和朋友一起去饭馆吃饭。我最喜欢吃饺子，可是我的朋友喜欢吃面条。" \
+    "周末的时候，我们常常去公园散步，有时候也去看电影。你呢？你周末喜欢做什么？" * 4
+
+PUNCTUATION = ["。", "？", "！", "，", ".", "!", "?", ","]
+
+def legacy_apply(words, exceptions):
+    exceptions_map = {exception.word: exception.replacement for exception in exceptions if "," not in exception.word}
+    new_words = []
+
+    for word in words:
+        if word in exceptions_map:
+            new_words.extend(exceptions_map[word].split(","))
+        else:
+            new_words.append(word)
+
+    new_words_string = ",".join(new_words)
+
+    for exception in exceptions:
+        if "," in exception.word:
+            new_words_string = new_words_string.replace(exception.word, exception.replacement)
+
+    return new_words_string.split(",")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    create_app()
+
+    from app.chinese import ExceptionRules, JiebaException
+
+    words = [x for x in jieba.cut(PASSAGE) if x not in PUNCTUATION]
+
+    # Create exceptions that join pairs of adjacent words, so that rules
+    # actually match the passage, and pad with rules that never match
+    exceptions = []
+    pairs = []
+
+    for first, second in zip(words, words[1:]):
+        if (first, second) not in pairs:
+            pairs.append((first, second))
+
+    for first, second in pairs[:args.rules // 2]:
+        exceptions.append(JiebaException(word="%s,%s" % (first, second), replacement=first + second))
+
+    while len(exceptions) < args.rules:
+        exceptions.append(JiebaException(word="无,关%d" % len(exceptions), replacement="无关"))
+
+    print("%d words, %d exceptions" % (len(words), len(exceptions)))
+
+    report("compile rules", time_calls(lambda: ExceptionRules(exceptions), 20))
+
+    rules = ExceptionRules(exceptions)
+
+    report("legacy str.replace", time_calls(lambda: legacy_apply(words, exceptions), args.repeat))
+    report("compiled rules", time_calls(lambda: rules.apply(words), args.repeat))
+
+if __name__ == "__main__":
+    main()
@@ -16,3 +16,34 @@ SQLALCHEMY_TRACK_MODIFICATIONS = False
 
 # Secret key for signing cookies
 SECRET_KEY = os.environ["SECRET_KEY"]
+
+# Snapshot of jieba's prefix dictionary, loaded by every worker on startup
+JIEBA_CACHE_FILE = os.environ.get("JIEBA_CACHE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jieba.cache"))
+
+# Whether each app process applies queued mastery updates in a background
+# thread. Without one, run: FLASK_APP=run.py flask process-mastery-updates
+MASTERY_WORKER = os.environ.get("MASTERY_WORKER", "true") == "true"
+
+# Where request logs are written, which can be "mysql", "file" or both
+LOG_SINKS = os.environ.get("LOG_SINKS", "mysql").split(",")
+
+# The file that request logs are appended to by the "file" sink, which is
+# rotated once it's larger than LOG_FILE_MAX_BYTES. Each process adds its pid
+# to the name, such as requests.1234.log
+LOG_FILE = os.environ.get("LOG_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "requests.log"))
+LOG_FILE_MAX_BYTES = 100 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 10
+
+# The fraction of requests that are logged for busy paths, such as
+# {"/speech/chinese": 0.1}. Patterns are matched with fnmatch in order, and
+# paths that don't match any are always logged
+LOG_SAMPLE_RATES = {}
+
+# Where recordings from S3 are kept on local disk, and the most space they can
+# take up before the least recently used ones are removed
+SPEECH_CACHE_DIR = os.environ.get("SPEECH_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "speech_cache"))
+SPEECH_CACHE_MAX_BYTES = int(os.environ.get("SPEECH_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# How often, in seconds, each process measures the speech cache's directory to
+# see recordings saved by other processes
+SPEECH_CACHE_SCAN_INTERVAL = int(os.environ.get("SPEECH_CACHE_SCAN_INTERVAL", 60))
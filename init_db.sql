@@ -23,30 +23,40 @@ CREATE TABLE users (
   roles TEXT NOT NULL,
   settings TEXT NOT NULL,
   pending_email TEXT,
-  saved_entry_ids TEXT NOT NULL,
   created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
   updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (id)
 );
 
+CREATE TABLE saved_entries (
+  user_id INT NOT NULL,
+  entry_id INT NOT NULL,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (user_id, entry_id)
+);
+
 CREATE TABLE chinese_speech (
   id INT NOT NULL AUTO_INCREMENT,
   source TEXT NOT NULL,
+  source_hash CHAR(40) NOT NULL,
   filename CHAR(40) NOT NULL,
   voice TINYINT NOT NULL,
   created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
   updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-  PRIMARY KEY (id)
+  PRIMARY KEY (id),
+  UNIQUE KEY (source_hash)
 ) CHARACTER SET utf8;
 
 CREATE TABLE english_speech (
   id INT NOT NULL AUTO_INCREMENT,
   source TEXT NOT NULL,
+  source_hash CHAR(40) NOT NULL,
   filename CHAR(40) NOT NULL,
   voice TINYINT NOT NULL,
   created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
   updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-  PRIMARY KEY (id)
+  PRIMARY KEY (id),
+  UNIQUE KEY (source_hash)
 ) CHARACTER SET utf8;
 
 CREATE TABLE stories (
@@ -66,6 +76,8 @@ CREATE TABLE passages (
   description TEXT NOT NULL,
   story_id INT NOT NULL,
   data TEXT NOT NULL,
+  annotations MEDIUMTEXT,
+  annotations_version CHAR(40),
   new_words TEXT NOT NULL,
   notes TEXT NOT NULL,
   parts TEXT NOT NULL,
@@ -117,7 +129,17 @@ CREATE TABLE path_actions (
   part TINYINT NOT NULL,
   user_id INT NOT NULL,
   timestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-  PRIMARY KEY (id)
+  PRIMARY KEY (id),
+  INDEX path_actions_user_id (user_id)
+);
+
+CREATE TABLE user_path_progress (
+  user_id INT NOT NULL,
+  completed_passage_ids TEXT NOT NULL,
+  passage_parts TEXT NOT NULL,
+  action_count INT NOT NULL DEFAULT 0,
+  updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (user_id)
 );
 
 CREATE TABLE characters (
@@ -192,7 +214,37 @@ CREATE TABLE masteries (
   created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
   updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (id),
-  INDEX (user_id)
+  UNIQUE KEY (user_id, entry_id),
+  INDEX masteries_user_id_updated_at (user_id, updated_at)
+);
+
+CREATE TABLE mastery_versions (
+  user_id INT NOT NULL,
+  version INT NOT NULL,
+  PRIMARY KEY (user_id)
+);
+
+CREATE TABLE mastery_updates (
+  id INT NOT NULL AUTO_INCREMENT,
+  user_id INT NOT NULL,
+  chinese VARCHAR(255) NOT NULL,
+  delta INT NOT NULL,
+  attempts INT NOT NULL DEFAULT 0,
+  next_attempt_at DATETIME,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (id)
+);
+
+CREATE TABLE failed_mastery_updates (
+  id INT NOT NULL AUTO_INCREMENT,
+  user_id INT NOT NULL,
+  chinese VARCHAR(255) NOT NULL,
+  delta INT NOT NULL,
+  attempts INT NOT NULL,
+  error TEXT NOT NULL,
+  created_at DATETIME NOT NULL,
+  failed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (id)
 );
 
 CREATE TABLE game_results (
@@ -205,6 +257,37 @@ CREATE TABLE game_results (
   INDEX (user_id)
 );
 
+CREATE TABLE game_states (
+  id INT NOT NULL AUTO_INCREMENT,
+  user_id INT NOT NULL,
+  game TINYINT NOT NULL,
+  games_played INT NOT NULL,
+  PRIMARY KEY (id),
+  UNIQUE KEY (user_id, game)
+);
+
+CREATE TABLE question_states (
+  id INT NOT NULL AUTO_INCREMENT,
+  user_id INT NOT NULL,
+  game TINYINT NOT NULL,
+  question_id INT NOT NULL,
+  streak INT NOT NULL,
+  last_seen_game INT NOT NULL,
+  PRIMARY KEY (id),
+  UNIQUE KEY (user_id, game, question_id)
+);
+
+CREATE TABLE question_words (
+  id INT NOT NULL AUTO_INCREMENT,
+  question_table VARCHAR(32) NOT NULL,
+  question_id INT NOT NULL,
+  word VARCHAR(255) NOT NULL,
+  count INT NOT NULL,
+  PRIMARY KEY (id),
+  INDEX question_words_word (question_table, word),
+  INDEX question_words_question (question_table, question_id)
+) CHARACTER SET utf8 COLLATE utf8_bin;
+
 CREATE TABLE mad_minute_results (
   id INT NOT NULL AUTO_INCREMENT,
   user_id INT NOT NULL,
@@ -354,8 +437,8 @@ CREATE TABLE narrative_results (
 );
 
 -- $2b$12$vdNVmXFt/rJ1csHcYvW1SeYXwXb.PLTGgjy0MIAIkCbhcLu2g9E0q is a bcrypt hash of "this is my password"
-INSERT INTO users (username, email, password, roles, settings, pending_email, saved_entry_ids) VALUES ("admin", "admin@storytime.works", "$2b$12$vdNVmXFt/rJ1csHcYvW1SeYXwXb.PLTGgjy0MIAIkCbhcLu2g9E0q", "[1]", "{}", NULL, "[]");
-INSERT INTO users (username, email, password, roles, settings, pending_email, saved_entry_ids) VALUES ("user", "user@storytime.works", "$2b$12$vdNVmXFt/rJ1csHcYvW1SeYXwXb.PLTGgjy0MIAIkCbhcLu2g9E0q", "[]", "{}", NULL, "[]");
+INSERT INTO users (username, email, password, roles, settings, pending_email) VALUES ("admin", "admin@storytime.works", "$2b$12$vdNVmXFt/rJ1csHcYvW1SeYXwXb.PLTGgjy0MIAIkCbhcLu2g9E0q", "[1]", "{}", NULL);
+INSERT INTO users (username, email, password, roles, settings, pending_email) VALUES ("user", "user@storytime.works", "$2b$12$vdNVmXFt/rJ1csHcYvW1SeYXwXb.PLTGgjy0MIAIkCbhcLu2g9E0q", "[]", "{}", NULL);
 
 INSERT INTO entries (chinese, english, pinyin, translations, categories) VALUES ("我", "I, me", "wǒ", "[]", "[]");
 
@@ -0,0 +1,4 @@
+-- Segmented words and pinyin for each text component of a passage, computed
+-- when the passage's data is saved. Existing passages are annotated the first
+-- time they are read.
+ALTER TABLE passages ADD COLUMN annotations MEDIUMTEXT AFTER data;
@@ -0,0 +1,22 @@
+-- Each user's progress through each game, kept up to date when games are
+-- finished. States are rebuilt from past results the first time a user plays
+-- a game after this migration.
+CREATE TABLE game_states (
+  id INT NOT NULL AUTO_INCREMENT,
+  user_id INT NOT NULL,
+  game TINYINT NOT NULL,
+  games_played INT NOT NULL,
+  PRIMARY KEY (id),
+  UNIQUE KEY (user_id, game)
+);
+
+CREATE TABLE question_states (
+  id INT NOT NULL AUTO_INCREMENT,
+  user_id INT NOT NULL,
+  game TINYINT NOT NULL,
+  question_id INT NOT NULL,
+  streak INT NOT NULL,
+  last_seen_game INT NOT NULL,
+  PRIMARY KEY (id),
+  UNIQUE KEY (user_id, game, question_id)
+);
@@ -0,0 +1,12 @@
+-- Index of the segmented words in each game's questions. Fill it for existing
+-- questions with: FLASK_APP=run.py flask rebuild-word-index
+CREATE TABLE question_words (
+  id INT NOT NULL AUTO_INCREMENT,
+  question_table VARCHAR(32) NOT NULL,
+  question_id INT NOT NULL,
+  word VARCHAR(255) NOT NULL,
+  count INT NOT NULL,
+  PRIMARY KEY (id),
+  INDEX question_words_word (question_table, word),
+  INDEX question_words_question (question_table, question_id)
+) CHARACTER SET utf8 COLLATE utf8_bin;
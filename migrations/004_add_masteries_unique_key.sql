@@ -0,0 +1,11 @@
+-- Masteries are upserted on (user_id, entry_id), so each user can only have
+-- one mastery per entry. Keep the newest row of any duplicates first.
+DELETE older FROM masteries older
+  JOIN masteries newer
+    ON older.user_id = newer.user_id
+    AND older.entry_id = newer.entry_id
+    AND older.id < newer.id;
+
+ALTER TABLE masteries
+  ADD UNIQUE KEY user_id_entry_id (user_id, entry_id),
+  DROP INDEX user_id;
@@ -0,0 +1,10 @@
+-- Mastery updates queued by finished games, applied in batches by a worker
+-- thread in each app process.
+CREATE TABLE mastery_updates (
+  id INT NOT NULL AUTO_INCREMENT,
+  user_id INT NOT NULL,
+  chinese VARCHAR(255) NOT NULL,
+  delta INT NOT NULL,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (id)
+);
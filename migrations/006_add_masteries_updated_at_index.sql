@@ -0,0 +1,3 @@
+-- Lets clients fetch only the masteries that changed since they last synced.
+ALTER TABLE masteries
+  ADD INDEX masteries_user_id_updated_at (user_id, updated_at);
@@ -0,0 +1,11 @@
+-- Saved entries get a row each instead of a JSON list on users. Copy existing
+-- lists with: FLASK_APP=run.py flask migrate-saved-entries
+CREATE TABLE saved_entries (
+  user_id INT NOT NULL,
+  entry_id INT NOT NULL,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (user_id, entry_id)
+);
+
+-- New users are created without a list until the column is dropped
+ALTER TABLE users MODIFY saved_entry_ids TEXT NULL;
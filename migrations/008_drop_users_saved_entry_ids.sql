@@ -0,0 +1,2 @@
+-- Run once flask migrate-saved-entries has copied every list.
+ALTER TABLE users DROP COLUMN saved_entry_ids;
@@ -0,0 +1,9 @@
+-- Each user's progress through the path, kept up to date as path actions are
+-- saved. Progress is rebuilt from path_actions the first time it's needed.
+CREATE TABLE user_path_progress (
+  user_id INT NOT NULL,
+  completed_passage_ids TEXT NOT NULL,
+  passage_parts TEXT NOT NULL,
+  updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (user_id)
+);
@@ -0,0 +1,9 @@
+-- Recordings are found by a hash of their text and voice. Fill in hashes for
+-- existing recordings with: FLASK_APP=run.py flask backfill-speech-hashes
+ALTER TABLE chinese_speech
+  ADD COLUMN source_hash CHAR(40) NULL AFTER source,
+  ADD UNIQUE KEY (source_hash);
+
+ALTER TABLE english_speech
+  ADD COLUMN source_hash CHAR(40) NULL AFTER source,
+  ADD UNIQUE KEY (source_hash);
@@ -0,0 +1,3 @@
+-- Run once flask backfill-speech-hashes has hashed every recording.
+ALTER TABLE chinese_speech MODIFY source_hash CHAR(40) NOT NULL;
+ALTER TABLE english_speech MODIFY source_hash CHAR(40) NOT NULL;
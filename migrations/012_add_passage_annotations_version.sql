@@ -0,0 +1,4 @@
+-- The jieba dictionary and exceptions that each passage's annotations were made
+-- with. Passages are annotated again the next time they're read once either
+-- changes, or all at once with: FLASK_APP=run.py flask reannotate-passages
+ALTER TABLE passages ADD COLUMN annotations_version CHAR(40) AFTER annotations;
@@ -0,0 +1,15 @@
+-- Queued mastery updates are tried a limited number of times, then moved to
+-- failed_mastery_updates. Requires MySQL 8 for FOR UPDATE SKIP LOCKED.
+ALTER TABLE mastery_updates ADD COLUMN attempts INT NOT NULL DEFAULT 0 AFTER delta;
+
+CREATE TABLE failed_mastery_updates (
+  id INT NOT NULL AUTO_INCREMENT,
+  user_id INT NOT NULL,
+  chinese VARCHAR(255) NOT NULL,
+  delta INT NOT NULL,
+  attempts INT NOT NULL,
+  error TEXT NOT NULL,
+  created_at DATETIME NOT NULL,
+  failed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (id)
+);
@@ -0,0 +1,7 @@
+-- A counter for each user that goes up whenever their masteries change, so that
+-- cached masteries can be checked with a primary key lookup.
+CREATE TABLE mastery_versions (
+  user_id INT NOT NULL,
+  version INT NOT NULL,
+  PRIMARY KEY (user_id)
+);
@@ -0,0 +1,10 @@
+-- Progress keeps the number of path actions it was built from, so that actions
+-- saved without updating progress are noticed and progress is rebuilt.
+ALTER TABLE user_path_progress
+  ADD COLUMN action_count INT NOT NULL DEFAULT 0 AFTER passage_parts;
+
+ALTER TABLE path_actions
+  ADD INDEX path_actions_user_id (user_id);
+
+-- Rebuild every user's progress the next time it's needed
+UPDATE user_path_progress SET action_count = -1;
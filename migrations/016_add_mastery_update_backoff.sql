@@ -0,0 +1,4 @@
+-- Failed mastery updates wait longer after each attempt before they're tried
+-- again. Updates that were given up on can be queued again with:
+-- FLASK_APP=run.py flask requeue-failed-mastery-updates
+ALTER TABLE mastery_updates ADD COLUMN next_attempt_at DATETIME AFTER attempts;
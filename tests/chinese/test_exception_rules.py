@@ -0,0 +1,47 @@
+from app import configure_test_client
+from flask import Flask
+import pytest
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+class FakeException(object):
+    def __init__(self, word, replacement):
+        self.word = word
+        self.replacement = replacement
+
+def test_single_word_replacement(app):
+    from app.chinese import ExceptionRules
+
+    rules = ExceptionRules([FakeException("我们", "我,们")])
+    assert rules.apply(["我们", "是", "学生"]) == ["我", "们", "是", "学生"]
+
+def test_longest_sequence_wins(app):
+    from app.chinese import ExceptionRules
+
+    rules = ExceptionRules([
+        FakeException("学,生", "学生"),
+        FakeException("学,生,们", "学生们")
+    ])
+
+    assert rules.apply(["我", "是", "学", "生", "们"]) == ["我", "是", "学生们"]
+    assert rules.apply(["学", "生", "好"]) == ["学生", "好"]
+
+def test_sequences_match_split_words(app):
+    from app.chinese import ExceptionRules
+
+    # Sequences are matched after single words have been split up
+    rules = ExceptionRules([
+        FakeException("你们", "你,们"),
+        FakeException("们,好", "们好")
+    ])
+
+    assert rules.apply(["你们", "好"]) == ["你", "们好"]
+
+def test_partial_sequence_is_kept(app):
+    from app.chinese import ExceptionRules
+
+    rules = ExceptionRules([FakeException("学,生,们", "学生们")])
+    assert rules.apply(["学", "生"]) == ["学", "生"]
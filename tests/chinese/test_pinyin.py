@@ -0,0 +1,43 @@
+from app import configure_test_client
+from flask import Flask
+import pytest
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+def test_pinyin_many_matches_pinyin(app):
+    from app.chinese import pinyin, pinyin_many
+
+    texts = ["我是学生。", "你好！", "我是学生。"]
+    assert pinyin_many(texts) == [pinyin(text) for text in texts]
+
+def test_punctuation(app):
+    from app.chinese import pinyin_many
+
+    first, second = pinyin_many(["我是学生。", "你好吗？"])
+
+    # Sentences are capitalized and end with regular punctuation, without a
+    # space before it
+    assert first[0].isupper()
+    assert first.endswith(".") and not first.endswith(" .")
+    assert second.endswith("?") and not second.endswith(" ?")
+
+def test_words_are_converted_once(app):
+    from app.chinese import pinyin_many, word_pinyin
+
+    word_pinyin.cache_clear()
+    pinyin_many(["学生", "学生", "学生"])
+
+    # The repeated text is only converted once
+    assert word_pinyin.cache_info().misses == 1
+    assert word_pinyin.cache_info().hits == 0
+
+    pinyin_many(["学生"])
+    assert word_pinyin.cache_info().hits == 1
+
+def test_empty(app):
+    from app.chinese import pinyin_many
+
+    assert pinyin_many([]) == []
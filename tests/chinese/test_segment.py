@@ -0,0 +1,61 @@
+from app import configure_test_client
+from flask import Flask
+import pytest
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+def test_segment_returns_copy(app):
+    import app.chinese as chinese
+
+    with app.application.app_context():
+        words = chinese.segment("我是学生")
+        words.append("extra")
+
+        # Changing the returned list doesn't change the cached segmentation
+        assert "extra" not in chinese.segment("我是学生")
+
+def test_exception_added_outside_app(app):
+    import app.chinese as chinese
+
+    with app.application.app_context():
+        assert chinese.segment("我们") == ["我们"]
+
+        # Add an exception the way they're usually added, directly in MySQL
+        chinese.db.engine.execute("INSERT INTO jieba_exceptions (word, replacement) VALUES ('我们', '我,们')")
+
+        try:
+            # Pretend the last check was long enough ago
+            chinese.exceptions_checked_at = 0
+            assert chinese.segment("我们") == ["我", "们"]
+        finally:
+            chinese.db.engine.execute("DELETE FROM jieba_exceptions WHERE word = '我们'")
+            chinese.exceptions_checked_at = 0
+
+        assert chinese.segment("我们") == ["我们"]
+
+def test_version_is_set_before_checks_are_skipped(app, monkeypatch):
+    import app.chinese as chinese
+
+    # The dictionary was loaded when the app was configured
+    assert chinese.exceptions_version is not None
+
+    reload_exceptions = chinese.reload_exceptions
+    checked_during_reload = []
+
+    def reload_and_record(*args):
+        # Other threads shouldn't skip checking until the reload is finished
+        checked_during_reload.append(chinese.exceptions_checked_at)
+        reload_exceptions(*args)
+
+    monkeypatch.setattr(chinese, "reload_exceptions", reload_and_record)
+
+    with app.application.app_context():
+        chinese.exceptions_checked_at = 0
+        chinese.exceptions_version = None
+
+        assert len(chinese.segmentation_version()) == 40
+        assert checked_during_reload == [0]
+        assert chinese.exceptions_version is not None
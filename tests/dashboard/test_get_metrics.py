@@ -0,0 +1,32 @@
+from app import configure_test_client
+from flask import Flask, session
+import json, pytest
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+def test_get_metrics(app):
+    # Be an admin for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 1
+
+    res = app.get("/dashboard/metrics")
+    assert res.status_code == 200
+    data = json.loads(res.data)
+
+    # Ensure the jieba dictionary load time was measured at startup
+    assert data["startup"]["jieba_load_seconds"] >= 0
+
+def test_not_admin(app):
+    # Be a normal user for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 2
+
+    res = app.get("/dashboard/metrics")
+    assert res.status_code == 403
+    data = json.loads(res.data)
+
+    # Ensure the error is correct
+    assert data["code"] == 1001
@@ -0,0 +1,137 @@
+from app import configure_test_client
+from flask import Flask, session
+import json, pytest
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+def finish(app, correct_question_ids, wrong_question_ids):
+    data = {
+        "correct": len(correct_question_ids),
+        "correct_question_ids": correct_question_ids,
+        "correct_words": [],
+        "wrong": len(wrong_question_ids),
+        "wrong_question_ids": wrong_question_ids,
+        "wrong_words": []
+    }
+
+    return app.post("/games/copy_edit/finish", data=json.dumps(data), content_type="application/json")
+
+def load_states(app, user_id):
+    from app import db
+    from app.mod_games import Game, GameState, QuestionState
+
+    with app.application.app_context():
+        game_state = GameState.query.filter_by(user_id=user_id, game=Game.COPY_EDIT.value).first()
+        question_states = QuestionState.query.filter_by(user_id=user_id, game=Game.COPY_EDIT.value).all()
+
+        return game_state.games_played, {x.question_id: (x.streak, x.last_seen_game) for x in question_states}
+
+def test_finish_game_updates_states(app):
+    # Be an admin for this test, who hasn't played copy edit in other tests
+    with app.session_transaction() as session:
+        session["user_id"] = 1
+
+    res = finish(app, [9001, 9002], [9003])
+    assert res.status_code == 200
+
+    games_played, states = load_states(app, 1)
+    assert states[9001] == (1, games_played)
+    assert states[9003] == (-1, games_played)
+
+    # Answering a question correctly again extends its streak, and answering it
+    # incorrectly resets it
+    res = finish(app, [9001, 9003], [9002])
+    assert res.status_code == 200
+
+    next_games_played, states = load_states(app, 1)
+    assert next_games_played == games_played + 1
+    assert states[9001] == (2, next_games_played)
+    assert states[9002] == (-1, next_games_played)
+    assert states[9003] == (1, next_games_played)
+
+def test_missing_parameters(app):
+    # Be a normal user for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 2
+
+    res = app.post("/games/copy_edit/finish", data=json.dumps({}), content_type="application/json")
+    assert res.status_code == 400
+    data = json.loads(res.data)
+
+    # Ensure the error is correct
+    assert data["code"] == 1404
+
+def test_rebuilt_states_count_game_once(app):
+    from app import db
+    from app.mod_games import Game
+
+    # Be a normal user for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 2
+
+    # Forget the user's states, as if they were saved before states were kept
+    with app.application.app_context():
+        db.engine.execute("DELETE FROM game_states WHERE user_id = 2 AND game = %s", Game.COPY_EDIT.value)
+        db.engine.execute("DELETE FROM question_states WHERE user_id = 2 AND game = %s", Game.COPY_EDIT.value)
+
+    res = finish(app, [9001], [])
+    assert res.status_code == 200
+
+    # States are rebuilt before this game's result is saved, so the game is
+    # only counted once
+    with app.application.app_context():
+        results = Game.COPY_EDIT.question.result_type.query.filter_by(user_id=2).count()
+
+    games_played, states = load_states(app, 2)
+    assert games_played == results
+    assert states[9001][1] == games_played
+
+def test_failed_finish_queues_nothing(app, monkeypatch):
+    from app import db
+    from app.mod_games import Game
+    import app.mod_games.controllers as controllers
+    import uuid
+
+    # Let the exception reach the test, ending the request's transaction
+    app.application.config["PRESERVE_CONTEXT_ON_EXCEPTION"] = False
+
+    # Be a normal user for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 2
+
+    update_masteries = controllers.update_masteries
+
+    def update_masteries_then_fail(*args):
+        update_masteries(*args)
+        raise RuntimeError("Result couldn't be saved")
+
+    monkeypatch.setattr(controllers, "update_masteries", update_masteries_then_fail)
+
+    def count_results():
+        with app.application.app_context():
+            return Game.COPY_EDIT.question.result_type.query.filter_by(user_id=2).count()
+
+    results = count_results()
+    word = str(uuid.uuid4())[0:8]
+
+    data = {
+        "correct": 1,
+        "correct_question_ids": [9001],
+        "correct_words": [word],
+        "wrong": 0,
+        "wrong_question_ids": [],
+        "wrong_words": []
+    }
+
+    with pytest.raises(RuntimeError):
+        app.post("/games/copy_edit/finish", data=json.dumps(data), content_type="application/json")
+
+    # Ensure the mastery update was rolled back along with the result
+    with app.application.app_context():
+        queued = db.engine.execute("SELECT COUNT(*) FROM mastery_updates WHERE chinese = %s", word).scalar()
+
+    assert queued == 0
+    assert count_results() == results
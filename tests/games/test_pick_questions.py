@@ -0,0 +1,143 @@
+from app import configure_test_client
+from flask import Flask, session
+import json, math, pytest
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+def baseline_pick(difficulties, targets):
+    """The binary search that play_game used before questions were picked with
+    numpy, returning the difficulties of the questions it picks."""
+
+    questions_data = sorted(difficulties)
+    picked = []
+
+    for difficulty in targets:
+        if len(questions_data) == 0:
+            break
+
+        first = 0
+        last = len(questions_data) - 1
+        found = False
+
+        while first <= last and not found:
+            midpoint = (first + last) // 2
+
+            if questions_data[midpoint] == difficulty:
+                picked.append(questions_data[midpoint])
+                found = True
+                del questions_data[midpoint]
+            elif difficulty < questions_data[midpoint]:
+                last = midpoint - 1
+            else:
+                first = midpoint + 1
+
+        if not found:
+            if first == len(questions_data):
+                # The baseline raised IndexError here, when every question left
+                # was easier than the target
+                break
+
+            picked.append(questions_data[first])
+            del questions_data[first]
+
+    return picked
+
+def test_picks_match_baseline(app):
+    import numpy as np
+    from app.mod_games.question import pick_by_difficulty
+
+    np.random.seed(1234)
+
+    for _ in range(200):
+        # Question difficulties are sums of word scores, so many are equal
+        difficulties = np.random.randint(0, 40, np.random.randint(1, 30)).astype(np.float64)
+        targets = np.floor(np.random.normal(17.5, 5, 10))
+
+        positions = pick_by_difficulty(difficulties, targets)
+        expected = baseline_pick(difficulties.tolist(), targets.tolist())
+
+        # Questions with the same difficulty are interchangeable, so compare the
+        # difficulties that were picked, up to where the baseline gave up
+        assert len(set(positions)) == len(positions)
+        assert [difficulties[x] for x in positions[:len(expected)]] == expected
+
+        if len(expected) < min(len(targets), len(difficulties)):
+            # Ensure the hardest question left was picked instead
+            left = [x for (idx, x) in enumerate(difficulties) if idx not in positions[:len(expected)]]
+            assert difficulties[positions[len(expected)]] == max(left)
+
+def test_picks_hardest_below_target(app):
+    import numpy as np
+    from app.mod_games.question import pick_by_difficulty
+
+    difficulties = np.array([5.0, 30.0, 10.0, 20.0])
+
+    # Nothing is at or above 25 once 30 is picked, so the hardest questions
+    # below it are picked next
+    assert pick_by_difficulty(difficulties, [25, 25, 25, 25, 25]) == [1, 3, 2, 0]
+
+    # Equal difficulties are picked in order, and exact matches come first
+    difficulties = np.array([10.0, 20.0, 10.0, 15.0])
+    assert pick_by_difficulty(difficulties, [10, 10, 10]) == [0, 2, 3]
+
+def test_positions_of(app):
+    import numpy as np
+    from app.mod_games.question import positions_of
+
+    ids = np.array([42, 7, 19, 3])
+    values = np.array([3, 42, 42, 19, 7])
+
+    assert positions_of(ids, values).tolist() == [3, 0, 0, 2, 1]
+
+def test_history_questions(app):
+    from app import db
+    from app.mod_games import Game
+    from app.mod_games.mod_copy_edit import CopyEditQuestion
+
+    with app.application.app_context():
+        user_id = db.engine.execute(
+            "INSERT INTO users (username, email, password, roles, settings) VALUES ('history', 'history@storytime.works', '', '[]', '{}')"
+        ).lastrowid
+
+        questions = [CopyEditQuestion("{我}是老师。", "explanation", "我是老师。") for _ in range(3)]
+        db.session.add_all(questions)
+        db.session.commit()
+
+        (wrong_id, recent_id, due_id) = [question.id for question in questions]
+
+        # Three games have been played. The first question was answered wrong,
+        # the second is on a streak of two but was seen last game, and the third
+        # is on a streak of one and was seen three games ago
+        db.engine.execute("INSERT INTO game_states (user_id, game, games_played) VALUES (%s, %s, 3)", user_id, Game.COPY_EDIT.value)
+
+        for (question_id, streak, last_seen_game) in [(wrong_id, -1, 3), (recent_id, 2, 3), (due_id, 1, 1)]:
+            db.engine.execute(
+                "INSERT INTO question_states (user_id, game, question_id, streak, last_seen_game) VALUES (%s, %s, %s, %s, %s)",
+                user_id, Game.COPY_EDIT.value, question_id, streak, last_seen_game
+            )
+
+    with app.session_transaction() as session:
+        session["user_id"] = user_id
+
+    try:
+        res = app.get("/games/copy_edit/play")
+        assert res.status_code == 200
+        data = {x["id"]: x for x in json.loads(res.data)}
+
+        # Ensure questions are shown again once games ago is at least the
+        # square of their streak, and never picked at random before then
+        assert wrong_id in data
+        assert due_id in data
+        assert recent_id not in data
+
+        # Questions from the user's history aren't scored
+        assert "difficulty" not in data[wrong_id]
+        assert "difficulty" not in data[due_id]
+    finally:
+        with app.application.app_context():
+            db.engine.execute("DELETE FROM question_states WHERE user_id = %s", user_id)
+            db.engine.execute("DELETE FROM game_states WHERE user_id = %s", user_id)
+            db.engine.execute("DELETE FROM users WHERE id = %s", user_id)
@@ -0,0 +1,95 @@
+from app import configure_test_client
+from flask import Flask, session
+import json, pytest
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+def add_unindexed_question(app):
+    from app import db
+    from app.mod_games.mod_copy_edit import CopyEditQuestion
+
+    # Save a question without indexing its words, like questions saved before
+    # the word index existed
+    with app.application.app_context():
+        question = CopyEditQuestion("{我}是老师。", "explanation", "我是老师。")
+        db.session.add(question)
+        db.session.commit()
+
+        return question.id
+
+def indexed_words(app, question_id):
+    from app import db
+    from app.mod_games import QuestionWord
+
+    with app.application.app_context():
+        rows = db.session.query(QuestionWord.word).filter_by(question_table="copy_edit_questions", question_id=question_id).all()
+        return set([row[0] for row in rows])
+
+def test_play_game_indexes_missing_words(app):
+    import app.mod_games.question as question
+
+    question_id = add_unindexed_question(app)
+    question.indexed_tables.discard("copy_edit_questions")
+
+    # Be a normal user for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 2
+
+    res = app.get("/games/copy_edit/play")
+    assert res.status_code == 200
+
+    # Ensure the question was added to the word index
+    assert "老师" in indexed_words(app, question_id)
+
+def test_unindexed_questions_are_scored(app):
+    import app.mod_games.question as question
+
+    # Pretend this process already indexed every question, so the new one is
+    # only missing from the index
+    question.indexed_tables.add("copy_edit_questions")
+    question_id = add_unindexed_question(app)
+
+    # Be a normal user for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 2
+
+    res = app.get("/games/copy_edit/play")
+    assert res.status_code == 200
+    data = json.loads(res.data)
+
+    # Ensure the question's words counted towards its difficulty
+    questions = [x for x in data if x["id"] == question_id]
+    assert len(questions) == 1
+    assert questions[0]["difficulty"] > 0
+
+def test_requests_dont_wait_for_indexing(app):
+    import app.mod_games.question as question
+    from app.mod_games.mod_copy_edit import CopyEditQuestion
+
+    question_id = add_unindexed_question(app)
+    question.indexed_tables.discard("copy_edit_questions")
+
+    # Another request is already indexing this table
+    with question.indexed_tables_lock:
+        table_lock = question.indexed_table_locks.setdefault("copy_edit_questions", question.threading.Lock())
+
+    table_lock.acquire()
+
+    try:
+        # Ensure this request doesn't wait for it, or index the table itself
+        with app.application.app_context():
+            CopyEditQuestion.ensure_word_index()
+
+        assert "copy_edit_questions" not in question.indexed_tables
+        assert indexed_words(app, question_id) == set()
+    finally:
+        table_lock.release()
+
+    with app.application.app_context():
+        CopyEditQuestion.ensure_word_index()
+
+    assert "copy_edit_questions" in question.indexed_tables
+    assert "老师" in indexed_words(app, question_id)
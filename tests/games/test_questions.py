@@ -0,0 +1,129 @@
+from app import configure_test_client
+from flask import Flask, session
+import json, pytest
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+def create_question(app):
+    data = {
+        "prompt": "{我}是学生。",
+        "explanation": "first",
+        "correct_sentence": "我是学生。"
+    }
+
+    res = app.post("/games/copy_edit/questions", data=json.dumps(data), content_type="application/json")
+    assert res.status_code == 200
+
+    return json.loads(res.data)["id"]
+
+def test_get_question_after_update(app):
+    # Be an admin for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 1
+
+    question_id = create_question(app)
+
+    # Serialize the question so that it's cached
+    res = app.get("/games/copy_edit/questions/%d" % question_id)
+    assert res.status_code == 200
+    assert json.loads(res.data)["explanation"] == "first"
+
+    # Update the question within the same second that it was cached
+    res = app.put("/games/copy_edit/questions/%d" % question_id, data=json.dumps({"explanation": "second"}), content_type="application/json")
+    assert res.status_code == 200
+    assert json.loads(res.data)["explanation"] == "second"
+
+    # Ensure the cached data isn't returned anymore
+    res = app.get("/games/copy_edit/questions/%d" % question_id)
+    assert res.status_code == 200
+    assert json.loads(res.data)["explanation"] == "second"
+
+def test_cached_serialize_returns_copy(app):
+    from app.mod_games.mod_copy_edit import CopyEditQuestion
+
+    # Be an admin for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 1
+
+    question_id = create_question(app)
+
+    with app.application.app_context():
+        question = CopyEditQuestion.query.get(question_id)
+
+        data = question.cached_serialize()
+        data["difficulty"] = 10
+
+        # Changing the returned data doesn't change the cached data
+        assert "difficulty" not in question.cached_serialize()
+
+def test_get_nonexistant_question(app):
+    # Be an admin for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 1
+
+    res = app.get("/games/copy_edit/questions/12340923")
+    assert res.status_code == 404
+    data = json.loads(res.data)
+
+    # Ensure the error is correct
+    assert data["code"] == 1401
+
+def test_cached_question_follows_exceptions(app):
+    import app.chinese as chinese
+    from app import db
+
+    # Be an admin for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 1
+
+    question_id = create_question(app)
+
+    # Serialize the question so that it's cached
+    res = app.get("/games/copy_edit/questions/%d" % question_id)
+    assert res.status_code == 200
+    assert "学生" in json.loads(res.data)["words"]
+
+    # Add an exception the way another process would
+    with app.application.app_context():
+        db.engine.execute("INSERT INTO jieba_exceptions (word, replacement) VALUES ('学生', '学,生')")
+
+    try:
+        # Pretend the last check was long enough ago
+        chinese.exceptions_checked_at = 0
+
+        res = app.get("/games/copy_edit/questions/%d" % question_id)
+        assert res.status_code == 200
+        words = json.loads(res.data)["words"]
+        assert "学生" not in words
+        assert "学" in words
+    finally:
+        with app.application.app_context():
+            db.engine.execute("DELETE FROM jieba_exceptions WHERE word = '学生'")
+
+        chinese.exceptions_checked_at = 0
+
+def test_entries_changed_elsewhere_change_version(app):
+    import app.mod_games.question as question
+    from app import db
+
+    with app.application.app_context():
+        question.entries_checked_at = 0
+        version = question.serialization_version()
+
+        # Add an entry the way another process would
+        entry_id = db.engine.execute(
+            "INSERT INTO entries (chinese, english, pinyin, translations, categories) VALUES ('学生', 'student', 'xuésheng', '[]', '[]')"
+        ).lastrowid
+
+        try:
+            # The change is only seen once the interval has passed
+            assert question.serialization_version() == version
+
+            question.entries_checked_at = 0
+            assert question.serialization_version() != version
+        finally:
+            db.engine.execute("DELETE FROM entries WHERE id = %s", entry_id)
+            question.entries_checked_at = 0
@@ -0,0 +1,128 @@
+from app import configure_test_client
+from flask import Flask
+import pytest
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+class FakeSink(object):
+    """Keeps every batch of logs it's given in memory."""
+
+    name = "fake"
+
+    def __init__(self):
+        self.batches = []
+
+    def write(self, records):
+        self.batches.append(list(records))
+
+def test_logs_are_written_in_batches(app):
+    from app.log import LogWriter
+
+    sink = FakeSink()
+    writer = LogWriter([sink], batch_size=2, interval=0.1)
+
+    for status_code in [200, 201, 204]:
+        writer.write("127.0.0.1", "GET", "/stories", status_code, 1)
+
+    writer.flush(writer.drain(10))
+
+    assert [len(batch) for batch in sink.batches] == [3]
+    assert [record["status_code"] for record in sink.batches[0]] == [200, 201, 204]
+    assert sink.batches[0][0]["timestamp"] is not None
+
+def test_stop_writes_remaining_logs(app):
+    from app.log import LogWriter
+
+    sink = FakeSink()
+    writer = LogWriter([sink], interval=0.1)
+    writer.start()
+
+    writer.write("127.0.0.1", "GET", "/stories", 200)
+    writer.stop()
+
+    assert sum([len(batch) for batch in sink.batches]) == 1
+    assert not writer.thread.is_alive()
+
+def test_full_buffer_drops_logs(app):
+    from app.log import LogWriter
+
+    writer = LogWriter([FakeSink()], max_size=2)
+
+    for _ in range(5):
+        writer.write("127.0.0.1", "GET", "/stories", 200)
+
+    assert writer.stats["dropped"] == 3
+    assert writer.buffer.qsize() == 2
+
+class FailingSink(object):
+    name = "failing"
+
+    def write(self, records):
+        raise IOError("disk full")
+
+def test_failed_writes_are_not_counted(app):
+    from app.log import LogWriter
+
+    sink = FakeSink()
+    writer = LogWriter([sink, FailingSink()])
+    writer.write("127.0.0.1", "GET", "/stories", 200)
+    writer.flush(writer.drain(10))
+
+    # A failing sink doesn't stop logs from being written to the others
+    assert len(sink.batches) == 1
+    assert writer.stats["written"] == {"fake": 1, "failing": 0}
+    assert writer.stats["failed"] == {"fake": 0, "failing": 1}
+
+def test_sampling(app):
+    from app.log import LogWriter
+
+    writer = LogWriter([FakeSink()], {"/games/*/play": 0, "/speech/*": 1})
+
+    writer.write("127.0.0.1", "GET", "/games/scribe/play", 200)
+    writer.write("127.0.0.1", "GET", "/speech/chinese", 200)
+    writer.write("127.0.0.1", "GET", "/stories", 200)
+
+    assert writer.stats["sampled_out"] == 1
+    assert writer.buffer.qsize() == 2
+
+def test_file_sink_uses_one_file_per_process(app, tmpdir):
+    from app.log import FileLogSink
+    from datetime import datetime
+    import json, os
+
+    sink = FileLogSink(str(tmpdir.join("requests.log")), 1024 * 1024, 2)
+    sink.write([{"ip": "127.0.0.1", "method": "GET", "path": "/stories", "status_code": 200, "user_id": None, "timestamp": datetime(2018, 1, 1)}])
+
+    path = tmpdir.join("requests.%d.log" % os.getpid())
+    assert path.exists()
+    assert json.loads(path.read().strip())["path"] == "/stories"
+
+def test_forked_process_starts_its_own_thread(app, monkeypatch):
+    from app.log import LogWriter
+    import os
+
+    sink = FakeSink()
+    writer = LogWriter([sink], interval=0.1)
+    writer.start()
+    parent_thread = writer.thread
+
+    # Starting again in the same process doesn't start another thread
+    writer.start()
+    assert writer.thread is parent_thread
+
+    # Pretend this is a worker process forked from the one that started it
+    parent_pid = os.getpid()
+    monkeypatch.setattr(os, "getpid", lambda: parent_pid + 1)
+
+    writer.write("127.0.0.1", "GET", "/stories", 200)
+
+    assert writer.pid == parent_pid + 1
+    assert writer.thread is not parent_thread
+    assert writer.thread.is_alive()
+
+    writer.stop()
+
+    assert sum([len(batch) for batch in sink.batches]) == 1
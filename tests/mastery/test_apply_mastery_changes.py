@@ -0,0 +1,42 @@
+from app import configure_test_client
+from collections import Counter
+from flask import Flask
+import pytest
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+def load_mastery(user_id, entry_id):
+    from app import db
+    from app.mod_mastery import Mastery
+
+    return db.session.query(Mastery.mastery).filter_by(user_id=user_id, entry_id=entry_id).scalar()
+
+def test_masteries_are_clamped(app):
+    from app import db
+    from app.mod_mastery import apply_mastery_changes
+
+    with app.application.app_context():
+        # The entry with id 1 is 我
+        assert apply_mastery_changes(1, Counter({"我": 25})) == [(1, 25)]
+        db.session.commit()
+        assert load_mastery(1, 1) == 10
+
+        apply_mastery_changes(1, Counter({"我": -25}))
+        db.session.commit()
+        assert load_mastery(1, 1) == 0
+
+        apply_mastery_changes(1, Counter({"我": 3}))
+        db.session.commit()
+        assert load_mastery(1, 1) == 3
+
+def test_words_without_entries_are_skipped(app):
+    from app import db
+    from app.mod_mastery import apply_mastery_changes
+
+    with app.application.app_context():
+        assert apply_mastery_changes(1, Counter({"不是词": 1})) == []
+        assert apply_mastery_changes(1, Counter()) == []
+        db.session.rollback()
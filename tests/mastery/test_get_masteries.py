@@ -0,0 +1,99 @@
+from app import configure_test_client
+from flask import Flask, session
+import json, pytest
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+# Masteries of entries that only this test uses, so that other tests don't
+# change them
+ENTRY_IDS = [100001, 100002, 100003, 100004, 100005]
+
+def add_masteries(app):
+    from app import db
+
+    with app.application.app_context():
+        for entry_id in ENTRY_IDS:
+            db.engine.execute(
+                "INSERT IGNORE INTO masteries (user_id, entry_id, mastery, updated_at) VALUES (1, %s, 5, '2018-01-01 12:00:00')",
+                (entry_id,)
+            )
+
+        # Make the last mastery newer than the others
+        db.engine.execute("UPDATE masteries SET updated_at = '2018-06-01 12:00:00' WHERE user_id = 1 AND entry_id = %s", (ENTRY_IDS[-1],))
+
+def get_page(app, **params):
+    query = "&".join(["%s=%s" % (key, value) for (key, value) in params.items()])
+
+    res = app.get("/mastery?" + query)
+    assert res.status_code == 200
+
+    return json.loads(res.data)
+
+def test_pagination(app):
+    add_masteries(app)
+
+    # Be an admin for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 1
+
+    entry_ids = []
+    cursor = 100000
+
+    # Page through two masteries at a time, starting right before the masteries
+    # added for this test
+    while cursor is not None:
+        data = get_page(app, cursor=cursor, limit=2)
+        assert len(data["masteries"]) <= 2
+
+        entry_ids.extend([mastery["entry_id"] for mastery in data["masteries"]])
+        cursor = data["next_cursor"]
+
+    assert entry_ids == ENTRY_IDS
+
+def test_updated_since(app):
+    add_masteries(app)
+
+    # Be an admin for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 1
+
+    data = get_page(app, cursor=100000, updated_since="2018-03-01T00:00:00")
+    assert [mastery["entry_id"] for mastery in data["masteries"]] == ENTRY_IDS[-1:]
+
+    # Offsets are converted to UTC, so this is 2018-06-01 12:30 UTC
+    data = get_page(app, cursor=100000, updated_since="2018-06-01T20:30:00%2B08:00")
+    assert data["masteries"] == []
+
+    data = get_page(app, cursor=100000, updated_since="2018-06-01T11:30:00Z")
+    assert [mastery["entry_id"] for mastery in data["masteries"]] == ENTRY_IDS[-1:]
+
+@pytest.mark.parametrize("query", [
+    "limit=0",
+    "limit=100000",
+    "limit=ten",
+    "cursor=first",
+    "updated_since=yesterday",
+    "updated_since=2018-06-01T12:00:00%2B99:00"
+])
+def test_invalid_parameters(app, query):
+    # Be a normal user for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 2
+
+    res = app.get("/mastery?" + query)
+    assert res.status_code == 400
+    data = json.loads(res.data)
+
+    # Ensure the error is correct
+    assert data["code"] == 1801
+
+def test_not_authenticated(app):
+    res = app.get("/mastery")
+    assert res.status_code == 401
+    data = json.loads(res.data)
+
+    # Ensure the error is correct
+    assert data["code"] == 1000
@@ -0,0 +1,67 @@
+from app import configure_test_client
+from collections import Counter
+from flask import Flask
+import pytest
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+def mastery_of(vector, entry_id):
+    masteries, found = vector.lookup([entry_id])
+    return int(masteries[0]) if found[0] else None
+
+def test_changes_from_other_processes_are_seen(app):
+    from app import db
+    from app.mod_mastery import apply_mastery_changes, get_masteries, increment_mastery_version
+
+    with app.application.app_context():
+        # Set a known mastery and cache it
+        apply_mastery_changes(2, Counter({"我": -20}))
+        increment_mastery_version(2)
+        db.session.commit()
+
+        assert mastery_of(get_masteries(2), 1) == 0
+
+        # Change the mastery without touching this process's cache, the way
+        # a worker in another process would
+        apply_mastery_changes(2, Counter({"我": 4}))
+        increment_mastery_version(2)
+        db.session.commit()
+
+        assert mastery_of(get_masteries(2), 1) == 4
+
+def test_worker_writes_through(app):
+    from app import db
+    from app.mod_mastery import get_masteries, process_mastery_updates, update_masteries
+    import app.mod_mastery.cache as cache
+
+    with app.application.app_context():
+        while process_mastery_updates() > 0:
+            pass
+
+        before = mastery_of(get_masteries(2), 1) or 0
+        version = cache.mastery_cache.get(2).version
+
+        update_masteries(2, ["我"], [])
+        db.session.commit()
+        process_mastery_updates()
+
+        # The cached vector was updated in place of being loaded again
+        assert cache.mastery_cache.get(2).version == version + 1
+        assert mastery_of(cache.mastery_cache.get(2), 1) == min(10, before + 1)
+        assert mastery_of(get_masteries(2), 1) == min(10, before + 1)
+
+def test_lookup_without_masteries(app):
+    from app.mod_mastery.cache import MasteryVector
+
+    vector = MasteryVector([], [], 0)
+    masteries, found = vector.lookup([1, -1])
+
+    assert not found.any()
+
+    vector = vector.updated([5, 3], [12, -2], 1)
+    assert mastery_of(vector, 5) == 10
+    assert mastery_of(vector, 3) == 0
+    assert mastery_of(vector, 4) is None
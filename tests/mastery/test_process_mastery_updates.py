@@ -0,0 +1,133 @@
+from app import configure_test_client
+from flask import Flask
+from sqlalchemy.exc import SQLAlchemyError
+import pytest
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+def queue_updates(user_id, correct_words, wrong_words):
+    from app import db
+    from app.mod_mastery import update_masteries
+
+    update_masteries(user_id, correct_words, wrong_words)
+    db.session.commit()
+
+def load_mastery(user_id, entry_id):
+    from app import db
+    from app.mod_mastery import Mastery
+
+    return db.session.query(Mastery.mastery).filter_by(user_id=user_id, entry_id=entry_id).scalar()
+
+def process_all():
+    from app.mod_mastery import process_mastery_updates
+
+    while process_mastery_updates() > 0:
+        pass
+
+def test_updates_are_combined_and_applied(app):
+    from app.mod_mastery import MasteryUpdate
+
+    with app.application.app_context():
+        process_all()
+        before = load_mastery(1, 1) or 0
+
+        # The entry with id 1 is 我
+        queue_updates(1, ["我", "我", "我"], ["我"])
+        process_all()
+
+        assert load_mastery(1, 1) == min(10, before + 2)
+        assert MasteryUpdate.query.count() == 0
+
+def test_failing_updates_are_set_aside(app, monkeypatch):
+    import app.mod_mastery as mastery
+    from app.mod_mastery import FailedMasteryUpdate, MasteryUpdate
+
+    apply_mastery_changes = mastery.apply_mastery_changes
+
+    def fail_for_admin(user_id, changes):
+        if user_id == 1:
+            raise SQLAlchemyError("broken")
+
+        return apply_mastery_changes(user_id, changes)
+
+    with app.application.app_context():
+        process_all()
+        failed_before = FailedMasteryUpdate.query.count()
+        before = load_mastery(2, 1) or 0
+
+        monkeypatch.setattr(mastery, "apply_mastery_changes", fail_for_admin)
+
+        # Try failed updates again right away
+        monkeypatch.setattr(mastery, "MASTERY_UPDATE_RETRY_DELAY", 0)
+
+        queue_updates(1, ["我"], [])
+        queue_updates(2, ["我"], [])
+        process_all()
+
+        # The other user's updates were applied anyway
+        assert load_mastery(2, 1) == min(10, before + 1)
+
+        # The failing update was tried a few times, then moved out of the queue
+        assert MasteryUpdate.query.count() == 0
+
+        failed = FailedMasteryUpdate.query.order_by(FailedMasteryUpdate.id.desc()).all()
+        assert len(failed) == failed_before + 1
+        assert failed[0].user_id == 1
+        assert failed[0].attempts == mastery.MAX_MASTERY_UPDATE_ATTEMPTS
+
+def test_failed_updates_wait_before_trying_again(app, monkeypatch):
+    import app.mod_mastery as mastery
+    from app import db
+    from app.mod_mastery import MasteryUpdate
+
+    def fail(user_id, changes):
+        raise SQLAlchemyError("lock wait timeout")
+
+    with app.application.app_context():
+        process_all()
+        monkeypatch.setattr(mastery, "apply_mastery_changes", fail)
+
+        queue_updates(1, ["我"], [])
+
+        try:
+            assert mastery.process_mastery_updates() == 1
+
+            # The update stays queued, but isn't tried again until later
+            update = MasteryUpdate.query.filter_by(user_id=1).one()
+            assert update.attempts == 1
+            assert update.next_attempt_at is not None
+
+            # Updates queued for the same user afterwards wait too, so that the
+            # user's updates are applied in order
+            queue_updates(1, ["我"], [])
+            assert mastery.process_mastery_updates() == 0
+            assert MasteryUpdate.query.filter_by(user_id=1).count() == 2
+        finally:
+            db.session.rollback()
+            MasteryUpdate.query.filter_by(user_id=1).delete()
+            db.session.commit()
+
+def test_requeue_failed_updates(app):
+    from app import db
+    from app.mod_mastery import FailedMasteryUpdate, MasteryUpdate, requeue_failed_updates
+
+    with app.application.app_context():
+        process_all()
+        before = load_mastery(2, 1) or 0
+
+        update = MasteryUpdate(2, "我", 1)
+        update.attempts = 8
+        update.created_at = db.func.current_timestamp()
+        db.session.add(FailedMasteryUpdate(update, "broken"))
+        db.session.commit()
+
+        # Every failed update goes back in the queue, to be tried from the start
+        assert requeue_failed_updates() >= 1
+        assert FailedMasteryUpdate.query.count() == 0
+        assert MasteryUpdate.query.filter_by(user_id=2, attempts=0).count() >= 1
+
+        process_all()
+        assert load_mastery(2, 1) >= min(10, before + 1)
@@ -32,3 +32,107 @@ def test_get_nonexistant_passage(app):
 
     # Ensure the error is correct
     assert data["code"] == 1503
+
+def test_annotations_follow_exceptions(app):
+    import app.chinese as chinese
+
+    # Be an admin for this test, who can edit passages
+    with app.session_transaction() as session:
+        session["user_id"] = 1
+
+    data = {
+        "data": {
+            "components": [{
+                "character": {
+                    "chinese_name": "小雪",
+                    "english_name": "Sarah",
+                    "gender": 0,
+                    "id": 1
+                },
+                "text": "我们",
+                "type": "text"
+            }]
+        }
+    }
+
+    res = app.put("/passages/1", data=json.dumps(data), content_type="application/json")
+    assert res.status_code == 200
+    data = json.loads(res.data)
+
+    assert [word["chinese"] for word in data["data"]["components"][0]["words"]] == ["我们"]
+
+    # Add an exception directly in MySQL, which existing annotations don't use
+    with app.application.app_context():
+        chinese.db.engine.execute("INSERT INTO jieba_exceptions (word, replacement) VALUES ('我们', '我,们')")
+
+    try:
+        # Pretend the exceptions were last checked long enough ago
+        chinese.exceptions_checked_at = 0
+
+        res = app.get("/passages/1")
+        assert res.status_code == 200
+        data = json.loads(res.data)
+
+        # Ensure the passage was annotated again with the new exception
+        assert [word["chinese"] for word in data["data"]["components"][0]["words"]] == ["我", "们"]
+    finally:
+        with app.application.app_context():
+            chinese.db.engine.execute("DELETE FROM jieba_exceptions WHERE word = '我们'")
+
+        chinese.exceptions_checked_at = 0
+
+def test_passage_created_elsewhere_is_locked(app):
+    from app import db
+
+    # Be a normal user for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 2
+
+    # Load the catalog before the new passage exists
+    res = app.get("/passages/1")
+    assert res.status_code == 200
+
+    # Add a story and passage the way another process would, without this
+    # process's catalog knowing about them
+    with app.application.app_context():
+        story_id = db.engine.execute("INSERT INTO stories (name, description, passage_ids, position) VALUES ('Later', 'Later', '[]', 1000)").lastrowid
+        passage_id = db.engine.execute(
+            "INSERT INTO passages (name, description, story_id, data, new_words, notes, parts) VALUES ('Later', 'Later', %s, %s, '[]', '', '[]')",
+            story_id, '{"components": []}'
+        ).lastrowid
+        db.engine.execute("UPDATE stories SET passage_ids = %s WHERE id = %s", json.dumps([passage_id]), story_id)
+
+    try:
+        # Ensure the passage is locked, since passage 1 hasn't been completed
+        res = app.get("/passages/%d" % passage_id)
+        assert res.status_code == 403
+        data = json.loads(res.data)
+        assert data["code"] == 1506
+    finally:
+        with app.application.app_context():
+            db.engine.execute("DELETE FROM passages WHERE id = %s", passage_id)
+            db.engine.execute("DELETE FROM stories WHERE id = %s", story_id)
+
+def test_passage_in_no_story_is_served(app):
+    from app import db
+
+    # Be a normal user for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 2
+
+    # Add a passage that isn't in its story's list of passages
+    with app.application.app_context():
+        passage_id = db.engine.execute(
+            "INSERT INTO passages (name, description, story_id, data, new_words, notes, parts) VALUES ('Loose', 'Loose', 1, %s, '[]', '', '[]')",
+            '{"components": []}'
+        ).lastrowid
+
+    try:
+        # Passages outside of every story don't have a status and aren't locked
+        res = app.get("/passages/%d" % passage_id)
+        assert res.status_code == 200
+        data = json.loads(res.data)
+        assert data["status"] is None
+    finally:
+        with app.application.app_context():
+            db.engine.execute("DELETE FROM passages WHERE id = %s", passage_id)
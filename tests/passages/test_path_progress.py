@@ -0,0 +1,46 @@
+from app import configure_test_client
+from flask import Flask
+import pytest, random
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+def test_progress_follows_path_actions(app):
+    from app import db
+    from app.mod_path import get_path_progress, record_path_action
+
+    # Use a user without any path actions
+    user_id = random.randint(1000000, 2000000)
+
+    with app.application.app_context():
+        try:
+            record_path_action(user_id, 1, 0)
+            db.session.commit()
+
+            progress = get_path_progress(user_id)
+            assert progress.get_passage_parts() == {1: [0]}
+            assert progress.action_count == 1
+
+            # Save the rest of the passage's parts without updating progress
+            for part in [1, 2, 3]:
+                db.engine.execute("INSERT INTO path_actions (passage_id, part, user_id) VALUES (%s, %s, %s)", 1, part, user_id)
+
+            # Ensure progress is rebuilt from the path actions
+            progress = get_path_progress(user_id)
+            assert progress.get_completed_passage_ids() == set([1])
+            assert progress.get_passage_parts() == {}
+            assert progress.action_count == 4
+
+            # Ensure actions recorded afterwards are added on top
+            record_path_action(user_id, 2, 0)
+            db.session.commit()
+
+            progress = get_path_progress(user_id)
+            assert progress.get_passage_parts() == {2: [0]}
+            assert progress.action_count == 5
+        finally:
+            db.session.rollback()
+            db.engine.execute("DELETE FROM path_actions WHERE user_id = %s", user_id)
+            db.engine.execute("DELETE FROM user_path_progress WHERE user_id = %s", user_id)
@@ -100,3 +100,31 @@ def test_nonexistant_passage(app):
 
     # Ensure the error is correct
     assert data["code"] == 1503
+
+def test_word_lists_follow_edits_within_a_second(app):
+    from app import db
+    from app.mod_passages import Passage
+    from app.mod_passages.controllers import passage_words_cache, update_word_lists
+
+    with app.application.app_context():
+        original = db.engine.execute("SELECT data, annotations, new_words FROM passages WHERE id = 1").first()
+
+        try:
+            update_word_lists()
+
+            # Change the passage without changing updated_at, as happens when
+            # two edits are saved within the same second
+            data = json.dumps({"components": [{"type": "text", "text": "我"}]})
+            db.engine.execute("UPDATE passages SET data = %s, annotations = NULL, updated_at = updated_at WHERE id = 1", data)
+
+            update_word_lists()
+
+            # Ensure the edit was noticed
+            assert "我" in passage_words_cache[1][1]
+            assert "我" in json.loads(Passage.query.filter_by(id=1).first().new_words)
+        finally:
+            db.session.rollback()
+            db.engine.execute(
+                "UPDATE passages SET data = %s, annotations = %s, new_words = %s WHERE id = 1",
+                original.data, original.annotations, original.new_words
+            )
@@ -0,0 +1,174 @@
+from app import configure_test_client
+from flask import Flask
+import os, pytest
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+class FakeS3(object):
+    """Stands in for the speech folder in S3, counting every download."""
+
+    def __init__(self, recordings):
+        self.recordings = recordings
+        self.downloads = []
+
+    def fetch(self, filename):
+        self.downloads.append(filename)
+        return self.recordings[filename]
+
+def test_miss_then_hit(app, tmpdir):
+    from app.mod_speech.cache import SpeechCache
+
+    s3 = FakeS3({"a.mp3": b"aaaa"})
+    cache = SpeechCache(str(tmpdir), 100, s3.fetch)
+
+    # The first request downloads the recording and saves it to disk
+    with cache.get("a.mp3") as f:
+        assert f.read() == b"aaaa"
+
+    assert os.path.exists(cache.path("a.mp3"))
+
+    # The second request is served from disk without downloading it again
+    with cache.get("a.mp3") as f:
+        assert f.read() == b"aaaa"
+
+    assert s3.downloads == ["a.mp3"]
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+
+def test_evicts_least_recently_used(app, tmpdir):
+    from app.mod_speech.cache import SpeechCache
+
+    s3 = FakeS3({"a.mp3": b"a" * 40, "b.mp3": b"b" * 40, "c.mp3": b"c" * 40})
+    cache = SpeechCache(str(tmpdir), 100, s3.fetch)
+
+    cache.get("a.mp3").close()
+    cache.get("b.mp3").close()
+
+    # Use a.mp3 again so that b.mp3 is the least recently used recording
+    cache.get("a.mp3").close()
+    cache.get("c.mp3").close()
+
+    assert cache.stats["evictions"] == 1
+    assert not os.path.exists(cache.path("b.mp3"))
+    assert os.path.exists(cache.path("a.mp3"))
+    assert cache.total_bytes == 80
+
+def test_put_synthesized_recording(app, tmpdir):
+    from app.mod_speech.cache import SpeechCache
+
+    s3 = FakeS3({})
+    cache = SpeechCache(str(tmpdir), 100, s3.fetch)
+
+    # Recordings that were just synthesized are cached without a download
+    assert cache.put("new.mp3", b"new")
+
+    with cache.get("new.mp3") as f:
+        assert f.read() == b"new"
+
+    assert s3.downloads == []
+
+def test_too_large_recording(app, tmpdir):
+    from app.mod_speech.cache import SpeechCache
+
+    s3 = FakeS3({"large.mp3": b"l" * 200})
+    cache = SpeechCache(str(tmpdir), 100, s3.fetch)
+
+    # Recordings that don't fit are still served, straight from memory
+    assert cache.get("large.mp3").read() == b"l" * 200
+    assert cache.total_bytes == 0
+
+def test_keeps_recordings_across_restarts(app, tmpdir):
+    from app.mod_speech.cache import SpeechCache
+
+    s3 = FakeS3({"a.mp3": b"aaaa"})
+    SpeechCache(str(tmpdir), 100, s3.fetch).get("a.mp3").close()
+
+    # A new process finds the recording that's already on disk
+    cache = SpeechCache(str(tmpdir), 100, s3.fetch)
+    cache.get("a.mp3").close()
+
+    assert s3.downloads == ["a.mp3"]
+    assert cache.stats["hits"] == 1
+
+def test_budget_is_shared_between_processes(app, tmpdir):
+    from app.mod_speech.cache import SpeechCache
+
+    s3 = FakeS3({"a.mp3": b"a" * 40, "b.mp3": b"b" * 40, "c.mp3": b"c" * 40})
+
+    # Two processes share the directory, each with the whole budget, and measure
+    # it every time they save a recording
+    first = SpeechCache(str(tmpdir), 100, s3.fetch, scan_interval=0)
+    second = SpeechCache(str(tmpdir), 100, s3.fetch, scan_interval=0)
+
+    first.get("a.mp3").close()
+    second.get("b.mp3").close()
+    second.get("c.mp3").close()
+
+    # Ensure the recording saved by the other process was evicted to stay in
+    # the budget
+    assert not os.path.exists(first.path("a.mp3"))
+    assert second.total_bytes == 80
+
+def test_evicted_recording_can_still_be_sent(app, tmpdir):
+    from app.mod_speech.cache import SpeechCache
+
+    s3 = FakeS3({"a.mp3": b"a" * 60, "b.mp3": b"b" * 60})
+
+    first = SpeechCache(str(tmpdir), 100, s3.fetch, scan_interval=0)
+    second = SpeechCache(str(tmpdir), 100, s3.fetch, scan_interval=0)
+
+    first.get("a.mp3").close()
+
+    # Another process evicts the recording while it's being sent
+    with first.get("a.mp3") as f:
+        second.get("b.mp3").close()
+        assert not os.path.exists(first.path("a.mp3"))
+        assert f.read() == b"a" * 60
+
+    # Ensure it's downloaded again the next time
+    with first.get("a.mp3") as f:
+        assert f.read() == b"a" * 60
+
+    assert s3.downloads == ["a.mp3", "b.mp3", "a.mp3"]
+
+def test_directory_is_measured_when_full(app, tmpdir):
+    from app.mod_speech.cache import SpeechCache
+
+    s3 = FakeS3({"a.mp3": b"a" * 40, "b.mp3": b"b" * 40, "c.mp3": b"c" * 40})
+    cache = SpeechCache(str(tmpdir), 100, s3.fetch)
+
+    # Saving recordings that fit doesn't measure the directory again
+    cache.get("a.mp3").close()
+    cache.get("b.mp3").close()
+
+    assert cache.stats["scans"] == 1
+    assert cache.total_bytes == 80
+
+    # Going over the budget does, and removes the least recently used recording
+    cache.get("c.mp3").close()
+
+    assert cache.stats["scans"] == 2
+    assert cache.stats["evictions"] == 1
+    assert cache.total_bytes == 80
+
+def test_removes_old_temporary_files(app, tmpdir):
+    from app.mod_speech.cache import SpeechCache, TEMPORARY_FILE_MAX_AGE
+    import time
+
+    # A process stopped while saving a recording a while ago, and another is
+    # saving one right now
+    old = tmpdir.join(".old.tmp")
+    old.write(b"old")
+    past = time.time() - TEMPORARY_FILE_MAX_AGE - 1
+    os.utime(str(old), (past, past))
+
+    new = tmpdir.join(".new.tmp")
+    new.write(b"new")
+
+    SpeechCache(str(tmpdir), 100, FakeS3({}).fetch)
+
+    assert not old.exists()
+    assert new.exists()
@@ -0,0 +1,138 @@
+from app import configure_test_client
+from flask import Flask
+import json, os, pytest, uuid
+
+@pytest.fixture
+def app(monkeypatch, tmpdir):
+    application = Flask(__name__)
+    client = configure_test_client(application)
+
+    # Start with an empty speech cache in its own directory
+    import app.mod_speech.cache as cache
+    application.config["SPEECH_CACHE_DIR"] = str(tmpdir)
+    monkeypatch.setattr(cache, "speech_cache", None)
+
+    return client
+
+def save_recording(app, model, text, voice):
+    from app import db
+
+    filename = "%s.mp3" % str(uuid.uuid4())
+
+    with app.application.app_context():
+        db.session.add(model(text, filename, voice))
+        db.session.commit()
+
+    return filename
+
+def delete_recording(app, model, filename):
+    from app import db
+
+    with app.application.app_context():
+        model.query.filter_by(filename=filename).delete()
+        db.session.commit()
+
+@pytest.mark.parametrize("path, model_name", [
+    ("/speech/chinese", "ChineseSpeechSynthesis"),
+    ("/speech/english", "EnglishSpeechSynthesis")
+])
+def test_cached_recording(app, tmpdir, monkeypatch, path, model_name):
+    import app.mod_speech as speech
+    import app.mod_speech.controllers as controllers
+
+    model = getattr(speech, model_name)
+    text = str(uuid.uuid4())
+    filename = save_recording(app, model, text, 0)
+
+    # Put the recording on disk, as if it was already downloaded
+    tmpdir.join(filename).write_binary(b"recording")
+
+    def fetch(filename):
+        raise AssertionError("Recording was downloaded from S3")
+
+    monkeypatch.setattr(controllers, "fetch_recording", fetch)
+
+    try:
+        res = app.get(path, query_string={"text": text})
+        assert res.status_code == 200
+        assert res.mimetype == "audio/mpeg"
+        assert res.data == b"recording"
+    finally:
+        delete_recording(app, model, filename)
+
+@pytest.mark.parametrize("path, model_name", [
+    ("/speech/chinese", "ChineseSpeechSynthesis"),
+    ("/speech/english", "EnglishSpeechSynthesis")
+])
+def test_recording_not_on_disk(app, tmpdir, monkeypatch, path, model_name):
+    import app.mod_speech as speech
+    import app.mod_speech.controllers as controllers
+
+    model = getattr(speech, model_name)
+    text = str(uuid.uuid4())
+    filename = save_recording(app, model, text, 1)
+    downloads = []
+
+    def fetch(filename):
+        downloads.append(filename)
+        return b"downloaded"
+
+    monkeypatch.setattr(controllers, "fetch_recording", fetch)
+
+    try:
+        # The first request downloads the recording from S3
+        res = app.get(path, query_string={"text": text})
+        assert res.status_code == 200
+        assert res.data == b"downloaded"
+        assert tmpdir.join(filename).read_binary() == b"downloaded"
+
+        # The second request is served from disk
+        res = app.get(path, query_string={"text": text})
+        assert res.status_code == 200
+        assert res.data == b"downloaded"
+        assert downloads == [filename]
+    finally:
+        delete_recording(app, model, filename)
+
+@pytest.mark.parametrize("path", ["/speech/chinese", "/speech/english"])
+def test_missing_recording(app, path):
+    # Recordings aren't synthesized outside of production
+    res = app.get(path, query_string={"text": str(uuid.uuid4())})
+    assert res.status_code == 500
+    data = json.loads(res.data)
+    assert data["code"] == 1304
+
+@pytest.mark.parametrize("path", ["/speech/chinese", "/speech/english"])
+def test_text_not_provided(app, path):
+    res = app.get(path)
+    assert res.status_code == 400
+    data = json.loads(res.data)
+    assert data["code"] == 1303
+
+def test_recording_created_elsewhere_is_found(app, tmpdir):
+    from app import db
+    from app.mod_speech import ChineseSpeechSynthesis, hash_source
+
+    text = str(uuid.uuid4())
+
+    # The recording doesn't exist yet
+    res = app.get("/speech/chinese", query_string={"text": text})
+    assert res.status_code == 500
+
+    # Save the recording the way another process would
+    filename = "%s.mp3" % str(uuid.uuid4())
+    tmpdir.join(filename).write_binary(b"recording")
+
+    with app.application.app_context():
+        db.engine.execute(
+            "INSERT INTO chinese_speech (source, source_hash, filename, voice) VALUES (%s, %s, %s, 0)",
+            text, hash_source(text, 0), filename
+        )
+
+    try:
+        # Ensure it's found right away, instead of being remembered as missing
+        res = app.get("/speech/chinese", query_string={"text": text})
+        assert res.status_code == 200
+        assert res.data == b"recording"
+    finally:
+        delete_recording(app, ChineseSpeechSynthesis, filename)
@@ -0,0 +1,91 @@
+from app import configure_test_client
+from flask import Flask
+import json, pytest, threading, uuid
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+def synthesis_key(text):
+    from app.mod_speech import hash_source
+    return ("chinese_speech", hash_source(text, -1))
+
+def test_leader_failure_is_shared(app):
+    import app.mod_speech.controllers as controllers
+    from app.mod_speech import ChineseSpeechSynthesis
+
+    text = str(uuid.uuid4())
+    key = synthesis_key(text)
+    started = []
+
+    def synthesize():
+        started.append(controllers.syntheses[key])
+        return controllers.errors.issue_generating_speech()
+
+    with app.application.test_request_context():
+        res = controllers.synthesize_once(ChineseSpeechSynthesis, text, [0, 1], synthesize)
+        assert res.status_code == 500
+
+    # Ensure requests that were waiting are told that the synthesis failed
+    synthesis = started[0]
+    assert synthesis.finished.is_set()
+    assert synthesis.failed
+    assert key not in controllers.syntheses
+
+def test_waiters_use_leader_failure(app):
+    import app.mod_speech.controllers as controllers
+    from app.mod_speech import ChineseSpeechSynthesis
+
+    text = str(uuid.uuid4())
+    key = synthesis_key(text)
+
+    # Another request is synthesizing this recording
+    synthesis = controllers.Synthesis()
+    controllers.syntheses[key] = synthesis
+    responses = []
+
+    def synthesize():
+        raise AssertionError("Recording was synthesized again")
+
+    def wait():
+        with app.application.test_request_context():
+            responses.append(controllers.synthesize_once(ChineseSpeechSynthesis, text, [0, 1], synthesize))
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+
+    try:
+        # The other request fails
+        synthesis.failed = True
+        synthesis.finished.set()
+        thread.join()
+    finally:
+        del controllers.syntheses[key]
+
+    (body, status_code) = responses[0]
+    assert status_code == 500
+    assert json.loads(body.data)["code"] == 1302
+
+def test_waiters_time_out(app, monkeypatch):
+    import app.mod_speech.controllers as controllers
+    from app.mod_speech import ChineseSpeechSynthesis
+
+    text = str(uuid.uuid4())
+    key = synthesis_key(text)
+
+    # Another request is synthesizing this recording, but never finishes
+    controllers.syntheses[key] = controllers.Synthesis()
+    monkeypatch.setattr(controllers, "SYNTHESIS_TIMEOUT", 0.01)
+
+    def synthesize():
+        raise AssertionError("Recording was synthesized again")
+
+    try:
+        with app.application.test_request_context():
+            (body, status_code) = controllers.synthesize_once(ChineseSpeechSynthesis, text, [0, 1], synthesize)
+    finally:
+        del controllers.syntheses[key]
+
+    assert status_code == 500
+    assert json.loads(body.data)["code"] == 1302
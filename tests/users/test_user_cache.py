@@ -0,0 +1,66 @@
+from app import configure_test_client
+from flask import Flask, session
+import json, pytest, uuid
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+def execute(app, statement, *params):
+    from app import db
+
+    with app.application.app_context():
+        return db.engine.execute(statement, params)
+
+def test_revoked_admin_is_not_cached(app):
+    # Be an admin for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 1
+
+    res = app.get("/dashboard/metrics")
+    assert res.status_code == 200
+
+    # Take away the admin role the way another process would, without this
+    # process's SQLAlchemy events knowing about it
+    execute(app, "UPDATE users SET roles = '[]' WHERE id = 1")
+
+    try:
+        res = app.get("/dashboard/metrics")
+        assert res.status_code == 403
+    finally:
+        execute(app, "UPDATE users SET roles = '[1]' WHERE id = 1")
+
+def test_settings_changed_elsewhere_are_kept(app):
+    # Be a normal user for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 2
+
+    # Load the user so that they're cached
+    res = app.get("/users/2")
+    assert res.status_code == 200
+    settings = json.loads(res.data)["settings"]
+
+    # Change the user's first name the way another process would
+    first_name = str(uuid.uuid4())[0:8]
+    settings["profile"]["first_name"] = first_name
+    execute(app, "UPDATE users SET settings = %s WHERE id = 2", json.dumps(settings))
+
+    # Ensure the change is returned right away
+    res = app.get("/users/2")
+    assert json.loads(res.data)["settings"]["profile"]["first_name"] == first_name
+
+    # Ensure updating a different section doesn't undo the change
+    data = {
+        "section": "privacy",
+        "data": {
+            "visibility": "private"
+        }
+    }
+
+    res = app.put("/users/2", data=json.dumps(data), content_type="application/json")
+    assert res.status_code == 200
+    data = json.loads(res.data)
+
+    assert data["settings"]["profile"]["first_name"] == first_name
+    assert data["settings"]["privacy"]["visibility"] == "private"
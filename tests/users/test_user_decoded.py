@@ -0,0 +1,50 @@
+from app import configure_test_client
+from flask import Flask
+import json, pytest
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+def test_decoded_roles_follow_column(app):
+    from app.mod_users.models import User
+
+    user = User("decoded", "decoded@storytime.works", "password")
+    assert user.get_roles() == []
+    assert not user.is_admin
+
+    # Changing the column should be seen the next time it's decoded
+    user.roles = "[1]"
+    assert user.get_roles() == [1]
+    assert user.is_admin
+
+def test_settings_are_copied(app):
+    from app.mod_users.models import User
+
+    user = User("decoded", "decoded@storytime.works", "password")
+    settings = user.get_settings()
+    settings["profile"]["first_name"] = "Changed"
+
+    # Changes to the returned settings aren't kept until they're saved
+    assert user.get_settings()["profile"]["first_name"] != "Changed"
+
+    user.set_settings(settings)
+    assert user.get_settings()["profile"]["first_name"] == "Changed"
+    assert json.loads(user.settings)["profile"]["first_name"] == "Changed"
+
+def test_settings_endpoint_matches_column(app):
+    # Be a normal user for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 2
+
+    res = app.get("/users/2")
+    assert res.status_code == 200
+    data = json.loads(res.data)
+
+    from app.mod_users.models import User, decode_settings
+
+    with app.application.app_context():
+        user = User.query.filter_by(id=2).first()
+        assert data["settings"] == decode_settings(user.settings)
+        assert data["roles"] == json.loads(user.roles)
@@ -0,0 +1,74 @@
+from app import configure_test_client
+from flask import Flask
+import pytest, threading
+
+@pytest.fixture
+def app():
+    application = Flask(__name__)
+    return configure_test_client(application)
+
+def test_forgets_least_recently_used(app):
+    from app.utils import LRUCache
+
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+
+    # Use a again so that b is the least recently used item
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+def test_update(app):
+    from app.utils import LRUCache
+
+    cache = LRUCache(2)
+
+    # Items that don't exist are passed to the change as None
+    assert cache.update("a", lambda x: 1 if x is None else x + 1) == 1
+    assert cache.update("a", lambda x: 1 if x is None else x + 1) == 2
+
+    # Returning None removes the item
+    assert cache.update("a", lambda x: None) is None
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+def test_remove_if_and_clear(app):
+    from app.utils import LRUCache
+
+    cache = LRUCache(10)
+
+    for key in range(6):
+        cache.put(key, key)
+
+    cache.remove_if(lambda key: key % 2 == 0)
+    assert sorted(cache.items.keys()) == [1, 3, 5]
+    assert cache.pop(3) == 3
+    assert cache.pop(3, "missing") == "missing"
+
+    cache.clear()
+    assert len(cache) == 0
+
+def test_updates_from_many_threads(app):
+    from app.utils import LRUCache
+
+    cache = LRUCache(10)
+
+    def increment():
+        for _ in range(1000):
+            cache.update("count", lambda x: 1 if x is None else x + 1)
+
+    threads = [threading.Thread(target=increment) for _ in range(4)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    # Ensure no increments were lost
+    assert cache.get("count") == 4000
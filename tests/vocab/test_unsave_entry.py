@@ -40,3 +40,36 @@ def test_not_authenticated(app):
 
     # Ensure the error is correct
     assert data["code"] == 1000
+
+def test_saved_entry_list_is_merged(app, monkeypatch):
+    from app import db
+    from app.mod_users import models
+
+    # Be a normal user for this test
+    with app.session_transaction() as session:
+        session["user_id"] = 2
+
+    # Give the user a list from before saved entries had their own rows
+    with app.application.app_context():
+        db.engine.execute("ALTER TABLE users ADD saved_entry_ids TEXT NULL")
+        db.engine.execute("UPDATE users SET saved_entry_ids = '[3, 4, 4]' WHERE id = 2")
+
+    monkeypatch.setattr(models, "saved_entry_lists_exist", None)
+
+    try:
+        # Unsaving an entry from the list shouldn't bring it back later
+        res = app.delete("/vocabulary/entries/3/save")
+        assert res.status_code == 204
+
+        res = app.get("/users/2")
+        assert res.status_code == 200
+        data = json.loads(res.data)
+        assert 3 not in data["saved_entry_ids"]
+        assert 4 in data["saved_entry_ids"]
+
+        with app.application.app_context():
+            assert db.engine.execute("SELECT saved_entry_ids FROM users WHERE id = 2").scalar() is None
+    finally:
+        with app.application.app_context():
+            db.engine.execute("ALTER TABLE users DROP COLUMN saved_entry_ids")
+            db.engine.execute("DELETE FROM saved_entries WHERE user_id = 2 AND entry_id IN (3, 4)")